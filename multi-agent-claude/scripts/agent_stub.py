@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Stand-in agent for exercising the supervisor without a real model.
+
+Reads {"type": "task", "task": {...}, "context": {...}} lines from stdin,
+keeping its copy of the shared context current from the context deltas,
+"works" for a while and reports {"event": "task_completed", ...}, printing
+{"event": "heartbeat"} every AGENT_HEARTBEAT_INTERVAL seconds while it
+works. Each task counts as one API call against the shared budget
+(RATE_LIMIT_FILE). Environment knobs:
+AGENT_STUB_SECONDS (default 1.0), AGENT_STUB_CRASH_RATE and
+AGENT_STUB_FAIL_RATE (probabilities, default 0).
+"""
+import json
+import os
+import random
+import sys
+import time
+from memory_system import apply_context_delta
+from rate_limiter import RateLimiter
+
+
+def heartbeat():
+    print(json.dumps({"event": "heartbeat"}))
+    sys.stdout.flush()
+
+
+def main():
+    agent_id = os.environ.get("AGENT_ID", "agent")
+    seconds = float(os.environ.get("AGENT_STUB_SECONDS", "1.0"))
+    crash_rate = float(os.environ.get("AGENT_STUB_CRASH_RATE", "0"))
+    fail_rate = float(os.environ.get("AGENT_STUB_FAIL_RATE", "0"))
+    interval = float(os.environ.get("AGENT_HEARTBEAT_INTERVAL", "0")) or None
+    limiter = RateLimiter.from_env()
+    context = None
+    print(f"{agent_id} ready")
+    for line in sys.stdin:
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("type") != "task":
+            continue
+        task = message["task"]
+        if message.get("context"):
+            update = message["context"]
+            context = apply_context_delta(context, update)
+            kind = "full context" if update["full"] else f"{len(update['changes'])} changed sections"
+            print(f"{agent_id} context v{update['version']} ({kind})")
+        if limiter:
+            # Waiting for budget still counts as alive
+            while not limiter.acquire(agent_id, timeout=interval):
+                heartbeat()
+        print(f"{agent_id} working on {task['id']}: {task.get('description', '')}")
+        # Heartbeat from the work loop itself, so a stuck agent goes quiet
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            time.sleep(min(interval or seconds, max(0.0, deadline - time.monotonic())))
+            if interval:
+                heartbeat()
+        if random.random() < crash_rate:
+            print(f"{agent_id} crashed")
+            sys.exit(1)
+        if random.random() < fail_rate:
+            print(json.dumps({"event": "task_failed", "task_id": task["id"], "error": "stub failure"}))
+        else:
+            print(json.dumps({"event": "task_completed", "task_id": task["id"],
+                              "result": f"{task.get('description', '')} done by {agent_id}"}))
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
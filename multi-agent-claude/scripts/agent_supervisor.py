@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import resource
+import signal
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+CPU_PERIOD = 1.0      # seconds between CPU usage samples
+STABLE_AFTER = 60.0   # an agent up this long has its restart backoff reset
+STOP_TIMEOUT = 5.0
+LINE_LIMIT = 1 << 20  # longest agent output line kept; longer ones are dropped
+
+
+def parse_size(value) -> Optional[int]:
+    """"2GB" / "512M" / 1048576 -> bytes"""
+    if value is None or isinstance(value, int):
+        return value
+    text = str(value).strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(float(text))
+
+
+def parse_cpu(value) -> Optional[float]:
+    """"25%" / 0.25 -> fraction of one core"""
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().endswith("%"):
+        return float(value.strip()[:-1]) / 100
+    return float(value)
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """user + system CPU time of a process (Linux /proc), or None"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class AgentProcess:
+    """Book-keeping for one supervised agent"""
+
+    def __init__(self, agent_id: str, env: Dict[str, str]):
+        self.agent_id = agent_id
+        self.env = env
+        self.process = None        # asyncio.subprocess.Process
+        self.status = "starting"   # starting, running, restarting, failed, stopped
+        self.task_id = None
+        self.started_at = 0.0
+        self.crashes = 0           # consecutive crashes, for the backoff
+        self.restarts = deque()    # restart times inside the restart window
+        self.cpu_sample = None     # (monotonic time, cpu seconds)
+        self.reader = None         # task streaming the current process's output
+
+
+class AgentSupervisor:
+    """Runs each agent as a child process and keeps it running
+
+    Agents speak JSON lines. The supervisor writes {"type": "task", "task": {...}}
+    to an agent's stdin; the agent prints {"event": "task_completed", "task_id": ...}
+    (or "task_failed" with an "error") when done, and {"event": "heartbeat"}
+    every AGENT_HEARTBEAT_INTERVAL seconds while it works. Any other output is
+    streamed to logs/agents/<agent_id>.log. A crashed agent is restarted
+    after an exponential backoff, unless it crashed more than max_restarts
+    times within restart_window seconds. Memory is capped with RLIMIT_AS;
+    CPU is held to its share by pausing the process group (SIGSTOP/SIGCONT)
+    when it runs over, since rlimits can only cap total CPU time.
+
+    Everything runs on the caller's asyncio event loop: output is read,
+    restarts are scheduled and CPU is sampled by tasks on that loop, and
+    on_event(agent_id, event) is called there with "started", "heartbeat",
+    "task_completed", "task_failed", "exited" and "failed" events, so
+    handlers can touch coordinator state without locking.
+    """
+
+    def __init__(self, command: List[str], on_event: Callable[[str, Dict], None], log_dir: str = "logs/agents",
+                 memory_limit: Optional[int] = None, cpu_limit: Optional[float] = None,
+                 restart_backoff: float = 1.0, max_backoff: float = 60.0, max_restarts: int = 5,
+                 restart_window: float = 300.0):
+        self.command = command
+        self.on_event = on_event
+        self.log_dir = log_dir
+        self.memory_limit = memory_limit
+        self.cpu_limit = cpu_limit
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.agents = {}
+        self.running = True
+        self.throttle_task = None
+        self.tasks = set()  # output readers, pending restarts, the throttle loop
+        os.makedirs(log_dir, exist_ok=True)
+    
+    def spawn(self, coroutine) -> asyncio.Task:
+        """Run a background task, keeping a reference until it finishes"""
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def emit(self, agent_id: str, event: Dict):
+        try:
+            self.on_event(agent_id, event)
+        except Exception as e:
+            print(f"Supervisor event handler error ({agent_id}): {e}")
+
+    async def start(self, agent_id: str, env: Optional[Dict[str, str]] = None):
+        """Launch an agent (no-op if it is already supervised)"""
+        if agent_id in self.agents:
+            return
+        agent = self.agents[agent_id] = AgentProcess(agent_id, env or {})
+        await self.launch(agent)
+        if self.cpu_limit and self.throttle_task is None:
+            self.throttle_task = self.spawn(self.throttle_loop())
+
+    async def launch(self, agent: AgentProcess):
+        command = [part.replace("{agent_id}", agent.agent_id) for part in self.command]
+        env = {**os.environ, **agent.env, "AGENT_ID": agent.agent_id, "PYTHONUNBUFFERED": "1"}
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT, env=env, start_new_session=True, limit=LINE_LIMIT)
+        except OSError as e:
+            agent.status = "failed"
+            self.emit(agent.agent_id, {"event": "failed", "error": str(e)})
+            return
+        if self.memory_limit:
+            try:
+                resource.prlimit(process.pid, resource.RLIMIT_AS, (self.memory_limit, self.memory_limit))
+            except (AttributeError, OSError, ValueError) as e:
+                print(f"Could not limit memory of {agent.agent_id}: {e}")
+        agent.process = process
+        agent.status = "running"
+        agent.task_id = None
+        agent.started_at = time.monotonic()
+        agent.cpu_sample = (agent.started_at, 0.0)
+        agent.reader = self.spawn(self.read_output(agent, process))
+        self.emit(agent.agent_id, {"event": "started", "pid": process.pid})
+
+    def send_task(self, agent_id: str, task: Dict, context: Optional[Dict] = None) -> bool:
+        """Hand a task (and a shared-context update for it) to a running agent; False if it can't take it"""
+        agent = self.agents.get(agent_id)
+        if agent is None or agent.status != "running" or agent.task_id is not None:
+            return False
+        stdin = agent.process.stdin
+        if stdin is None or stdin.is_closing():
+            return False
+        # Messages are small; the transport buffers them without blocking the loop
+        message = {"type": "task", "task": task}
+        if context is not None:
+            message["context"] = context
+        stdin.write((json.dumps(message) + "\n").encode())
+        agent.task_id = task["id"]
+        return True
+
+    async def read_output(self, agent: AgentProcess, process: asyncio.subprocess.Process):
+        """Stream an agent's output to its log, picking out protocol events"""
+        with open(os.path.join(self.log_dir, f"{agent.agent_id}.log"), 'a') as log:
+            while True:
+                try:
+                    line = (await process.stdout.readline()).decode(errors="replace")
+                except ValueError:
+                    line = f"[line over {LINE_LIMIT} bytes dropped]\n"
+                if not line:
+                    break
+                event = None
+                if line.startswith("{"):
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        pass
+                if isinstance(event, dict) and event.get("event") == "heartbeat":
+                    self.emit(agent.agent_id, event)
+                    continue
+                if isinstance(event, dict) and event.get("event") in ("task_completed", "task_failed"):
+                    agent.task_id = None
+                    self.emit(agent.agent_id, event)
+                    continue
+                log.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {line}")
+                log.flush()
+        self.handle_exit(agent, process, await process.wait())
+
+    def handle_exit(self, agent: AgentProcess, process: asyncio.subprocess.Process, code: int):
+        if agent.process is not process:
+            return
+        task_id, agent.task_id = agent.task_id, None
+        if agent.status == "stopped" or not self.running:
+            agent.status = "stopped"
+            restart = None
+        else:
+            now = time.monotonic()
+            agent.crashes = 1 if now - agent.started_at >= STABLE_AFTER else agent.crashes + 1
+            while agent.restarts and now - agent.restarts[0] > self.restart_window:
+                agent.restarts.popleft()
+            if len(agent.restarts) >= self.max_restarts:
+                agent.status = "failed"
+                restart = None
+            else:
+                agent.restarts.append(now)
+                agent.status = "restarting"
+                restart = min(self.max_backoff, self.restart_backoff * 2 ** (agent.crashes - 1))
+        self.emit(agent.agent_id, {"event": "exited", "code": code, "task_id": task_id,
+                                   "restarting": restart is not None, "delay": restart})
+        if restart is not None:
+            self.spawn(self.restart(agent, restart))
+        elif agent.status == "failed":
+            self.emit(agent.agent_id, {"event": "failed", "error": f"crashed {self.max_restarts} times"})
+
+    async def restart(self, agent: AgentProcess, delay: float):
+        await asyncio.sleep(delay)
+        if not self.running or agent.status != "restarting":
+            return
+        await self.launch(agent)
+
+    async def throttle_loop(self):
+        """Pause agents that use more than cpu_limit of a core, in proportion to the overrun"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(CPU_PERIOD)
+            agents = [agent for agent in self.agents.values() if agent.status == "running"]
+            for agent in agents:
+                now = time.monotonic()
+                cpu = process_cpu_seconds(agent.process.pid)
+                if cpu is None:
+                    continue
+                previous, agent.cpu_sample = agent.cpu_sample, (now, cpu)
+                if previous is None:
+                    continue
+                used = cpu - previous[1]
+                allowed = self.cpu_limit * (now - previous[0])
+                if used > allowed:
+                    # Pausing for used/limit - elapsed brings the average back to the limit
+                    pause = min(5.0, used / self.cpu_limit - (now - previous[0]))
+                    self.signal(agent, signal.SIGSTOP)
+                    loop.call_later(pause, self.signal, agent, signal.SIGCONT)
+
+    def kill(self, agent_id: str):
+        """Kill a stuck agent; it is restarted like any crashed one"""
+        agent = self.agents.get(agent_id)
+        if agent is not None and agent.process is not None and agent.process.returncode is None:
+            self.signal(agent, signal.SIGKILL)
+
+    def signal(self, agent: AgentProcess, signum: int):
+        try:
+            os.killpg(agent.process.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def stop_all(self, timeout: float = STOP_TIMEOUT):
+        """Stop every agent: close stdin, then SIGTERM, then SIGKILL"""
+        self.running = False
+        agents = [agent for agent in self.agents.values() if agent.process is not None]
+        for agent in agents:
+            agent.status = "stopped"
+            if agent.process.returncode is not None:
+                continue
+            agent.process.stdin.close()
+            self.signal(agent, signal.SIGTERM)
+            self.signal(agent, signal.SIGCONT)  # a throttled agent can't act on SIGTERM
+        waits = [agent.process.wait() for agent in agents]
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout)
+        except asyncio.TimeoutError:
+            for agent in agents:
+                if agent.process.returncode is None:
+                    self.signal(agent, signal.SIGKILL)
+            await asyncio.gather(*(agent.process.wait() for agent in agents))
+        # Let output readers drain to EOF; pending restarts and throttling are cancelled
+        readers = {agent.reader for agent in agents if agent.reader is not None}
+        for task in self.tasks - readers:
+            task.cancel()
+        if self.tasks:
+            _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def status(self) -> Dict[str, Dict]:
+        return {agent_id: {"status": agent.status, "pid": agent.process.pid if agent.process else None,
+                           "task_id": agent.task_id, "restarts": len(agent.restarts)}
+                for agent_id, agent in self.agents.items()}
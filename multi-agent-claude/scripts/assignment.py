@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import json
+from typing import Dict, List, Optional, Tuple
+
+# How much each term counts towards an (agent, task) score
+DEFAULT_WEIGHTS = {"skills": 2.0, "type": 1.0, "priority": 1.5, "load": 0.5, "critical_path": 1.0}
+PRIORITY_WEIGHT = {"high": 1.0, "medium": 0.6, "low": 0.3}
+GENERAL_TYPE_MATCH = 0.3  # a general agent is a partial fit for any task type
+
+
+def hungarian(cost: List[List[float]]) -> List[int]:
+    """Minimum-cost assignment of every row to a distinct column (rows <= columns)
+
+    Kuhn-Munkres with potentials, O(rows^2 * columns). Returns the column
+    chosen for each row.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if n > m:
+        raise ValueError("hungarian() needs at least as many columns as rows")
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    match = [0] * (m + 1)   # column -> row (1-based, 0 = free)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while match[column]:
+            used[column] = True
+            current = match[column]
+            delta = inf
+            next_column = 0
+            costs = cost[current - 1]
+            u_current = u[current]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    slack = costs[j - 1] - u_current - v[j]
+                    if slack < min_slack[j]:
+                        min_slack[j] = slack
+                        way[j] = column
+                    if min_slack[j] < delta:
+                        delta = min_slack[j]
+                        next_column = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            column = next_column
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+    result = [0] * n
+    for j in range(1, m + 1):
+        if match[j]:
+            result[match[j] - 1] = j - 1
+    return result
+
+
+def skill_set(skills) -> set:
+    return {skill.strip().lower() for skill in skills or ()}
+
+
+class SkillMatcher:
+    """Scores agents against tasks and assigns batches as an optimal matching
+
+    A task's score for an agent combines how many of its required_skills
+    the agent has, whether the agent's type matches the task type, the task
+    priority, how much dependent work the task holds up (its critical_path,
+    relative to the longest in the batch) and the agent's current load.
+    Each batch is solved with the Hungarian algorithm, so the set of
+    assignments maximises the total score instead of letting the first task
+    grab the best specialist.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, templates_path: Optional[str] = None):
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.templates = {}
+        if templates_path:
+            self.load_templates(templates_path)
+
+    def load_templates(self, path: str):
+        """Index the task templates in config/tasks.json by name"""
+        try:
+            with open(path, 'r') as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return
+        for groups in catalog.values():
+            for templates in groups.values():
+                for template in templates:
+                    self.templates[template["name"].strip().lower()] = template
+
+    def template_for(self, description: str) -> Optional[Dict]:
+        return self.templates.get(description.strip().lower())
+
+    def score(self, task: Dict, agent: Dict, load: float = 0.0, longest_path: float = 0.0) -> float:
+        required = skill_set(task.get("required_skills"))
+        skill_score = len(required & skill_set(agent.get("skills"))) / len(required) if required else 0.0
+        task_type = task.get("type", "general")
+        if agent.get("type") == task_type:
+            type_score = 1.0
+        elif agent.get("type") == "general":
+            type_score = GENERAL_TYPE_MATCH
+        else:
+            type_score = 0.0
+        return (self.weights["skills"] * skill_score
+                + self.weights["type"] * type_score
+                + self.weights["priority"] * PRIORITY_WEIGHT.get(task.get("priority"), 0.0)
+                + (self.weights["critical_path"] * task.get("critical_path", 0.0) / longest_path
+                   if longest_path else 0.0)
+                - self.weights["load"] * load)
+
+    def match(self, tasks: List[Dict], agents: List[Dict],
+              loads: Optional[Dict[str, float]] = None) -> List[Tuple[Dict, Dict]]:
+        """(task, agent) pairs maximising the total score; min(len(tasks), len(agents)) of them"""
+        if not tasks or not agents:
+            return []
+        loads = loads or {}
+        longest_path = max(task.get("critical_path", 0.0) for task in tasks)
+        scores = [[self.score(task, agent, loads.get(agent["id"], 0.0), longest_path) for task in tasks]
+                  for agent in agents]
+        if len(agents) <= len(tasks):
+            columns = hungarian([[-score for score in row] for row in scores])
+            return [(tasks[column], agents[row]) for row, column in enumerate(columns)]
+        rows = hungarian([[-scores[a][t] for a in range(len(agents))] for t in range(len(tasks))])
+        return [(tasks[t], agents[a]) for t, a in enumerate(rows)]
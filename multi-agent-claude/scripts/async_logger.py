@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DROP = "drop"
+BLOCK = "block"
+
+
+class AsyncLogger:
+    """Log writer that keeps file I/O off the caller's thread
+
+    log() only timestamps the record and puts it on a bounded queue. A
+    background thread drains the queue in batches, formats them (plain text
+    or JSONL with the structured fields), echoes them to the console and
+    writes each batch with one write() to a file it keeps open. The file is
+    rotated by size and/or age. When the queue is full, records are dropped
+    (and counted) under the "drop" policy, or the caller waits under "block".
+    Records logged after close() are dropped.
+    """
+
+    def __init__(self, path: str, json_format: bool = False, max_bytes: int = 10 << 20,
+                 rotate_interval: Optional[float] = None, backups: int = 5, queue_size: int = 10000,
+                 overflow: str = DROP, batch_size: int = 256, flush_interval: float = 0.2, echo: bool = True):
+        if overflow not in (DROP, BLOCK):
+            raise ValueError(f"Unknown log overflow policy: {overflow}")
+        self.path = path
+        self.json_format = json_format
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.closed = False
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, 'a')
+        self.next_rotation = time.time() + rotate_interval if rotate_interval else None
+        self.thread = threading.Thread(target=self.write_loop, name="log-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, message: str, level: str = "INFO", **fields):
+        """Queue a record; extra keyword fields (agent_id, task_id, event, latency, ...) go to JSONL"""
+        if self.closed:
+            return
+        record = (time.time(), level, message, fields)
+        if self.overflow == BLOCK:
+            # Timed puts so a caller waiting on a full queue gives up once the writer is closing
+            while not self.closed:
+                try:
+                    self.queue.put(record, timeout=self.flush_interval)
+                    return
+                except queue.Full:
+                    continue
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def format(self, record) -> str:
+        created, level, message, fields = record
+        if self.json_format:
+            return json.dumps({"timestamp": datetime.fromtimestamp(created).isoformat(),
+                               "level": level, "message": message, **fields}, default=str)
+        timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+        return f"[{timestamp}] [{level}] {message}"
+
+    def take_batch(self) -> Optional[List]:
+        """Up to batch_size records; None once close() has been called and the queue is empty"""
+        try:
+            first = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def write_loop(self):
+        while True:
+            batch = self.take_batch()
+            stop = None in batch
+            records = [record for record in batch if record is not None]
+            with self.dropped_lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                records.append((time.time(), "WARNING", f"Log queue full, dropped {dropped} messages",
+                                {"event": "log_dropped", "count": dropped}))
+            if records:
+                self.write([self.format(record) for record in records])
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def write(self, lines: List[str]):
+        text = "\n".join(lines) + "\n"
+        if self.echo:
+            print(text, end="", flush=True)
+        try:
+            if self.should_rotate(len(text)):
+                self.rotate()
+            self.file.write(text)
+            self.file.flush()
+        except OSError as e:
+            print(f"Log write failed: {e}")
+
+    def should_rotate(self, incoming: int) -> bool:
+        if self.next_rotation is not None and time.time() >= self.next_rotation:
+            return True
+        return bool(self.max_bytes) and self.file.tell() > 0 and self.file.tell() + incoming > self.max_bytes
+
+    def rotate(self):
+        """coordinator.log -> coordinator.log.1 -> ... -> coordinator.log.<backups>"""
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a')
+        if self.rotate_interval:
+            self.next_rotation = time.time() + self.rotate_interval
+
+    def flush(self):
+        """Wait until everything logged so far is written (returns at once after close())"""
+        # Like queue.join(), but gives up once the writer has stopped: records that
+        # raced in behind close()'s sentinel are never taken off the queue
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks and not self.closed:
+                self.queue.all_tasks_done.wait(self.flush_interval)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+        self.file.close()
+
+
+def create_logger(path: str, config: Dict) -> AsyncLogger:
+    """AsyncLogger from the "logging" section of config/agents.json"""
+    json_format = config.get("format", "text") == "jsonl"
+    if json_format and path.endswith(".log"):
+        path = path[:-len(".log")] + ".jsonl"
+    return AsyncLogger(path, json_format=json_format,
+                       max_bytes=config.get("max_bytes", 10 << 20),
+                       rotate_interval=config.get("rotate_interval"),
+                       backups=config.get("backups", 5),
+                       queue_size=config.get("queue_size", 10000),
+                       overflow=config.get("overflow", DROP))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Measure latency from task creation to assignment.
+
+Runs the coordinator's assignment loop in a scratch directory and times how
+long each newly added task waits before an idle agent claims it, first with
+event-driven wakeups and then with plain interval polling for comparison.
+
+    python3 scripts/bench_assignment.py [rounds] [poll_interval]
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from start_session import AgentCoordinator
+
+
+async def measure(coordinator: AgentCoordinator, rounds: int) -> list:
+    """Add tasks one at a time alongside the running assignment loop"""
+    coordinator.loop = asyncio.get_running_loop()
+    await coordinator.start_agents()
+    coordinator.running = True
+    assigner = asyncio.ensure_future(coordinator.task_assignment_loop())
+
+    latencies = []
+    for i in range(rounds):
+        task_id = f"bench_{i}"
+        start = time.perf_counter()
+        coordinator.task_manager.add_tasks([{
+            "id": task_id,
+            "description": "Benchmark task",
+            "type": "general",
+            "priority": "medium",
+            "status": "pending",
+            "assigned_to": None,
+            "created_at": datetime.now().isoformat()
+        }])
+        while coordinator.task_manager.get_task(task_id)["status"] != "in_progress":
+            await asyncio.sleep(0.0005)
+        latencies.append(time.perf_counter() - start)
+
+        # Finish the task so the agent is free for the next round
+        agent_id = coordinator.task_manager.get_task(task_id)["assigned_to"]
+        coordinator.task_manager.update_task(task_id, {"status": "completed"})
+        coordinator.task_manager.release_task(agent_id, task_id)
+        coordinator.set_agent_idle(agent_id)
+        # Let the loop go back to sleep so each round starts from idle
+        await asyncio.sleep(0.01)
+
+    coordinator.running = False
+    assigner.cancel()
+    await asyncio.gather(assigner, return_exceptions=True)
+    return latencies
+
+
+def run_mode(event_driven: bool, rounds: int, interval: float, backend: str) -> list:
+    """Return creation-to-assignment latencies in seconds"""
+    workdir = tempfile.mkdtemp(prefix="bench_assignment_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        os.makedirs("logs", exist_ok=True)
+        config = {
+            "num_agents": 1,
+            "agent_types": [{"id": "general", "count": 1, "specialization": "Benchmark"}],
+            "coordination": {
+                "event_driven_assignment": event_driven,
+                "assignment_fallback_interval": interval,
+                "monitor_interval": interval
+            },
+            "storage": {"backend": backend}
+        }
+        with open("agents.json", "w") as f:
+            json.dump(config, f)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            coordinator = AgentCoordinator("agents.json")
+            return asyncio.run(measure(coordinator, rounds))
+    finally:
+        os.chdir(cwd)
+
+
+def report(name: str, latencies: list):
+    ms = sorted(l * 1000 for l in latencies)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{name:>8}: n={len(ms)} p50={statistics.median(ms):.2f}ms p95={p95:.2f}ms max={ms[-1]:.2f}ms")
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    poll_interval = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    backend = os.environ.get("BENCH_STORAGE", "sqlite")
+
+    print(f"Task creation -> assignment latency ({backend} storage)")
+    report("event", run_mode(True, rounds, poll_interval, backend))
+    # Polling pays up to a full interval per task; keep the round count small
+    report("polling", run_mode(False, max(1, min(rounds, 10)), poll_interval, backend))
@@ -1,38 +1,195 @@
 #!/usr/bin/env python3
+import signal
 import subprocess
+import threading
 import time
 import json
 import os
 import sys
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
+from file_watcher import FileWatcher
+from cargo_fingerprint import ResultCache, SourceFingerprint
+from cargo_history import CargoHistory
+from cargo_diagnostics import MAX_DIAGNOSTICS, DiagnosticIndex, compact_diagnostic, route_to_holders
+from cargo_tests import TestOutputParser, TestStats, libtest_args
+
+# Crate inputs that trigger a check when they change (relative to the project)
+WATCHED_INPUTS = ["src", "tests", "benches", "examples", "build.rs", "Cargo.toml", "Cargo.lock"]
+IGNORED_SUFFIXES = ("~", ".swp", ".swx", ".tmp")
+MAX_MESSAGES = 10          # compiler messages kept per run
+STDERR_TAIL_LINES = 50     # stderr lines kept per run
+PARTIAL_STATUS_INTERVAL = 0.5
+
+
+def cargo_metadata(project_path: str) -> Optional[Dict]:
+    """`cargo metadata --no-deps` for a project, or None if it can't be read"""
+    try:
+        result = subprocess.run(["cargo", "metadata", "--no-deps", "--format-version", "1"],
+                                cwd=project_path, capture_output=True, text=True, timeout=60)
+        return json.loads(result.stdout) if result.returncode == 0 else None
+    except (OSError, subprocess.TimeoutExpired, json.JSONDecodeError):
+        return None
+
 
 class CargoDaemon:
-    def __init__(self, project_path: str, update_interval: int = 300):
+    def __init__(self, project_path: str, update_interval: int = 300, watch: bool = True,
+                 debounce: float = 0.5, timeout: float = 900, name: Optional[str] = None,
+                 package: Optional[str] = None, source_path: Optional[str] = None,
+                 jobs: Optional[int] = None, scheduler=None, lock_source=None, failed_first: bool = False):
         self.project_path = project_path
         self.update_interval = update_interval
         self.log_file = "logs/cargo_status.json"
-        self.history_file = "logs/cargo_history.json"
-        self.max_history = 100  # Keep last 100 check results
+        self.history_dir = "logs/cargo_history"
+        self.history_file = "logs/cargo_history.json"  # pre-JSONL format, imported once
+        self.diagnostics_file = "logs/cargo_diagnostics.json"
+        self.deltas_dir = "logs/cargo_deltas"
+        self.tests_file = "logs/cargo_tests.json"
+        
+        # Under MultiProjectDaemon each project (or workspace member, via
+        # `package`) keeps its own status/history, and the scheduler decides
+        # when it runs and how many cargo jobs it may use
+        self.name = name
+        self.package = package
+        self.source_path = source_path or project_path
+        self.jobs = jobs
+        self.scheduler = scheduler
+        self.label = f"[{name}] " if name else ""
+        if name:
+            self.log_file = f"logs/cargo/{name}/cargo_status.json"
+            self.history_dir = f"logs/cargo/{name}/cargo_history"
+            self.history_file = f"logs/cargo/{name}/cargo_history.json"
+            self.diagnostics_file = f"logs/cargo/{name}/cargo_diagnostics.json"
+            self.deltas_dir = f"logs/cargo/{name}/cargo_deltas"
+            self.tests_file = f"logs/cargo/{name}/cargo_tests.json"
+        
+        # Watch mode: check as soon as edits settle; the interval is only a backstop
+        self.watch = watch
+        self.debounce = debounce
+        self.watcher = None
+        self.wakeup = threading.Event()
+        self.changed_paths = set()
+        self.changes_lock = threading.Lock()
+        self.last_snapshot = None
+        
+        # The cargo invocation in flight; killed on timeout or when a newer change supersedes it
+        self.timeout = timeout
+        self.process = None
+        self.process_lock = threading.Lock()
+        self.cancel_reason = None
+        self.last_partial_write = 0.0
         
         # Create logs directory
-        os.makedirs("logs", exist_ok=True)
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        
+        # Results of previously seen source trees, keyed by content fingerprint
+        self.fingerprint = SourceFingerprint(self.project_path)
+        self.result_cache = ResultCache(os.path.join(os.path.dirname(self.log_file), "cargo_cache"))
+        
+        # Append-only run history (rotated, gzipped); see cargo_history.py for queries
+        self.history = CargoHistory(self.history_dir)
+        self.history.import_legacy(self.history_file)
+        latest = self.history.latest(1)
+        self.last_status = latest[0] if latest else None
         
-        # Load history
-        self.history = self.load_history()
+        # Diagnostics of the last finished check, diffed against each new one and
+        # routed to whoever holds the file lock (lock_source() -> TaskManager.file_locks)
+        self.lock_source = lock_source
+        self.diagnostics = DiagnosticIndex(self.load_diagnostics())
+        
+        # Per-test outcomes and timings; with failed_first, tests that failed last
+        # time are re-run on their own before the full suite
+        self.failed_first = failed_first
+        self.test_stats = TestStats(self.tests_file)
     
-    def load_history(self) -> List[Dict]:
-        """Load check history from file"""
-        if os.path.exists(self.history_file):
+    def load_diagnostics(self) -> List[Dict]:
+        try:
+            with open(self.diagnostics_file, 'r') as f:
+                return json.load(f).get("diagnostics", [])
+        except (OSError, ValueError):
+            return []
+    
+    def write_status(self, status: Dict):
+        """Atomically replace logs/cargo_status.json (agents may read it mid-build)"""
+        tmp_file = f"{self.log_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp_file, self.log_file)
+    
+    def publish_partial(self, stage: str, progress: Dict, force: bool = False):
+        """Write in-progress results, at most every PARTIAL_STATUS_INTERVAL seconds"""
+        now = time.monotonic()
+        if not force and now - self.last_partial_write < PARTIAL_STATUS_INTERVAL:
+            return
+        self.last_partial_write = now
+        self.write_status({
+            "timestamp": datetime.now().isoformat(),
+            "running": stage,
+            stage: progress
+        })
+    
+    def cancel_build(self, reason: str) -> bool:
+        """Kill the cargo invocation in flight (and its rustc children)"""
+        with self.process_lock:
+            if self.process is None or self.process.poll() is not None:
+                return False
+            self.cancel_reason = reason
             try:
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return []
-        return []
+                os.killpg(self.process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            return True
+    
+    def cargo_command(self, subcommand: str, *args: str) -> List[str]:
+        command = ["cargo", subcommand]
+        if self.package:
+            command += ["-p", self.package]
+        if self.jobs:
+            command += ["--jobs", str(self.jobs)]
+        return command + list(args)
+    
+    def run_streaming(self, args: List[str], handle_line) -> Dict:
+        """Run cargo, feeding stdout lines to handle_line as they arrive
+        
+        Returns return_code, a bounded stderr tail, and "cancelled" ("timeout"
+        or "superseded") if the run was killed.
+        """
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        with self.process_lock:
+            self.cancel_reason = None
+            self.process = subprocess.Popen(
+                args, cwd=self.project_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, bufsize=1, start_new_session=True)
+            process = self.process
+        stderr_reader = threading.Thread(
+            target=lambda: stderr_tail.extend(line.rstrip() for line in process.stderr), daemon=True)
+        stderr_reader.start()
+        watchdog = threading.Timer(self.timeout, self.cancel_build, args=("timeout",))
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            for line in process.stdout:
+                handle_line(line)
+            return_code = process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                self.cancel_build("error")
+                process.wait()
+            stderr_reader.join(timeout=5)
+            with self.process_lock:
+                self.process = None
+        result = {
+            "return_code": return_code,
+            "stderr": "\n".join(stderr_tail) if stderr_tail else None
+        }
+        if self.cancel_reason:
+            result["cancelled"] = self.cancel_reason
+        return result
     
     def run_cargo_check(self) -> Dict:
-        """Run cargo check and capture output"""
+        """Run cargo check, streaming diagnostics as they are emitted"""
         try:
             # First check if project path exists
             if not os.path.exists(self.project_path):
@@ -51,40 +208,40 @@ class CargoDaemon:
                     "error": f"No Cargo.toml found in {self.project_path}"
                 }
             
-            # Run cargo check
-            result = subprocess.run(
-                ["cargo", "check", "--message-format=json"],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
-            )
+            # Counts plus the first few messages; everything else only as a compact file/span record
+            progress = {"error_count": 0, "warning_count": 0, "messages": []}
+            diagnostics = []
             
-            # Parse JSON output
-            messages = []
-            errors = []
-            warnings = []
-            
-            for line in result.stdout.splitlines():
+            def handle_line(line: str):
                 try:
                     msg = json.loads(line)
-                    if msg.get("reason") == "compiler-message":
-                        level = msg["message"]["level"]
-                        if level == "error":
-                            errors.append(msg["message"])
-                        elif level == "warning":
-                            warnings.append(msg["message"])
-                        messages.append(msg["message"])
                 except json.JSONDecodeError:
-                    continue
+                    return
+                if msg.get("reason") != "compiler-message":
+                    return
+                level = msg["message"]["level"]
+                if level == "error":
+                    progress["error_count"] += 1
+                elif level == "warning":
+                    progress["warning_count"] += 1
+                if len(progress["messages"]) < MAX_MESSAGES:
+                    progress["messages"].append(msg["message"])
+                diagnostic = compact_diagnostic(msg["message"])
+                if diagnostic and len(diagnostics) < MAX_DIAGNOSTICS:
+                    diagnostics.append(diagnostic)
+                # Surface the first error immediately, later ones at a bounded rate
+                self.publish_partial("check", progress, force=level == "error" and progress["error_count"] == 1)
+            
+            started = time.monotonic()
+            result = self.run_streaming(self.cargo_command("check", "--message-format=json"), handle_line)
             
             return {
                 "timestamp": datetime.now().isoformat(),
-                "success": result.returncode == 0,
-                "return_code": result.returncode,
-                "error_count": len(errors),
-                "warning_count": len(warnings),
-                "messages": messages[:10],  # Keep only first 10 messages
-                "stderr": result.stderr if result.stderr else None
+                "success": result["return_code"] == 0 and "cancelled" not in result,
+                "duration": round(time.monotonic() - started, 3),
+                **result,
+                **progress,
+                "diagnostics": diagnostics
             }
             
         except FileNotFoundError:
@@ -100,42 +257,61 @@ class CargoDaemon:
                 "error": str(e)
             }
     
-    def run_cargo_test(self) -> Dict:
-        """Run cargo test and capture results"""
+    def run_cargo_test(self, only: Optional[List[str]] = None) -> Dict:
+        """Run cargo test (or just the `only` tests), streaming per-test results as they finish"""
         try:
-            result = subprocess.run(
-                ["cargo", "test", "--", "--format=json"],
-                cwd=self.project_path,
-                capture_output=True,
-                text=True
-            )
-            
+            # libtest's JSON output is nightly-only; stable gets the text format
+            toolchain = self.fingerprint.toolchain_version()
+            json_format = "nightly" in toolchain or "-dev" in toolchain
+            parser = TestOutputParser(json_format)
             test_results = {
                 "passed": 0,
                 "failed": 0,
                 "ignored": 0
             }
+            events = []
+            stdout_tail = deque(maxlen=40)
             
-            # Parse test output
-            for line in result.stdout.splitlines():
-                if "test result:" in line:
-                    # Extract test summary
-                    parts = line.split()
-                    for i, part in enumerate(parts):
-                        if part == "passed;":
-                            test_results["passed"] = int(parts[i-1])
-                        elif part == "failed;":
-                            test_results["failed"] = int(parts[i-1])
-                        elif part == "ignored":
-                            test_results["ignored"] = int(parts[i-1])
+            def handle_line(line: str):
+                stdout_tail.append(line)
+                event = parser.feed(line)
+                if event:
+                    events.append(event)
+                    test_results[event["outcome"]] += 1
+                    self.publish_partial("test", {"test_results": test_results, "last_test": event},
+                                         force=event["outcome"] == "failed" and test_results["failed"] == 1)
             
-            return {
-                "timestamp": datetime.now().isoformat(),
-                "success": result.returncode == 0,
+            # --no-fail-fast: a failing test binary must not hide the results of the others
+            started = time.monotonic()
+            result = self.run_streaming(
+                self.cargo_command("test", "--no-fail-fast", "--", *libtest_args(json_format, only)), handle_line)
+            
+            timestamp = datetime.now().isoformat()
+            if "cancelled" not in result:
+                self.test_stats.record(events, timestamp)
+                if only is None and events and "could not compile" not in (result["stderr"] or ""):
+                    self.test_stats.forget_missing(event["name"] for event in events)
+                self.test_stats.save()
+            
+            timed = sorted((event for event in events if event["duration"] is not None),
+                           key=lambda event: -event["duration"])
+            status = {
+                "timestamp": timestamp,
+                "success": result["return_code"] == 0 and "cancelled" not in result,
+                "duration": round(time.monotonic() - started, 3),
+                "format": "json" if json_format else "text",
                 "test_results": test_results,
-                "stdout": result.stdout[-1000:],  # Last 1000 chars
-                "stderr": result.stderr[-1000:] if result.stderr else None
+                # Passing tests are only counted; their per-test outcomes are in cargo_tests.json
+                "failed_tests": sorted(event["name"] for event in events if event["outcome"] == "failed"),
+                "slowest": [{key: event[key] for key in ("name", "duration", "timing")} for event in timed[:10]],
+                "failures": parser.failures,
+                "stdout": "".join(stdout_tail)[-1000:],  # Last 1000 chars
+                "stderr": result["stderr"][-1000:] if result["stderr"] else None,
+                **({"cancelled": result["cancelled"]} if "cancelled" in result else {})
             }
+            if only is not None:
+                status["only"] = list(only)
+            return status
             
         except Exception as e:
             return {
@@ -144,67 +320,422 @@ class CargoDaemon:
                 "error": str(e)
             }
     
+    def run_tests(self) -> Dict:
+        """The test stage: previously failing tests first (if enabled), then the full suite
+        
+        If a previously failing test still fails, that verdict is returned
+        straight away and the full suite waits for the next change.
+        """
+        failing = self.test_stats.failing() if self.failed_first else []
+        if failing:
+            print(f"{self.label}Re-running {len(failing)} previously failing tests first...")
+            rerun = self.run_cargo_test(only=failing)
+            if not rerun["success"] or self.wakeup.is_set():
+                return rerun
+            self.publish_partial("test", {**rerun, "running": "full suite"}, force=True)
+        return self.run_cargo_test()
+    
     def update_logs(self):
         """Update cargo logs"""
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running cargo check...")
+        fingerprint = self.fingerprint.compute(self.package or "")
+        cached = self.result_cache.get(fingerprint)
+        superseded = False
+        if cached:
+            # Byte-for-byte the same inputs as an earlier run
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {self.label}Source unchanged, using cached result")
+            check_status, test_status = cached["check"], cached["test"]
+        else:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {self.label}Running cargo check...")
+            
+            # Run checks
+            check_status = self.run_cargo_check()
+            # A change that landed during the check makes its tests moot too
+            superseded = check_status.get("cancelled") == "superseded" or self.wakeup.is_set()
+            test_status = self.run_tests() if check_status["success"] and not superseded else None
+            superseded = superseded or (test_status or {}).get("cancelled") == "superseded"
+            
+            # Cache real outcomes of the full suite only (not timeouts, missing cargo or
+            # failed-first re-runs), and only if the tree is still the one that was built
+            incomplete = any("error" in s or "cancelled" in s or "only" in s for s in (check_status, test_status or {}))
+            if not superseded and not incomplete and self.fingerprint.compute(self.package or "") == fingerprint:
+                self.result_cache.put(fingerprint, {"check": check_status, "test": test_status})
         
-        # Run checks
-        check_status = self.run_cargo_check()
-        test_status = self.run_cargo_test() if check_status["success"] else None
+        # Full diagnostics go to their own file (and stay in the cache entry)
+        diagnostics = check_status.pop("diagnostics", None)
         
         # Combine results
         status = {
             "timestamp": datetime.now().isoformat(),
+            "fingerprint": fingerprint,
+            "cached": bool(cached),
             "check": check_status,
             "test": test_status
         }
         
+        if superseded:
+            self.write_status(status)
+            print(f"{self.label}… Superseded by a newer change, restarting")
+            return
+        
+        finished = "error" not in check_status and "cancelled" not in check_status
+        if diagnostics is not None and finished:
+            status["diagnostics"] = self.update_diagnostics(diagnostics, status)
+        
         # Save current status
-        with open(self.log_file, 'w') as f:
-            json.dump(status, f, indent=2)
+        self.write_status(status)
         
         # Add to history
         self.history.append(status)
-        
-        # Trim history if needed
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
-        
-        # Save history
-        with open(self.history_file, 'w') as f:
-            json.dump(self.history, f, indent=2)
+        self.last_status = status
         
         # Print summary
         if check_status["success"]:
-            print(f"✓ Cargo check passed")
+            print(f"{self.label}✓ Cargo check passed")
             if test_status:
                 tests = test_status.get("test_results", {})
-                print(f"✓ Tests: {tests.get('passed', 0)} passed, {tests.get('failed', 0)} failed")
+                scope = f" (re-run of {len(test_status['only'])} failing)" if test_status.get("only") else ""
+                print(f"{self.label}✓ Tests{scope}: {tests.get('passed', 0)} passed, {tests.get('failed', 0)} failed")
+                for name in test_status.get("failed_tests", [])[:5]:
+                    print(f"{self.label}  ✗ {name}")
         else:
-            print(f"✗ Cargo check failed: {check_status.get('error', 'Unknown error')}")
+            cancelled = check_status.get("cancelled")
+            reason = check_status.get("error") or (f"cancelled ({cancelled})" if cancelled else "build errors")
+            print(f"{self.label}✗ Cargo check failed: {reason}")
             if "error_count" in check_status:
-                print(f"  Errors: {check_status['error_count']}, Warnings: {check_status['warning_count']}")
+                print(f"{self.label}  Errors: {check_status['error_count']}, Warnings: {check_status['warning_count']}")
+        delta = status.get("diagnostics")
+        if delta and (delta["new"] or delta["resolved"] or delta["persisting"]):
+            print(f"{self.label}  Diagnostics: {delta['new']} new, {delta['resolved']} resolved, "
+                  f"{delta['persisting']} persisting")
+    
+    def current_locks(self) -> Dict[str, Dict]:
+        if not self.lock_source:
+            return {}
+        try:
+            return self.lock_source()
+        except Exception as e:
+            print(f"{self.label}Could not read file locks: {e}")
+            return {}
+    
+    def write_json(self, path: str, data: Dict):
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, path)
+    
+    def update_diagnostics(self, diagnostics: List[Dict], status: Dict) -> Dict:
+        """Diff against the previous check and hand each agent the delta for its locked files
+        
+        Writes the full index (by file, with the lock holder of each file) to
+        cargo_diagnostics.json and one small file per affected agent to
+        cargo_deltas/<agent>.json. Returns the counts for cargo_status.json.
+        """
+        current = DiagnosticIndex(diagnostics)
+        delta = current.diff(self.diagnostics)
+        self.diagnostics = current
+        
+        tagged = [dict(diag, state=state) for state in ("new", "resolved", "persisting") for diag in delta[state]]
+        routed = route_to_holders(tagged, self.current_locks(), self.project_path)
+        holders = {diag["file"]: agent_id for agent_id, diags in routed.items() for diag in diags}
+        
+        files = {}
+        for file_name, diags in current.by_file().items():
+            files[file_name] = {
+                "holder": holders.get(file_name),
+                "errors": sum(1 for diag in diags if diag["level"] == "error"),
+                "warnings": sum(1 for diag in diags if diag["level"] == "warning"),
+                "diagnostics": diags
+            }
+        self.write_json(self.diagnostics_file, {
+            "timestamp": status["timestamp"],
+            "fingerprint": status["fingerprint"],
+            "files": files,
+            "diagnostics": list(current.by_key.values())
+        })
+        
+        # Agents with nothing left still get an (empty) delta so stale entries are cleared
+        os.makedirs(self.deltas_dir, exist_ok=True)
+        agents = {agent_id for agent_id in routed if agent_id}
+        agents |= {name[:-len(".json")] for name in os.listdir(self.deltas_dir) if name.endswith(".json")}
+        for agent_id in agents:
+            diags = routed.get(agent_id, [])
+            self.write_json(os.path.join(self.deltas_dir, f"{agent_id}.json"), {
+                "timestamp": status["timestamp"],
+                "project": self.source_path,
+                "fingerprint": status["fingerprint"],
+                "new": [diag for diag in diags if diag["state"] == "new"],
+                "resolved": [diag for diag in diags if diag["state"] == "resolved"],
+                "persisting": [diag for diag in diags if diag["state"] == "persisting"]
+            })
+        
+        return {
+            "new": len(delta["new"]),
+            "resolved": len(delta["resolved"]),
+            "persisting": len(delta["persisting"]),
+            "erroring_files": {file_name: info["holder"] for file_name, info in files.items() if info["errors"]}
+        }
+    
+    def watched_paths(self) -> List[str]:
+        paths = [os.path.join(self.source_path, name) for name in WATCHED_INPUTS]
+        if self.source_path != self.project_path:
+            # A workspace member also depends on the workspace manifest and lockfile
+            paths += [os.path.join(self.project_path, "Cargo.toml"), os.path.join(self.project_path, "Cargo.lock")]
+        return paths
+    
+    def is_crate_input(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not (name.endswith(IGNORED_SUFFIXES) or name.startswith(".#"))
+    
+    def on_files_changed(self, paths: Set[str]):
+        """FileWatcher callback: edits have settled, wake the main loop"""
+        with self.changes_lock:
+            self.changed_paths |= paths
+        # Results for the old tree are moot; stop the build and start over
+        self.cancel_build("superseded")
+        self.wakeup.set()
+        if self.scheduler:
+            self.scheduler.enqueue(self)
+    
+    def take_changes(self) -> Set[str]:
+        with self.changes_lock:
+            changed, self.changed_paths = self.changed_paths, set()
+        self.wakeup.clear()
+        return changed
+    
+    def start_watcher(self):
+        self.watcher = FileWatcher(self.watched_paths(), self.on_files_changed,
+                                   debounce=self.debounce, include=self.is_crate_input)
+        self.watcher.start()
+        print(f"{self.label}Watching {self.source_path} for changes ({self.watcher.mode})")
+    
+    def run_watch_cycle(self, timeout: float):
+        """Wait for a change (or the backstop interval) and check if anything moved"""
+        self.wakeup.wait(timeout)
+        changed = self.take_changes()
+        snapshot = self.watcher.snapshot()
+        if not changed and snapshot == self.last_snapshot:
+            return  # backstop tick with an untouched tree
+        if changed:
+            names = sorted(os.path.relpath(p, self.project_path) for p in changed)
+            print(f"Changed: {', '.join(names[:5])}{' ...' if len(names) > 5 else ''}")
+        self.last_snapshot = snapshot
+        self.update_logs()
     
     def run(self):
         """Main daemon loop"""
         print(f"Starting Cargo daemon for: {self.project_path}")
-        print(f"Update interval: {self.update_interval} seconds")
+        print(f"Update interval: {self.update_interval} seconds{' (backstop)' if self.watch else ''}")
         print("Press Ctrl+C to stop")
         
         try:
-            while True:
+            if self.watch:
+                self.start_watcher()
+                self.last_snapshot = self.watcher.snapshot()
                 self.update_logs()
+                while True:
+                    self.run_watch_cycle(self.update_interval)
+            else:
+                while True:
+                    self.update_logs()
+                    time.sleep(self.update_interval)
+        except KeyboardInterrupt:
+            print("\nStopping Cargo daemon...")
+            if self.watcher:
+                self.watcher.stop()
+            sys.exit(0)
+
+class MultiProjectDaemon:
+    """One daemon for many crates: a bounded worker pool shared by all projects
+    
+    Jobs whose projects build into the same target directory wait in one
+    FIFO queue and run one at a time (cargo would serialise them on its
+    build-directory lock anyway); different target directories run in
+    parallel. Workers and per-build `--jobs` are sized so that together they
+    use about one job per core.
+    """
+    
+    def __init__(self, projects: List[Dict], update_interval: int = 300, workers: Optional[int] = None,
+                 timeout: float = 900, lock_source=None, failed_first: bool = False):
+        self.update_interval = update_interval
+        self.summary_file = "logs/cargo_projects.json"
+        self.condition = threading.Condition()
+        self.queues = {}        # target dir -> deque of projects waiting
+        self.queued = set()     # project names with a job waiting
+        self.busy = set()       # target dirs with a build in flight
+        self.running = False
+        self.threads = []
+        
+        cores = os.cpu_count() or 1
+        target_dirs = {project["target_dir"] for project in projects}
+        self.workers = workers or max(1, min(len(target_dirs), cores))
+        jobs = max(1, cores // self.workers)
+        
+        self.target_dirs = {}
+        self.projects = []
+        for project in projects:
+            daemon = CargoDaemon(project["path"], update_interval, timeout=timeout, name=project["name"],
+                                 package=project.get("package"), source_path=project.get("source_path"),
+                                 jobs=jobs, scheduler=self, lock_source=lock_source,
+                                 failed_first=failed_first)
+            self.target_dirs[project["name"]] = project["target_dir"]
+            self.projects.append(daemon)
+    
+    @staticmethod
+    def discover(paths: List[str], members: bool = False) -> List[Dict]:
+        """Describe projects (or, with members=True, every workspace member) with their target dirs"""
+        projects = []
+        for path in paths:
+            path = os.path.abspath(path)
+            metadata = cargo_metadata(path) or {}
+            target_dir = os.path.realpath(metadata.get("target_directory") or os.path.join(path, "target"))
+            if members and metadata.get("packages"):
+                root = metadata.get("workspace_root", path)
+                for package in metadata["packages"]:
+                    projects.append({"name": package["name"], "path": root, "package": package["name"],
+                                     "source_path": os.path.dirname(package["manifest_path"]),
+                                     "target_dir": target_dir})
+            else:
+                projects.append({"name": os.path.basename(path.rstrip(os.sep)), "path": path,
+                                 "target_dir": target_dir})
+        # Keep per-project log directories distinct
+        seen = {}
+        for project in projects:
+            count = seen.get(project["name"], 0)
+            seen[project["name"]] = count + 1
+            if count:
+                project["name"] = f"{project['name']}_{count}"
+        return projects
+    
+    def enqueue(self, project: CargoDaemon):
+        """Schedule a check (coalesced: a project is queued at most once)"""
+        with self.condition:
+            if project.name in self.queued:
+                return
+            self.queued.add(project.name)
+            self.queues.setdefault(self.target_dirs[project.name], deque()).append(project)
+            self.condition.notify()
+    
+    def next_job(self) -> Optional[CargoDaemon]:
+        """Oldest waiting project whose target dir is free (caller holds the condition)"""
+        for target_dir, queue in self.queues.items():
+            if queue and target_dir not in self.busy:
+                return queue.popleft()
+        return None
+    
+    def worker_loop(self):
+        while True:
+            with self.condition:
+                project = self.next_job()
+                while self.running and project is None:
+                    self.condition.wait()
+                    project = self.next_job()
+                if not self.running:
+                    return
+                target_dir = self.target_dirs[project.name]
+                self.busy.add(target_dir)
+                self.queued.discard(project.name)
+            try:
+                project.take_changes()
+                if project.watcher:
+                    project.last_snapshot = project.watcher.snapshot()
+                project.update_logs()
+                self.write_summary()
+            except Exception as e:
+                print(f"{project.label}Error: {e}")
+            finally:
+                with self.condition:
+                    self.busy.discard(target_dir)
+                    self.condition.notify_all()
+    
+    def write_summary(self):
+        """Per-project overview in logs/cargo_projects.json"""
+        summary = {}
+        for project in self.projects:
+            last = project.last_status or {}
+            check = last.get("check") or {}
+            test = last.get("test") or {}
+            summary[project.name] = {
+                "path": project.source_path,
+                "target_dir": self.target_dirs[project.name],
+                "status_file": project.log_file,
+                "last_run": last.get("timestamp"),
+                "check_success": check.get("success"),
+                "error_count": check.get("error_count"),
+                "warning_count": check.get("warning_count"),
+                "test_results": test.get("test_results")
+            }
+        with self.condition:
+            summary = {"timestamp": datetime.now().isoformat(), "workers": self.workers,
+                       "queued": sorted(self.queued), "projects": summary}
+            tmp_file = f"{self.summary_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_file, self.summary_file)
+    
+    def run(self):
+        """Watch every project and run checks on the worker pool"""
+        print(f"Starting Cargo daemon for {len(self.projects)} projects "
+              f"({self.workers} workers, {self.projects[0].jobs if self.projects else 0} jobs each)")
+        print(f"Update interval: {self.update_interval} seconds (backstop)")
+        print("Press Ctrl+C to stop")
+        
+        self.running = True
+        for project in self.projects:
+            project.start_watcher()
+            self.enqueue(project)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.worker_loop, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        try:
+            while True:
                 time.sleep(self.update_interval)
+                # Backstop: requeue projects whose inputs changed without an event
+                for project in self.projects:
+                    if project.watcher.snapshot() != project.last_snapshot:
+                        self.enqueue(project)
         except KeyboardInterrupt:
             print("\nStopping Cargo daemon...")
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+            for project in self.projects:
+                project.cancel_build("shutdown")
+                project.watcher.stop()
             sys.exit(0)
 
+
 if __name__ == "__main__":
-    # Get project path from command line or use current directory
-    project_path = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    # --no-watch restores plain interval polling; --members checks each workspace member separately;
+    # --failed-first re-runs previously failing tests before the full suite
+    watch = "--no-watch" not in sys.argv
+    members = "--members" in sys.argv
+    failed_first = "--failed-first" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in ("--no-watch", "--members", "--failed-first")]
     
-    # Get update interval from command line or use default
-    update_interval = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    # Project paths from the command line (default: current directory), then the update interval
+    project_paths = [arg for arg in args if not arg.isdigit()] or [os.getcwd()]
+    intervals = [arg for arg in args if arg.isdigit()]
+    update_interval = int(intervals[0]) if intervals else 300
+    
+    # Run from the coordinator's directory, diagnostics are routed to the agents holding file locks
+    lock_source = None
+    if os.path.isdir("shared"):
+        from task_manager import TaskManager
+        config = {}
+        if os.path.exists("config/agents.json"):
+            with open("config/agents.json", 'r') as f:
+                config = json.load(f)
+        task_manager = TaskManager(config.get("storage", {}).get("backend", "json"))
+        
+        def lock_source() -> Dict[str, Dict]:
+            task_manager.refresh_if_changed()
+            return task_manager.file_locks
     
-    daemon = CargoDaemon(project_path, update_interval)
+    if len(project_paths) > 1 or members:
+        daemon = MultiProjectDaemon(MultiProjectDaemon.discover(project_paths, members), update_interval,
+                                    lock_source=lock_source, failed_first=failed_first)
+    else:
+        daemon = CargoDaemon(project_paths[0], update_interval, watch=watch, lock_source=lock_source,
+                             failed_first=failed_first)
     daemon.run()
\ No newline at end of file
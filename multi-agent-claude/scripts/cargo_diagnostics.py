@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from path_locks import EXCLUSIVE, build_index
+
+MAX_DIAGNOSTICS = 2000  # per run; a broken build can emit far more
+
+
+def compact_diagnostic(message: Dict) -> Optional[Dict]:
+    """File/span summary of a rustc JSON diagnostic (None for errors/warnings without a span)"""
+    if message.get("level") not in ("error", "warning"):
+        return None
+    spans = message.get("spans") or []
+    primary = next((span for span in spans if span.get("is_primary")), spans[0] if spans else None)
+    if primary is None:
+        return None
+    snippet = ""
+    if primary.get("text"):
+        snippet = primary["text"][0].get("text", "").strip()[:200]
+    return {
+        "level": message["level"],
+        "code": (message.get("code") or {}).get("code"),
+        "message": message.get("message", ""),
+        "file": primary.get("file_name"),
+        "line": primary.get("line_start"),
+        "column": primary.get("column_start"),
+        "line_end": primary.get("line_end"),
+        "snippet": snippet
+    }
+
+
+class DiagnosticIndex:
+    """Diagnostics of one run, keyed so that the same problem keeps its key between runs
+
+    The key hashes file, level, code, message and the primary span's source
+    text, but not line numbers, so a diagnostic still counts as persisting
+    when edits above it move it around.
+    """
+
+    def __init__(self, diagnostics: Optional[List[Dict]] = None):
+        self.by_key = {}
+        occurrences = Counter()
+        for diag in diagnostics or []:
+            base = hashlib.sha1("\0".join(str(diag.get(field)) for field in
+                                          ("file", "level", "code", "message", "snippet")).encode()).hexdigest()[:16]
+            occurrences[base] += 1
+            key = base if occurrences[base] == 1 else f"{base}#{occurrences[base]}"
+            self.by_key[key] = {**diag, "key": key}
+
+    def by_file(self) -> Dict[str, List[Dict]]:
+        files = defaultdict(list)
+        for diag in self.by_key.values():
+            files[diag["file"]].append(diag)
+        for diags in files.values():
+            diags.sort(key=lambda d: (d.get("line") or 0, d.get("column") or 0))
+        return dict(files)
+
+    def diff(self, previous: "DiagnosticIndex") -> Dict[str, List[Dict]]:
+        """new / resolved / persisting relative to the previous run"""
+        return {
+            "new": [diag for key, diag in self.by_key.items() if key not in previous.by_key],
+            "resolved": [diag for key, diag in previous.by_key.items() if key not in self.by_key],
+            "persisting": [diag for key, diag in self.by_key.items() if key in previous.by_key]
+        }
+
+
+def route_to_holders(diagnostics: List[Dict], locks: Dict[str, Dict], project_path: str) -> Dict[str, List[Dict]]:
+    """Group diagnostics by the agent holding a lock on their file (or a directory above it)
+
+    Lock paths may be absolute, relative to the project, or relative to the
+    coordinator's working directory; unowned diagnostics go under None.
+    """
+    index = build_index(locks)
+    routed = defaultdict(list)
+    holders = {}
+    for diag in diagnostics:
+        file_name = diag.get("file")
+        if file_name not in holders:
+            absolute = os.path.abspath(os.path.join(project_path, file_name))
+            candidates = [absolute, os.path.relpath(absolute, project_path), os.path.relpath(absolute)]
+            holder = None
+            for candidate in candidates:
+                conflict = index.find_conflict(candidate, "", EXCLUSIVE)
+                if conflict is not None:
+                    holder = conflict[1]
+                    break
+            holders[file_name] = holder
+        routed[holders[file_name]].append(diag)
+    return dict(routed)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import subprocess
+import time
+from typing import Dict, Optional
+
+# Inputs that can change what cargo check/test produce
+INPUT_NAMES = {"Cargo.toml", "Cargo.lock", "build.rs", "rust-toolchain", "rust-toolchain.toml"}
+INPUT_SUFFIXES = (".rs",)
+SOURCE_DIRS = {"src", "tests", "benches", "examples"}  # everything inside counts (include_str! assets)
+SKIPPED_DIRS = {"target", ".git", "node_modules", "logs"}
+TOOLCHAIN_TTL = 300
+
+
+class SourceFingerprint:
+    """Content hash of a crate's inputs, kept current from stat data
+
+    A file is re-hashed only when its (inode, mtime, size) changes, so an
+    unchanged tree costs one stat per input. The fingerprint is a hash over
+    (relative path, content hash) pairs plus the rustc version, so reverting
+    the tree to an earlier state reproduces the earlier fingerprint.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.file_hashes = {}  # path -> ((inode, mtime_ns, size), sha256)
+        self.toolchain = None
+        self.toolchain_checked = 0.0
+
+    def is_input(self, relpath: str) -> bool:
+        parts = relpath.split(os.sep)
+        name = parts[-1]
+        if name in ("config", "config.toml"):
+            return len(parts) > 1 and parts[-2] == ".cargo"
+        return name in INPUT_NAMES or name.endswith(INPUT_SUFFIXES) or any(part in SOURCE_DIRS for part in parts[:-1])
+
+    def input_files(self):
+        for dirpath, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if d not in SKIPPED_DIRS and (not d.startswith(".") or d == ".cargo"))
+            for name in sorted(files):
+                path = os.path.join(dirpath, name)
+                if self.is_input(os.path.relpath(path, self.root)):
+                    yield path
+
+    def file_hash(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        cached = self.file_hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 16), b""):
+                    digest.update(block)
+        except OSError:
+            return None
+        self.file_hashes[path] = (signature, digest.hexdigest())
+        return self.file_hashes[path][1]
+
+    def toolchain_version(self) -> str:
+        """`rustc -vV`, re-read every TOOLCHAIN_TTL seconds"""
+        now = time.monotonic()
+        if self.toolchain is None or now - self.toolchain_checked > TOOLCHAIN_TTL:
+            try:
+                result = subprocess.run(["rustc", "-vV"], cwd=self.root, capture_output=True, text=True, timeout=30)
+                self.toolchain = result.stdout.strip()
+            except (OSError, subprocess.TimeoutExpired):
+                self.toolchain = "unknown"
+            self.toolchain_checked = now
+        return self.toolchain
+
+    def compute(self, *extra: str) -> str:
+        """Fingerprint of the current tree; `extra` distinguishes command variants"""
+        digest = hashlib.sha256()
+        digest.update(self.toolchain_version().encode())
+        for value in extra:
+            digest.update(b"\0" + str(value).encode())
+        seen = set()
+        for path in self.input_files():
+            file_hash = self.file_hash(path)
+            if file_hash is None:
+                continue
+            seen.add(path)
+            digest.update(b"\0" + os.path.relpath(path, self.root).encode() + b"\0" + file_hash.encode())
+        # Forget deleted files
+        for path in self.file_hashes.keys() - seen:
+            del self.file_hashes[path]
+        return digest.hexdigest()
+
+
+class ResultCache:
+    """Cargo results keyed by fingerprint, one JSON file each, oldest evicted first"""
+
+    def __init__(self, directory: str, max_entries: int = 64):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, fingerprint: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint}.json")
+
+    def get(self, fingerprint: str) -> Optional[Dict]:
+        path = self.path(fingerprint)
+        try:
+            with open(path, "r") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used
+        return result
+
+    def put(self, fingerprint: str, result: Dict):
+        tmp_file = self.path(fingerprint) + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_file, self.path(fingerprint))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.stat(path).st_mtime_ns, path))
+                except OSError:
+                    continue
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
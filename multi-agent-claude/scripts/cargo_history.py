@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Cargo run history: an append-only, rotated and gzipped log plus trend queries.
+
+    python3 scripts/cargo_history.py [history_dir] [since]
+"""
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from segmented_log import SegmentedLog
+
+# Bulky fields left out of history records (the latest full status is in cargo_status.json)
+BULKY_FIELDS = ("messages", "stdout", "stderr", "diagnostics", "failures")
+
+
+def history_record(status: Dict) -> Dict:
+    """Compact copy of a cargo status for the history log"""
+    record = {key: value for key, value in status.items() if key not in ("check", "test")}
+    for stage in ("check", "test"):
+        result = status.get(stage)
+        record[stage] = None if result is None else {
+            key: value for key, value in result.items() if key not in BULKY_FIELDS}
+    return record
+
+
+def seconds_between(start: str, end: str) -> float:
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class CargoHistory:
+    """History of cargo runs, O(1) to append, with trend queries
+
+    Segments roll over at 1MB and are gzipped once sealed, so months of
+    runs stay small. Queries stream records through SegmentedLog and can be
+    limited to a time range.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 1 << 20):
+        self.log = SegmentedLog(directory, segment_bytes=segment_bytes, compress=True)
+
+    def append(self, status: Dict) -> int:
+        return self.log.append(history_record(status))
+
+    def import_legacy(self, history_file: str):
+        """Move an old whole-file cargo_history.json into the log (once)"""
+        if not os.path.exists(history_file):
+            return
+        if not len(self.log):
+            try:
+                with open(history_file, 'r') as f:
+                    for status in json.load(f):
+                        self.append(status)
+            except (OSError, ValueError):
+                return
+        os.replace(history_file, history_file + ".migrated")
+
+    def runs(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict]:
+        cursor = None
+        while True:
+            page, cursor = self.log.query(since=since, until=until, cursor=cursor, limit=500)
+            yield from page
+            if cursor is None:
+                return
+
+    def latest(self, limit: int = 1) -> List[Dict]:
+        return self.log.latest(limit)
+
+    def diagnostics_over_time(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Error and warning counts per run"""
+        return [{"timestamp": run["timestamp"],
+                 "errors": (run.get("check") or {}).get("error_count"),
+                 "warnings": (run.get("check") or {}).get("warning_count")}
+                for run in self.runs(since, until) if run.get("check")]
+
+    def time_to_green(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict:
+        """Each break (first failing run) and how long until the next fully green run"""
+        breaks = []
+        broken_at = None
+        for run in self.runs(since, until):
+            check = run.get("check") or {}
+            if "error" in check or "cancelled" in check:
+                continue  # infrastructure trouble, not a verdict on the code
+            test = run.get("test") or {}
+            green = check.get("success") and test.get("success", True)
+            if not green and broken_at is None:
+                broken_at = run["timestamp"]
+            elif green and broken_at is not None:
+                breaks.append({"broken_at": broken_at, "fixed_at": run["timestamp"],
+                               "seconds": seconds_between(broken_at, run["timestamp"])})
+                broken_at = None
+        durations = [b["seconds"] for b in breaks]
+        return {
+            "breaks": breaks,
+            "still_broken_since": broken_at,
+            "mean_seconds": statistics.mean(durations) if durations else None,
+            "max_seconds": max(durations) if durations else None
+        }
+
+    def flaky_tests(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Tests that both passed and failed on the same source fingerprint
+
+        Records only name the failed tests, so a test passed in a run that
+        reported results, ran it (the whole suite, or a re-run that listed it)
+        and didn't fail it. Runs answered from the result cache are skipped;
+        without per-test names the whole suite is reported under "*".
+        """
+        outcomes = defaultdict(lambda: defaultdict(set))  # test -> fingerprint -> {passed, failed}
+        results = defaultdict(list)  # fingerprint -> [(tests run, None for all; failed tests)]
+        for run in self.runs(since, until):
+            test = run.get("test")
+            fingerprint = run.get("fingerprint")
+            if not test or run.get("cached") or not fingerprint or "cancelled" in test or "error" in test:
+                continue
+            failed = test.get("failed_tests")
+            if failed is None:
+                outcomes["*"][fingerprint].add(bool(test.get("success")))
+                continue
+            if sum((test.get("test_results") or {}).values()):
+                results[fingerprint].append((test.get("only"), set(failed)))
+        for fingerprint, runs in results.items():
+            for name in set().union(*(failed for _, failed in runs)):
+                outcomes[name][fingerprint] = {name not in failed for only, failed in runs
+                                               if only is None or name in only}
+        flaky = []
+        for name, by_fingerprint in outcomes.items():
+            flips = sum(1 for seen in by_fingerprint.values() if len(seen) == 2)
+            if flips:
+                flaky.append({"test": name, "fingerprints": flips})
+        return sorted(flaky, key=lambda item: -item["fingerprints"])
+
+    def durations(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict:
+        """Per-run check/test durations and their p50/p95"""
+        runs = []
+        for run in self.runs(since, until):
+            if run.get("cached"):
+                continue
+            runs.append({"timestamp": run["timestamp"],
+                         "check": (run.get("check") or {}).get("duration"),
+                         "test": (run.get("test") or {}).get("duration")})
+        summary = {"runs": runs}
+        for stage in ("check", "test"):
+            values = [run[stage] for run in runs if run[stage] is not None]
+            summary[stage] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                              "count": len(values)}
+        return summary
+
+
+if __name__ == "__main__":
+    history = CargoHistory(sys.argv[1] if len(sys.argv) > 1 else "logs/cargo_history")
+    since = sys.argv[2] if len(sys.argv) > 2 else None
+    counts = history.diagnostics_over_time(since)
+    green = history.time_to_green(since)
+    durations = history.durations(since)
+    print(f"Runs: {len(counts)}")
+    if counts:
+        print(f"Latest: {counts[-1]['errors']} errors, {counts[-1]['warnings']} warnings")
+    print(f"Breaks: {len(green['breaks'])}, mean time to green: {green['mean_seconds']}s"
+          f"{', broken since ' + green['still_broken_since'] if green['still_broken_since'] else ''}")
+    for stage in ("check", "test"):
+        print(f"{stage} duration p50={durations[stage]['p50']}s p95={durations[stage]['p95']}s")
+    for item in history.flaky_tests(since):
+        print(f"Flaky: {item['test']} ({item['fingerprints']} source states)")
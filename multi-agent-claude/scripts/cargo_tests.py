@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+# `test name ... ok` as printed by libtest's default (stable) output
+RESULT_LINE = re.compile(r"^test (.+?)(?: - should panic)? \.\.\. (ok|FAILED|ignored)(?:, .*)?$")
+SUITE_LINE = re.compile(r"^running \d+ tests?$")
+OUTCOMES = {"ok": "passed", "FAILED": "failed", "ignored": "ignored"}
+FAILURE_LINES = 20        # output lines kept per failed test
+MAX_FAILURES = 10         # failed tests whose output is kept
+LEADERBOARD_SIZE = 10
+EWMA_ALPHA = 0.3
+
+
+def libtest_args(json_format: bool, only: Optional[List[str]] = None) -> List[str]:
+    """Arguments after `cargo test --` (json_format needs a nightly toolchain)"""
+    args = ["-Z", "unstable-options", "--format=json", "--report-time"] if json_format else []
+    if only:
+        args += ["--exact"] + list(only)
+    return args
+
+
+class TestOutputParser:
+    """Turn libtest output into per-test events as it streams
+
+    With json_format (nightly) durations come from libtest's exec_time. The
+    stable text format has no per-test timing, so the time from the start of
+    the test binary to the result line is recorded instead; that is an upper
+    bound when tests run in parallel, marked with "timing": "upper_bound".
+    """
+
+    def __init__(self, json_format: bool = False):
+        self.json_format = json_format
+        self.suite_started = time.monotonic()
+        self.failures = {}          # test name -> first lines of its output
+        self.failure_name = None    # stable format: inside a "---- name stdout ----" section
+
+    def feed(self, line: str) -> Optional[Dict]:
+        """An event {"name", "outcome", "duration", "timing"} if the line finished a test"""
+        line = line.rstrip("\n")
+        return self.feed_json(line) if self.json_format else self.feed_text(line)
+
+    def feed_json(self, line: str) -> Optional[Dict]:
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(event, dict) or event.get("type") != "test":
+            return None
+        outcome = {"ok": "passed", "failed": "failed", "ignored": "ignored"}.get(event.get("event"))
+        if outcome is None:
+            return None
+        if outcome == "failed" and len(self.failures) < MAX_FAILURES:
+            self.failures[event["name"]] = (event.get("stdout") or "").splitlines()[:FAILURE_LINES]
+        return {"name": event["name"], "outcome": outcome,
+                "duration": event.get("exec_time"), "timing": "exact"}
+
+    def feed_text(self, line: str) -> Optional[Dict]:
+        if SUITE_LINE.match(line):
+            self.suite_started = time.monotonic()
+            self.failure_name = None
+            return None
+        match = RESULT_LINE.match(line)
+        if match:
+            name, outcome = match.group(1), OUTCOMES[match.group(2)]
+            duration = None if outcome == "ignored" else round(time.monotonic() - self.suite_started, 3)
+            return {"name": name, "outcome": outcome, "duration": duration, "timing": "upper_bound"}
+        if line.startswith("---- ") and line.endswith(" stdout ----"):
+            name = line[len("---- "):-len(" stdout ----")]
+            self.failure_name = name if len(self.failures) < MAX_FAILURES else None
+            if self.failure_name:
+                self.failures[name] = []
+        elif line == "failures:" or line.startswith("test result:"):
+            self.failure_name = None
+        elif self.failure_name and len(self.failures[self.failure_name]) < FAILURE_LINES:
+            self.failures[self.failure_name].append(line)
+        return None
+
+
+class TestStats:
+    """Per-test outcome and timing across runs (logs/cargo_tests.json)
+
+    Keeps the latest outcome and a moving average of the duration of every
+    test, which gives the slow-test leaderboard and the list of tests to
+    re-run first.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tests = {}
+        try:
+            with open(path, 'r') as f:
+                self.tests = json.load(f).get("tests", {})
+        except (OSError, ValueError):
+            pass
+
+    def record(self, events: List[Dict], timestamp: str):
+        for event in events:
+            stats = self.tests.setdefault(event["name"], {"runs": 0, "failures": 0, "duration": None})
+            stats["last_outcome"] = event["outcome"]
+            stats["last_run"] = timestamp
+            if event["outcome"] == "ignored":
+                continue
+            stats["runs"] += 1
+            if event["outcome"] == "failed":
+                stats["failures"] += 1
+            if event.get("duration") is not None:
+                previous = stats["duration"]
+                stats["duration"] = round(event["duration"] if previous is None else
+                                          EWMA_ALPHA * event["duration"] + (1 - EWMA_ALPHA) * previous, 4)
+                stats["timing"] = event["timing"]
+
+    def forget_missing(self, names):
+        """Drop tests that a full run no longer reports (renamed or deleted)"""
+        for name in set(self.tests) - set(names):
+            del self.tests[name]
+
+    def failing(self) -> List[str]:
+        return sorted(name for name, stats in self.tests.items() if stats.get("last_outcome") == "failed")
+
+    def leaderboard(self, limit: int = LEADERBOARD_SIZE, timing: str = "exact") -> List[Dict]:
+        """Slowest tests among those with this kind of timing
+
+        Upper bounds include time spent on other tests of the same binary, so
+        they are ranked apart from exact durations instead of against them.
+        """
+        timed = [(stats["duration"], name) for name, stats in self.tests.items()
+                 if stats.get("duration") is not None and stats.get("timing") == timing]
+        timed.sort(reverse=True)
+        return [{"name": name, "duration": duration, "timing": timing} for duration, name in timed[:limit]]
+
+    def save(self):
+        tmp_file = f"{self.path}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"tests": self.tests, "slowest": self.leaderboard(),
+                       "slowest_upper_bound": self.leaderboard(timing="upper_bound"),
+                       "failing": self.failing()}, f, indent=2)
+        os.replace(tmp_file, self.path)
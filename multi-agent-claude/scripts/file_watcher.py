@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def load_inotify():
+    """Return libc with inotify symbols, or None when unavailable"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """Watch files and directory trees; call back with changed paths once edits settle
+
+    Uses inotify on Linux and falls back to polling mtimes elsewhere (or when
+    use_inotify=False). Directories are watched recursively; `include` can
+    filter which paths count as changes (e.g. to ignore build output).
+    """
+
+    def __init__(self, paths: Iterable[str], callback: Callable[[Set[str]], None],
+                 debounce: float = 0.2, poll_interval: float = 1.0,
+                 include: Optional[Callable[[str], bool]] = None, use_inotify: bool = True):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.include = include or (lambda path: True)
+        self.libc = load_inotify() if use_inotify else None
+        self.mode = "inotify" if self.libc else "poll"
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        target = self.run_inotify if self.libc else self.run_poll
+        self.thread = threading.Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
+
+    def wanted(self, path: str) -> bool:
+        """Whether a path is one we watch (explicit file, or under a watched directory)"""
+        for watched in self.paths:
+            if path == watched or path.startswith(watched.rstrip(os.sep) + os.sep):
+                return self.include(path)
+        return False
+
+    def fire(self, changed: Set[str]):
+        if changed:
+            try:
+                self.callback(changed)
+            except Exception as e:
+                print(f"File watcher callback error: {e}")
+
+    # --- mtime polling fallback ---
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """Map every watched file to (mtime_ns, size)"""
+        result = {}
+        for watched in self.paths:
+            if os.path.isdir(watched):
+                for root, dirs, files in os.walk(watched):
+                    dirs[:] = [d for d in dirs if self.include(os.path.join(root, d))]
+                    for name in files:
+                        path = os.path.join(root, name)
+                        if self.include(path):
+                            try:
+                                st = os.stat(path)
+                            except OSError:
+                                continue
+                            result[path] = (st.st_mtime_ns, st.st_size)
+            else:
+                try:
+                    st = os.stat(watched)
+                    result[watched] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    pass
+        return result
+
+    def run_poll(self):
+        previous = self.snapshot()
+        pending = set()
+        last_change = 0.0
+        while self.running:
+            time.sleep(min(self.poll_interval, self.debounce) if pending else self.poll_interval)
+            current = self.snapshot()
+            changed = {p for p in current.keys() | previous.keys() if current.get(p) != previous.get(p)}
+            previous = current
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+            elif pending and time.monotonic() - last_change >= self.debounce:
+                self.fire(pending)
+                pending = set()
+
+    # --- inotify ---
+
+    def add_watch(self, fd: int, directory: str, watches: Dict[int, str], recursive: bool):
+        wd = self.libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK)
+        if wd < 0:
+            return
+        watches[wd] = directory
+        if recursive:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                return
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and self.include(entry.path):
+                    self.add_watch(fd, entry.path, watches, True)
+
+    def run_inotify(self):
+        fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            self.mode = "poll"
+            return self.run_poll()
+        watches = {}
+        try:
+            for watched in self.paths:
+                if os.path.isdir(watched):
+                    self.add_watch(fd, watched, watches, recursive=True)
+                else:
+                    # Watch the parent so replace-by-rename and re-creation are seen
+                    self.add_watch(fd, os.path.dirname(watched) or ".", watches, recursive=False)
+            pending = set()
+            deadline = None
+            while self.running:
+                timeout = 0.5 if deadline is None else max(0.0, deadline - time.monotonic())
+                ready, _, _ = select.select([fd], [], [], timeout)
+                if ready:
+                    try:
+                        data = os.read(fd, 65536)
+                    except BlockingIOError:
+                        continue
+                    offset = 0
+                    while offset + EVENT_HEADER.size <= len(data):
+                        wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                        offset += EVENT_HEADER.size
+                        name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                        offset += length
+                        directory = watches.get(wd)
+                        if directory is None:
+                            continue
+                        path = os.path.join(directory, name) if name else directory
+                        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and self.wanted(path):
+                            self.add_watch(fd, path, watches, recursive=True)
+                        if self.wanted(path):
+                            pending.add(path)
+                            deadline = time.monotonic() + self.debounce
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.fire(pending)
+                    pending = set()
+                    deadline = None
+        finally:
+            os.close(fd)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import heapq
+import json
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric runs ("eleventy_blog" -> ["eleventy", "blog"])"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def document_text(category: str, key: str, value: Any) -> str:
+    """Searchable text of a knowledge entry: its category, key and serialized value"""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True)
+    return f"{category} {key} {value}"
+
+
+class KnowledgeIndex:
+    """Incremental inverted index over knowledge base entries, ranked with BM25
+
+    Documents are (category, key) pairs. Adding or replacing an entry only
+    touches the postings of its own terms, and a query only visits the
+    postings of the query terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # term -> {(category, key): term frequency}
+        self.doc_terms = {}  # (category, key) -> Counter of terms
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    @classmethod
+    def build(cls, knowledge_base: Dict[str, Dict]) -> "KnowledgeIndex":
+        index = cls()
+        for category, items in knowledge_base.items():
+            if isinstance(items, dict):
+                for key, value in items.items():
+                    index.add(category, key, value)
+        return index
+
+    def add(self, category: str, key: str, value: Any):
+        """Index an entry, replacing any previous version of it"""
+        doc_id = (category, key)
+        self.remove(category, key)
+        terms = Counter(tokenize(document_text(category, key, value)))
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, category: str, key: str):
+        doc_id = (category, key)
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            docs = self.postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query: str, top_k: int = 10,
+               category: Optional[str] = None) -> List[Tuple[float, str, str]]:
+        """Best (score, category, key) matches for the query, highest score first"""
+        doc_count = len(self.doc_terms)
+        if not doc_count:
+            return []
+        avg_length = self.total_length / doc_count
+        scores = Counter()
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if category is not None and doc_id[0] != category:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, doc_id[0], doc_id[1]) for doc_id, score in ranked]
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import heapq
+from typing import List, Optional, Tuple
+
+
+class LeaseHeap:
+    """Min-heap of lease deadlines
+
+    Entries are (expires_at, kind, key, agent_id). Renewing a lease just
+    pushes a new entry; the owner decides on pop whether an entry is still
+    current, so expiring costs O(expired) rather than a scan of every lease.
+    """
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, expires_at: float, kind: str, key: str, agent_id: str) -> bool:
+        """Add a deadline; True if it is now the earliest one"""
+        heapq.heappush(self.heap, (expires_at, kind, key, agent_id))
+        return self.heap[0][0] == expires_at
+
+    def next_expiry(self) -> Optional[float]:
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float) -> List[Tuple[float, str, str, str]]:
+        """Remove and return every entry with expires_at <= now"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    def clear(self):
+        self.heap = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
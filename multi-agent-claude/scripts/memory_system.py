@@ -1,23 +1,128 @@
 #!/usr/bin/env python3
+import atexit
+import copy
 import json
 import os
+import tempfile
 import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from knowledge_index import KnowledgeIndex
+from segmented_log import SegmentedLog
+
+# Project history lists kept in append-only logs instead of project_state.json
+HISTORY_LOGS = ("completed_tasks", "blockers", "decisions_made")
+HISTORY_CONTEXT_LIMIT = 20  # newest history entries included in get_full_context
+
+
+def file_signature(filepath: str) -> Optional[Tuple[int, int, int, int]]:
+    """(device, inode, mtime_ns, size); changes whenever the file is rewritten or replaced"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def apply_context_delta(context: Optional[Dict], delta: Dict,
+                        history_limit: int = HISTORY_CONTEXT_LIMIT) -> Dict:
+    """A client's copy of get_full_context() brought up to date by a get_context_delta() result"""
+    if delta["full"]:
+        return delta["snapshot"]
+    for section, value in delta["changes"].items():
+        if section == "active_agents":
+            context["active_agents"] = value
+        elif section == "history":
+            state = context["project_state"]
+            for name, records in value.items():
+                state[name] = (state.get(name, []) + records)[-history_limit:]
+        elif section in delta["replaced"]:
+            if section == "project_state":
+                # The history lists come from the logs, not the file
+                value = {**value, **{name: context[section].get(name, []) for name in HISTORY_LOGS}}
+            context[section] = value
+        elif section == "knowledge_base":
+            for category, entries in value.items():
+                context[section].setdefault(category, {}).update(entries)
+        else:
+            context[section].update(value)
+    return context
+
+
+class CachedFile:
+    """Parsed contents of one memory file plus the on-disk signature they match"""
+    __slots__ = ("data", "signature", "dirty", "changed")
+    
+    def __init__(self, data: Dict, signature: Optional[Tuple]):
+        self.data = data
+        self.signature = signature
+        self.dirty = False
+        self.changed = set()  # top-level keys edited since the last write; None = the whole file
+
 
 class MemorySystem:
-    """Shared memory system for multi-agent coordination"""
+    """Shared memory system for multi-agent coordination
+    
+    The memory files are cached in-process. A cached file is re-read only when
+    its signature on disk changes (another process wrote it); mutations edit
+    the cache under one lock and a write-back thread saves them after
+    `write_delay` seconds, coalescing bursts into one write per file.
     
-    def __init__(self):
+    Several processes share these files. If one rewrote a file while we
+    held unsaved edits, the write-back merges: our edited top-level keys
+    (agent ids, knowledge categories, context fields) are applied on top of
+    the newer disk copy rather than replacing it. Edits to the same key
+    are last-writer-wins, and a wholesale save_json() replaces the file.
+    There is no cross-process lock, so a write landing between our re-read
+    and our rename can still be lost.
+    """
+    
+    def __init__(self, write_delay: float = 0.5, max_delta_changes: int = 1000):
         self.memory_dir = "shared/memory"
         self.context_file = "shared/memory/context.json"
         self.knowledge_base = "shared/memory/knowledge_base.json"
         self.agent_states = "shared/memory/agent_states.json"
         self.project_state = "shared/memory/project_state.json"
-        self.lock = threading.Lock()
+        self.history_dir = "shared/memory/history"
+        self.history_context_limit = HISTORY_CONTEXT_LIMIT
+        self.lock = threading.RLock()  # re-entrant so transaction() can wrap the mutators
+        self.txn = None  # open transaction: pre-edit copies of touched files, staged history
+        
+        # Write-back cache
+        self.cache = {}
+        self.write_delay = write_delay
+        self.write_wakeup = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.writer_thread = None
+        self.closed = False
+        atexit.register(self.flush)
+        
+        # Full-text index of the knowledge base, built on first search and then
+        # kept current by add_knowledge; rebuilt only if the file is reloaded
+        self.knowledge_index = None
+        self.indexed_knowledge = None
+        
+        # Every mutation bumps the version and records what it touched, so
+        # get_context_delta() can send agents only what changed. The epoch
+        # tells a client its version came from another instance/session.
+        self.version = 0
+        self.epoch = uuid.uuid4().hex
+        self.changes = deque(maxlen=max_delta_changes)  # (version, section, key path or None)
+        self.sections = {
+            self.context_file: "context",
+            self.knowledge_base: "knowledge_base",
+            self.agent_states: "agent_states",
+            self.project_state: "project_state"
+        }
         
         # Create memory directory
         os.makedirs(self.memory_dir, exist_ok=True)
+        self.history = {name: SegmentedLog(os.path.join(self.history_dir, name)) for name in HISTORY_LOGS}
+        self.history_seen = {name: len(log) for name, log in self.history.items()}  # records given a version
         
         # Initialize memory structures
         self.initialize_memory()
@@ -51,59 +156,282 @@ class MemorySystem:
         # Project state - overall project progress
         if not os.path.exists(self.project_state):
             self.save_json(self.project_state, {
-                "completed_tasks": [],
                 "current_tasks": [],
-                "pending_tasks": [],
-                "blockers": [],
-                "decisions_made": []
+                "pending_tasks": []
             })
+        self.migrate_history()
+        
+        # Create the files now rather than on the first write-back
+        self.flush()
     
-    def save_json(self, filepath: str, data: Dict):
-        """Thread-safe JSON save"""
+    def migrate_history(self):
+        """Move history lists left in project_state.json by older versions into the logs"""
         with self.lock:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
+            state = self.cached(self.project_state)
+            if not any(name in state for name in HISTORY_LOGS):
+                return
+        with self.edit(self.project_state) as state:
+            for name in HISTORY_LOGS:
+                for entry in state.pop(name, None) or []:
+                    self.append_history(name, self.history_record(entry))
     
-    def load_json(self, filepath: str) -> Dict:
-        """Thread-safe JSON load"""
+    def history_record(self, entry: Any) -> Dict:
+        if isinstance(entry, dict):
+            return {"timestamp": datetime.now().isoformat(), **entry}
+        return {"timestamp": datetime.now().isoformat(), "value": entry}
+    
+    def append_history(self, name: str, record: Dict) -> Optional[int]:
+        """Append to a history log (staged until commit inside a transaction); returns the seq"""
         with self.lock:
-            if os.path.exists(filepath):
+            if self.txn is not None:
+                self.txn["history"].append((name, record))
+                return None
+            # One critical section, so a record is never on disk without its version
+            seq = self.history[name].append(record)
+            self.sync_history(name)
+        return seq
+    
+    def sync_history(self, name: str):
+        """Version the records appended to a history log since we last looked,
+        by us or by another process (caller holds self.lock)"""
+        count = len(self.history[name])
+        seen = self.history_seen[name]
+        if count > seen:
+            self.record_change("history", (name, seen, count - 1))
+            self.history_seen[name] = count
+    
+    def cached(self, filepath: str) -> Dict:
+        """Current contents of a memory file (caller holds self.lock)"""
+        entry = self.cache.get(filepath)
+        if entry is not None and (entry.dirty or entry.signature == file_signature(filepath)):
+            return entry.data
+        # First use, or another process replaced the file since we last saw it.
+        # Unsaved local edits (dirty) always win over the disk copy.
+        signature = file_signature(filepath)
+        data = {}
+        if signature is not None:
+            try:
                 with open(filepath, 'r') as f:
-                    return json.load(f)
-            return {}
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        if entry is not None and data != entry.data:
+            self.record_change(self.sections.get(filepath))
+        self.cache[filepath] = CachedFile(data, signature)
+        return data
+    
+    def record_change(self, section: str, key: Optional[Tuple] = None):
+        """Bump the version (caller holds self.lock); key None means the whole section"""
+        self.version += 1
+        self.changes.append((self.version, section, key))
+    
+    @contextmanager
+    def edit(self, filepath: str, changed_keys: Optional[List[Tuple]] = None):
+        """Read-modify-write a memory file in one critical section
+        
+        changed_keys lists the key paths the edit touches, for delta sync;
+        None marks the whole file as changed.
+        """
+        with self.lock:
+            data = self.cached(filepath)
+            in_transaction = self.txn is not None
+            entry = self.cache[filepath]
+            if in_transaction and filepath not in self.txn["backups"]:
+                self.txn["backups"][filepath] = (copy.deepcopy(data), entry.dirty,
+                                                 None if entry.changed is None else set(entry.changed))
+            yield data
+            entry.dirty = True
+            if changed_keys is None:
+                entry.changed = None
+            elif entry.changed is not None:
+                entry.changed.update(key[0] for key in changed_keys)
+            if changed_keys is None and filepath == self.knowledge_base:
+                self.indexed_knowledge = None  # edited wholesale in place: the index can't follow
+            section = self.sections.get(filepath)
+            for key in changed_keys if changed_keys is not None else [None]:
+                self.record_change(section, key)
+        if not in_transaction:
+            self.schedule_write()
+    
+    @contextmanager
+    def transaction(self):
+        """Group memory updates into one commit
+        
+        Other threads wait until the block ends. On exit every touched file
+        is written once (all temp files first, then renamed together) and
+        staged history entries are appended; an exception rolls the staged
+        changes back instead. Nested blocks join the outer transaction.
+        """
+        with self.lock:
+            if self.txn is not None:
+                yield self
+                return
+            txn = self.txn = {"backups": {}, "history": []}
+            try:
+                yield self
+            except BaseException:
+                for path, (data, dirty, changed) in txn["backups"].items():
+                    self.cache[path].data = data
+                    self.cache[path].dirty = dirty
+                    self.cache[path].changed = changed
+                    self.record_change(self.sections.get(path))
+                raise
+            finally:
+                self.txn = None
+        for name, record in txn["history"]:
+            self.append_history(name, record)
+        if txn["backups"]:
+            self.flush()
+    
+    batch = transaction
+    
+    def schedule_write(self):
+        if self.writer_thread is None:
+            with self.lock:
+                if self.writer_thread is None:
+                    self.writer_thread = threading.Thread(target=self.write_back_loop, daemon=True)
+                    self.writer_thread.start()
+        self.write_wakeup.set()
+    
+    def write_back_loop(self):
+        while not self.closed:
+            self.write_wakeup.wait()
+            # Debounce: let a burst of updates land before writing
+            time.sleep(self.write_delay)
+            self.write_wakeup.clear()
+            self.flush()
+    
+    def merge_from_disk(self, filepath: str, entry: CachedFile):
+        """Fold another process's newer copy into our unsaved edits (caller holds self.lock)"""
+        try:
+            with open(filepath, 'r') as f:
+                disk = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(disk, dict):
+            return
+        # In place, so references to entry.data stay valid
+        for key in [key for key in entry.data if key not in disk and key not in entry.changed]:
+            del entry.data[key]
+        for key, value in disk.items():
+            if key not in entry.changed:
+                entry.data[key] = value
+        if filepath == self.knowledge_base:
+            self.indexed_knowledge = None
+        self.record_change(self.sections.get(filepath))
+    
+    def flush(self):
+        """Write every modified memory file now"""
+        with self.flush_lock:
+            with self.lock:
+                pending = []
+                for path, entry in self.cache.items():
+                    if not entry.dirty:
+                        continue
+                    if entry.changed is not None and file_signature(path) != entry.signature:
+                        self.merge_from_disk(path, entry)
+                    pending.append((path, json.dumps(entry.data, indent=2), entry.changed))
+                    entry.dirty = False
+                    entry.changed = set()
+            written = []
+            for path, text, changed in pending:
+                try:
+                    # A private temp file: other processes flush the same memory files
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                                    prefix=os.path.basename(path) + ".", suffix=".tmp")
+                    os.fchmod(fd, 0o644)  # mkstemp makes it owner-only
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(text)
+                    written.append((path, tmp_path, changed))
+                except OSError as e:
+                    print(f"Error saving {path}: {e}")
+                    self.mark_unsaved(path, changed)
+            # Rename only once every file is staged, so files updated together land together
+            for path, tmp_path, changed in written:
+                try:
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    print(f"Error saving {path}: {e}")
+                    self.mark_unsaved(path, changed)
+                    try:
+                        os.unlink(tmp_path)
+                    except OSError:
+                        pass
+                    continue
+                with self.lock:
+                    self.cache[path].signature = file_signature(path)
+    
+    def mark_unsaved(self, path: str, changed: Optional[set]):
+        """Put a failed write's edits back so the next flush retries them"""
+        with self.lock:
+            entry = self.cache[path]
+            entry.dirty = True
+            if changed is None or entry.changed is None:
+                entry.changed = None
+            else:
+                entry.changed |= changed
+    
+    def close(self):
+        """Flush pending writes and stop the write-back thread"""
+        self.closed = True
+        self.write_wakeup.set()
+        if self.writer_thread is not None and self.writer_thread is not threading.current_thread():
+            self.writer_thread.join(timeout=self.write_delay + 2)
+        self.flush()
+    
+    def save_json(self, filepath: str, data: Dict):
+        """Thread-safe JSON save (written back asynchronously)"""
+        with self.edit(filepath) as current:
+            current.clear()
+            current.update(copy.deepcopy(data))
+    
+    def load_json(self, filepath: str) -> Dict:
+        """Thread-safe JSON load (a copy of the cached contents)"""
+        with self.lock:
+            return copy.deepcopy(self.cached(filepath))
     
     def update_context(self, updates: Dict):
         """Update project context"""
-        context = self.load_json(self.context_file)
-        context.update(updates)
-        context["last_updated"] = datetime.now().isoformat()
-        self.save_json(self.context_file, context)
+        keys = [(key,) for key in updates] + [("last_updated",)]
+        with self.edit(self.context_file, keys) as context:
+            context.update(copy.deepcopy(updates))
+            context["last_updated"] = datetime.now().isoformat()
     
     def add_knowledge(self, category: str, key: str, value: Any):
         """Add to knowledge base"""
-        kb = self.load_json(self.knowledge_base)
-        if category not in kb:
-            kb[category] = {}
-        kb[category][key] = value
-        self.save_json(self.knowledge_base, kb)
+        with self.edit(self.knowledge_base, [(category, key)]) as kb:
+            if category not in kb:
+                kb[category] = {}
+            kb[category][key] = copy.deepcopy(value)
+            if self.indexed_knowledge is kb:
+                self.knowledge_index.add(category, key, value)
     
     def update_agent_state(self, agent_id: str, state: Dict):
         """Update individual agent state"""
-        states = self.load_json(self.agent_states)
-        states[agent_id] = {
-            **state,
-            "last_active": datetime.now().isoformat()
-        }
-        self.save_json(self.agent_states, states)
+        with self.edit(self.agent_states, [(agent_id,)]) as states:
+            states[agent_id] = {
+                **copy.deepcopy(state),
+                "last_active": datetime.now().isoformat()
+            }
     
     def get_agent_state(self, agent_id: str) -> Optional[Dict]:
         """Get agent state"""
-        states = self.load_json(self.agent_states)
-        return states.get(agent_id)
+        with self.lock:
+            return copy.deepcopy(self.cached(self.agent_states).get(agent_id))
     
     def update_project_state(self, updates: Dict):
-        """Update overall project state"""
-        state = self.load_json(self.project_state)
+        """Update overall project state; completed tasks, blockers and decisions go to the history logs"""
+        updates = copy.deepcopy(updates)
+        for name in HISTORY_LOGS:
+            if name in updates:
+                value = updates.pop(name)
+                for entry in value if isinstance(value, list) else [value]:
+                    self.append_history(name, self.history_record(entry))
+        if updates:
+            with self.edit(self.project_state, [(key,) for key in updates]) as state:
+                self.merge_project_state(state, updates)
+    
+    def merge_project_state(self, state: Dict, updates: Dict):
         for key, value in updates.items():
             if key in state:
                 if isinstance(state[key], list):
@@ -113,46 +441,121 @@ class MemorySystem:
                         state[key].append(value)
                 else:
                     state[key] = value
-        self.save_json(self.project_state, state)
     
     def get_full_context(self) -> Dict:
         """Get complete context for new agents"""
-        return {
-            "context": self.load_json(self.context_file),
-            "knowledge_base": self.load_json(self.knowledge_base),
-            "project_state": self.load_json(self.project_state),
-            "active_agents": list(self.load_json(self.agent_states).keys())
-        }
+        with self.lock:
+            full_context = copy.deepcopy({
+                "context": self.cached(self.context_file),
+                "knowledge_base": self.cached(self.knowledge_base),
+                "project_state": self.cached(self.project_state),
+                "active_agents": list(self.cached(self.agent_states).keys())
+            })
+        # Only the recent end of each history; use get_history() for the rest
+        for name, log in self.history.items():
+            full_context["project_state"][name] = log.latest(self.history_context_limit)
+        return full_context
     
     def log_decision(self, agent_id: str, decision: str, reasoning: str):
         """Log important decisions made by agents"""
-        state = self.load_json(self.project_state)
-        state["decisions_made"].append({
+        self.append_history("decisions_made", {
             "agent_id": agent_id,
             "decision": decision,
             "reasoning": reasoning,
             "timestamp": datetime.now().isoformat()
         })
-        self.save_json(self.project_state, state)
     
-    def get_relevant_knowledge(self, task_type: str) -> Dict:
-        """Get knowledge relevant to a specific task"""
-        kb = self.load_json(self.knowledge_base)
-        relevant = {}
+    def get_history(self, name: str, agent_id: Optional[str] = None, since: Optional[str] = None,
+                    until: Optional[str] = None, cursor: Optional[int] = None,
+                    limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+        """Page through completed_tasks, blockers or decisions_made, oldest first
         
-        # Simple relevance matching - can be enhanced
-        for category, items in kb.items():
-            if task_type.lower() in category.lower():
-                relevant[category] = items
-            else:
-                # Check individual items
-                relevant_items = {}
-                for key, value in items.items():
-                    if task_type.lower() in key.lower():
-                        relevant_items[key] = value
-                if relevant_items:
-                    relevant[category] = relevant_items
+        Pass the returned cursor back in to get the next page (None means done).
+        """
+        return self.history[name].query(agent_id, since, until, cursor, limit)
+    
+    def get_context_delta(self, since_version: int, epoch: Optional[str] = None) -> Dict:
+        """Changes since since_version, or a full snapshot if that version is unknown or too old
         
+        Returns {"version", "epoch", "full": True, "snapshot": get_full_context()}
+        or {"version", "epoch", "full": False, "changes": {...}, "replaced": [...]}.
+        Changes hold only the touched keys (knowledge by category then key,
+        history as the newly appended records); sections listed in "replaced"
+        are sent whole and should replace the client's copy.
+        """
+        with self.lock:
+            # The version only moves once a change is noticed: look for writes
+            # made by other processes before taking it
+            for path in self.sections:
+                self.cached(path)
+            for name in self.history:
+                self.sync_history(name)
+            version = self.version
+            too_old = bool(self.changes) and since_version < self.changes[0][0] - 1
+            if (epoch is not None and epoch != self.epoch) or since_version > version or too_old or \
+                    (not self.changes and since_version != version):
+                delta = None
+            else:
+                delta = {"version": version, "epoch": self.epoch, "full": False, "changes": {}, "replaced": []}
+                changed = {}
+                history_range = {}  # log name -> (first, last) seq appended in the window
+                for change_version, section, key in reversed(self.changes):
+                    if change_version <= since_version:
+                        break
+                    if section == "history":
+                        name, first, last = key
+                        if name in history_range:
+                            first = min(first, history_range[name][0])
+                            last = max(last, history_range[name][1])
+                        history_range[name] = (first, last)
+                    elif key is None:
+                        changed[section] = None
+                    elif changed.get(section, ()) is not None:
+                        changed.setdefault(section, set()).add(key)
+                for section, keys in changed.items():
+                    data = self.cached(next(path for path, name in self.sections.items() if name == section))
+                    if section == "agent_states":
+                        # Agents see the roster, as in get_full_context
+                        delta["changes"]["active_agents"] = list(data.keys())
+                    elif keys is None:
+                        delta["changes"][section] = copy.deepcopy(data)
+                        delta["replaced"].append(section)
+                    else:
+                        out = delta["changes"].setdefault(section, {})
+                        for key in keys:
+                            value = data
+                            for part in key:
+                                value = value.get(part) if isinstance(value, dict) else None
+                            target = out
+                            for part in key[:-1]:
+                                target = target.setdefault(part, {})
+                            target[key[-1]] = copy.deepcopy(value)
+        if delta is None:
+            return {"version": version, "epoch": self.epoch, "full": True, "snapshot": self.get_full_context()}
+        if history_range:
+            # Records appended after `version` belong to the next delta
+            delta["changes"]["history"] = {
+                name: [record for record in self.history[name].query(cursor=first - 1, limit=last - first + 1)[0]
+                       if record["seq"] <= last]
+                for name, (first, last) in history_range.items()}
+        return delta
+    
+    def search_knowledge(self, query: str, top_k: int = 10, category: Optional[str] = None) -> List[Dict]:
+        """Knowledge entries ranked by BM25 relevance to the query (keys and values are indexed)"""
+        with self.lock:
+            kb = self.cached(self.knowledge_base)
+            if self.indexed_knowledge is not kb:
+                self.knowledge_index = KnowledgeIndex.build(kb)
+                self.indexed_knowledge = kb
+            return [{"category": cat, "key": key, "score": score, "value": copy.deepcopy(kb[cat][key])}
+                    for score, cat, key in self.knowledge_index.search(query, top_k, category)
+                    if key in kb.get(cat, {})]
+    
+    def get_relevant_knowledge(self, task_type: str, top_k: int = 20, category: Optional[str] = None) -> Dict:
+        """Get knowledge relevant to a specific task, best matches first"""
+        relevant = {}
+        for hit in self.search_knowledge(task_type, top_k, category):
+            relevant.setdefault(hit["category"], {})[hit["key"]] = hit["value"]
         return relevant
 
 if __name__ == "__main__":
@@ -178,6 +581,7 @@ if __name__ == "__main__":
         "knowledge_gained": ["eleventy_structure"]
     })
     
+    memory.flush()
     print("Memory system initialized and tested!")
     print("\nFull context:")
     print(json.dumps(memory.get_full_context(), indent=2))
\ No newline at end of file
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""In-process metrics with a small HTTP endpoint.
+
+    GET /metrics        Prometheus text format (0.0.4)
+    GET /metrics.json   the same values as JSON
+"""
+import asyncio
+import json
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds; suits latencies from sub-millisecond hand-offs to multi-hour tasks
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600, 14400)
+REQUEST_TIMEOUT = 5.0
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metric:
+    """A named family of values, one per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), lock=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = lock or threading.Lock()
+
+    def key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(sample name, labels, value) triples, as exposed to Prometheus"""
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(self.values.items())]
+
+    def as_dict(self) -> Dict:
+        return {"type": self.kind, "help": self.help,
+                "values": [{"labels": dict(zip(self.labelnames, key)), "value": value}
+                           for key, value in sorted(self.values.items())]}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def replace(self, values: Dict[Tuple, float]):
+        """Set every labelled value at once; combinations not given drop to 0"""
+        with self.lock:
+            self.values = {**{key: 0.0 for key in self.values}, **values}
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, lock=None):
+        super().__init__(name, help_text, labelnames, lock)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, (counts, total) in sorted(self.values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+    def as_dict(self) -> Dict:
+        values = []
+        for key, (counts, total) in sorted(self.values.items()):
+            count = sum(counts)
+            cumulative, buckets = 0, {}
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                buckets[format_value(bound)] = cumulative
+            values.append({"labels": dict(zip(self.labelnames, key)), "count": count,
+                           "sum": round(total, 6), "mean": round(total / count, 6) if count else 0.0,
+                           "buckets": buckets})
+        return {"type": self.kind, "help": self.help, "values": values}
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms updated in place as things happen
+
+    Values are only rendered when scraped. Collectors registered with
+    add_collector() run first, to copy gauges from state that is already
+    kept incrementally elsewhere (task counts, held claims) instead of
+    recounting it.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.lock = threading.RLock()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames, self.lock))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames, self.lock))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets, self.lock))
+
+    def add_collector(self, callback: Callable[[], None]):
+        self.collectors.append(callback)
+
+    def collect(self):
+        for callback in self.collectors:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+
+    def prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        self.collect()
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def as_dict(self) -> Dict:
+        self.collect()
+        with self.lock:
+            return {metric.name: metric.as_dict() for metric in self.metrics}
+
+
+class MetricsServer:
+    """Serves a registry over HTTP on the running asyncio loop (no threads, no file I/O)"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # the real one when port 0 was asked for
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def respond(self, method: str, target: str) -> Tuple[str, str, bytes]:
+        """(status line, content type, body) for a request"""
+        path, _, query = target.partition("?")
+        if method not in ("GET", "HEAD"):
+            return "405 Method Not Allowed", "text/plain", b"method not allowed\n"
+        if path == "/metrics.json" or (path == "/metrics" and "format=json" in query):
+            return "200 OK", "application/json", json.dumps(self.registry.as_dict(), indent=2).encode()
+        if path == "/metrics":
+            return "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.registry.prometheus().encode()
+        return "404 Not Found", "text/plain", b"try /metrics or /metrics.json\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            while (await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)).strip():
+                pass  # headers are not needed
+            parts = request_line.decode(errors="replace").split()
+            if len(parts) < 2:
+                return
+            status, content_type, body = self.respond(parts[0].upper(), parts[1])
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode())
+            if parts[0].upper() != "HEAD":
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EXCLUSIVE = "exclusive"
+SHARED = "shared"
+
+
+def path_parts(path: str) -> List[str]:
+    """Split a path into normalised components ("src/_includes/" -> ["src", "_includes"])"""
+    normalized = os.path.normpath(path.replace("\\", "/")) if path else ""
+    parts = [part for part in normalized.split("/") if part not in ("", ".")]
+    if path.startswith("/"):
+        parts.insert(0, "/")
+    return parts
+
+
+def canonical_path(path: str) -> str:
+    """Canonical string form used as the lock's path"""
+    parts = path_parts(path)
+    if parts and parts[0] == "/":
+        return "/" + "/".join(parts[1:])
+    return "/".join(parts)
+
+
+def ancestor_paths(path: str) -> List[str]:
+    """Canonical paths of every ancestor directory, root first, excluding the path itself"""
+    parts = path_parts(path)
+    result = []
+    for i in range(len(parts)):
+        prefix = parts[:i]
+        if prefix and prefix[0] == "/":
+            result.append("/" + "/".join(prefix[1:]))
+        else:
+            result.append("/".join(prefix))
+    return result
+
+
+def conflicts(held_mode: str, wanted_mode: str) -> bool:
+    """Two locks by different agents on overlapping paths conflict unless both are shared"""
+    return held_mode == EXCLUSIVE or wanted_mode == EXCLUSIVE
+
+
+class PathLockNode:
+    __slots__ = ("children", "exclusive", "shared", "below")
+
+    def __init__(self):
+        self.children = {}
+        self.exclusive = None      # agent holding an exclusive lock on this exact path
+        self.shared = Counter()    # agents holding shared locks on this exact path
+        self.below = {EXCLUSIVE: Counter(), SHARED: Counter()}  # locks strictly inside, per agent
+
+
+class PathLockIndex:
+    """Path trie of file/directory locks
+
+    A lock on a directory covers everything beneath it. Each node keeps
+    per-agent counts of the locks in its subtree, so checking a request
+    against ancestors and descendants costs O(path depth), not O(locks held).
+    """
+
+    def __init__(self):
+        self.root = PathLockNode()
+
+    def walk(self, parts: List[str], create: bool = False) -> List[PathLockNode]:
+        """Nodes from the root down to the path (shorter if it doesn't exist)"""
+        nodes = [self.root]
+        node = self.root
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    break
+                child = node.children[part] = PathLockNode()
+            nodes.append(child)
+            node = child
+        return nodes
+
+    def add(self, path: str, agent_id: str, mode: str = EXCLUSIVE):
+        parts = path_parts(path)
+        nodes = self.walk(parts, create=True)
+        for node in nodes[:-1]:
+            node.below[mode][agent_id] += 1
+        if mode == EXCLUSIVE:
+            nodes[-1].exclusive = agent_id
+        else:
+            nodes[-1].shared[agent_id] += 1
+
+    def remove(self, path: str, agent_id: str, mode: str = EXCLUSIVE):
+        parts = path_parts(path)
+        nodes = self.walk(parts)
+        if len(nodes) != len(parts) + 1:
+            return
+        target = nodes[-1]
+        if mode == EXCLUSIVE:
+            if target.exclusive != agent_id:
+                return
+            target.exclusive = None
+        else:
+            if not target.shared[agent_id]:
+                return
+            target.shared[agent_id] -= 1
+            if not target.shared[agent_id]:
+                del target.shared[agent_id]
+        for node in nodes[:-1]:
+            node.below[mode][agent_id] -= 1
+            if not node.below[mode][agent_id]:
+                del node.below[mode][agent_id]
+        # Prune empty branches
+        for depth in range(len(parts), 0, -1):
+            node = nodes[depth]
+            if node.children or node.exclusive or node.shared:
+                break
+            del nodes[depth - 1].children[parts[depth - 1]]
+
+    def find_conflict(self, path: str, agent_id: str, mode: str = EXCLUSIVE) -> Optional[Tuple[str, str, str]]:
+        """(path, agent_id, mode) of a lock by another agent blocking this request, else None"""
+        parts = path_parts(path)
+        nodes = self.walk(parts)
+        # The path itself and its ancestors
+        for depth, node in enumerate(nodes):
+            holder = self.blocking_holder(node, agent_id, mode)
+            if holder:
+                return (self.join(parts[:depth]),) + holder
+        if len(nodes) != len(parts) + 1:
+            return None
+        # Anything locked inside it
+        target = nodes[-1]
+        for held_mode in (EXCLUSIVE, SHARED):
+            if conflicts(held_mode, mode) and any(a != agent_id for a in target.below[held_mode]):
+                return self.find_below(target, parts, agent_id, mode)
+        return None
+
+    def blocking_holder(self, node: PathLockNode, agent_id: str, mode: str) -> Optional[Tuple[str, str]]:
+        if node.exclusive is not None and node.exclusive != agent_id:
+            return (node.exclusive, EXCLUSIVE)
+        if mode == EXCLUSIVE:
+            for holder in node.shared:
+                if holder != agent_id:
+                    return (holder, SHARED)
+        return None
+
+    def find_below(self, node: PathLockNode, parts: List[str], agent_id: str, mode: str) -> Optional[Tuple[str, str, str]]:
+        """Descend to one concrete conflicting lock (only used to report a conflict)"""
+        for name, child in node.children.items():
+            holder = self.blocking_holder(child, agent_id, mode)
+            if holder:
+                return (self.join(parts + [name]),) + holder
+            if any(a != agent_id and conflicts(m, mode) for m in (EXCLUSIVE, SHARED) for a in child.below[m]):
+                return self.find_below(child, parts + [name], agent_id, mode)
+        return None
+
+    def join(self, parts: List[str]) -> str:
+        if parts and parts[0] == "/":
+            return "/" + "/".join(parts[1:])
+        return "/".join(parts)
+
+
+def lock_key(path: str, agent_id: str, mode: str) -> str:
+    """Storage key of a lock: the path for exclusive locks, one key per holder for shared ones"""
+    path = canonical_path(path)
+    return path if mode == EXCLUSIVE else f"{path}#shared:{agent_id}"
+
+
+def normalize_requests(requests: Iterable) -> List[Tuple[str, str]]:
+    """Canonical, de-duplicated, sorted (path, mode) list; exclusive wins over shared"""
+    modes = {}
+    for request in requests:
+        path, mode = (request, EXCLUSIVE) if isinstance(request, str) else request
+        path = canonical_path(path)
+        if modes.get(path) != EXCLUSIVE:
+            modes[path] = mode
+    return sorted(modes.items())
+
+
+def build_index(locks: Dict[str, Dict]) -> PathLockIndex:
+    """Index storage lock entries (key -> entry)"""
+    index = PathLockIndex()
+    for key, entry in locks.items():
+        index.add(entry.get("path", key), entry["agent_id"], entry.get("mode", EXCLUSIVE))
+    return index
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Shared API-call budget for every agent process.
+
+    python3 scripts/rate_limiter.py acquire <agent_id> [timeout]   # block until a call may be made
+    python3 scripts/rate_limiter.py stats
+"""
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+IDLE_AFTER = 10.0   # an agent that hasn't asked for this long no longer claims a share
+SEEN_REFRESH = IDLE_AFTER / 2  # a denied agent's last_seen is written back at most this often
+MAX_SLEEP = 1.0     # re-check at least this often while waiting (shares change as agents come and go)
+
+
+class RateLimiter:
+    """GCRA limiter whose state lives in a lock-protected file, so all processes share one budget
+
+    The whole budget is rate_per_minute calls spaced evenly (plus `burst`
+    calls of slack). Agents that have asked recently split it by weight:
+    an agent may go no faster than its share while others are active,
+    unless a slot has gone unclaimed for half an interval, and with no
+    competition it gets the whole rate, so the budget isn't left idle.
+    Nothing is reserved ahead: a waiting caller sleeps until its earliest
+    slot and tries again. Denied attempts only read the file, apart from
+    keeping a waiting agent counted as active. Grants and waiting times are
+    kept per agent in the same file.
+    """
+
+    def __init__(self, path: str = "shared/rate_limit.json", rate_per_minute: float = 20, burst: int = 1,
+                 weights: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.interval = 60.0 / rate_per_minute
+        self.tolerance = self.interval * max(0, burst - 1)
+        self.weights = weights or {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["RateLimiter"]:
+        """The limiter an agent process was started with (RATE_LIMIT_FILE etc.), if any"""
+        path = os.environ.get("RATE_LIMIT_FILE")
+        if not path:
+            return None
+        weights = {}
+        if os.environ.get("AGENT_ID") and os.environ.get("AGENT_API_WEIGHT"):
+            weights[os.environ["AGENT_ID"]] = float(os.environ["AGENT_API_WEIGHT"])
+        return cls(path, float(os.environ.get("RATE_LIMIT_PER_MINUTE", "20")),
+                   int(os.environ.get("RATE_LIMIT_BURST", "1")), weights)
+
+    @contextmanager
+    def locked(self):
+        """Exclusive flock shared by every process using this state file"""
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_state(self) -> Dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"tat": 0.0, "agents": {}}
+
+    def write_state(self, state: Dict):
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.path)
+
+    @contextmanager
+    def locked_state(self):
+        """Read-modify-write the shared state under an exclusive flock"""
+        with self.locked():
+            state = self.read_state()
+            yield state
+            self.write_state(state)
+
+    def try_acquire(self, agent_id: str, weight: Optional[float] = None, cost: int = 1) -> float:
+        """Take `cost` calls if allowed now (returns 0), else seconds until the next try"""
+        weight = weight or self.weights.get(agent_id, 1.0)
+        now = time.time()
+        with self.locked():
+            state = self.read_state()
+            agents = state["agents"]
+            agent = agents.get(agent_id)
+            # Worth writing back even if denied: a new agent, a new weight or a stale last_seen
+            changed = (agent is None or agent.get("weight") != weight
+                       or now - agent.get("last_seen", 0) >= SEEN_REFRESH)
+            if agent is None:
+                agent = agents[agent_id] = {"tat": 0.0, "granted": 0, "waits": 0,
+                                            "wait_total": 0.0, "wait_max": 0.0}
+            agent["weight"] = weight
+            agent["last_seen"] = now
+            state["rate_per_minute"] = round(60.0 / self.interval, 3)
+            active_weight = sum(other["weight"] for other in agents.values()
+                                if now - other.get("last_seen", 0) < IDLE_AFTER)
+            share_interval = self.interval * active_weight / weight
+            global_wait = state["tat"] - self.tolerance - now
+            agent_wait = agent["tat"] - self.tolerance * weight / active_weight - now
+            # A slot nobody has taken for half an interval may go to an agent over its share
+            borrow_wait = global_wait + self.interval / 2
+            wait = max(global_wait, min(agent_wait, borrow_wait))
+            if wait > 0:
+                if changed:
+                    self.write_state(state)
+                return wait
+            # The global schedule never starts in the past, so rate_per_minute (plus
+            # burst) is a hard ceiling. Within it, an agent that wakes up a little
+            # late keeps its place in its own share (up to half a share interval),
+            # so scheduling jitter doesn't cost it its turn
+            state["tat"] = max(state["tat"], now) + self.interval * cost
+            agent["tat"] = max(agent["tat"], now - share_interval / 2) + share_interval * cost
+            agent["granted"] += cost
+            self.write_state(state)
+            return 0.0
+
+    def record_wait(self, agent_id: str, waited: float):
+        with self.locked_state() as state:
+            agent = state["agents"].get(agent_id)
+            if agent is not None:
+                agent["waits"] += 1
+                agent["wait_total"] = round(agent["wait_total"] + waited, 3)
+                agent["wait_max"] = round(max(agent["wait_max"], waited), 3)
+
+    def acquire(self, agent_id: str, weight: Optional[float] = None, cost: int = 1,
+                timeout: Optional[float] = None) -> bool:
+        """Block until the call is allowed; False if timeout passes first"""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(agent_id, weight, cost)
+            waited = time.monotonic() - started
+            if wait <= 0:
+                if waited > 0.001:
+                    self.record_wait(agent_id, waited)
+                return True
+            if timeout is not None and waited + wait > timeout:
+                return False
+            time.sleep(min(wait, MAX_SLEEP))
+
+    async def acquire_async(self, agent_id: str, weight: Optional[float] = None, cost: int = 1,
+                            timeout: Optional[float] = None) -> bool:
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the loop"""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(agent_id, weight, cost)
+            waited = time.monotonic() - started
+            if wait <= 0:
+                if waited > 0.001:
+                    self.record_wait(agent_id, waited)
+                return True
+            if timeout is not None and waited + wait > timeout:
+                return False
+            await asyncio.sleep(min(wait, MAX_SLEEP))
+
+    def metrics(self) -> Dict:
+        """Per-agent grants and waiting times, plus totals"""
+        with self.locked():
+            state = self.read_state()
+            rate = state.get("rate_per_minute", round(60.0 / self.interval, 3))
+            agents = {agent_id: {key: agent[key] for key in ("weight", "granted", "waits", "wait_total", "wait_max")}
+                      for agent_id, agent in state["agents"].items()}
+        waits = sum(agent["waits"] for agent in agents.values())
+        wait_total = sum(agent["wait_total"] for agent in agents.values())
+        return {
+            "rate_per_minute": rate,
+            "granted": sum(agent["granted"] for agent in agents.values()),
+            "waits": waits,
+            "mean_wait": round(wait_total / waits, 3) if waits else 0.0,
+            "agents": agents
+        }
+
+
+if __name__ == "__main__":
+    limiter = RateLimiter.from_env() or RateLimiter()
+    if len(sys.argv) > 2 and sys.argv[1] == "acquire":
+        timeout = float(sys.argv[3]) if len(sys.argv) > 3 else None
+        sys.exit(0 if limiter.acquire(sys.argv[2], timeout=timeout) else 1)
+    elif len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print(json.dumps(limiter.metrics(), indent=2))
+    else:
+        print(__doc__)
+        sys.exit(2)
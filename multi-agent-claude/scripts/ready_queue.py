@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+# Lower rank is handed out first; unknown priorities sort last
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+class ReadyQueue:
+    """Pending, unclaimed tasks ordered by priority, critical path then creation time, indexed by task type"""
+
+    def __init__(self):
+        self.global_heap = []
+        self.type_heaps = {}
+        self.entries = {}  # task_id -> current heap key; anything else in a heap is stale
+        self.counter = itertools.count()
+
+    def make_key(self, task: Dict, critical_path: float = 0.0) -> Tuple:
+        # Within a priority, tasks holding up the longest chain of work go first
+        return (PRIORITY_ORDER.get(task.get("priority"), len(PRIORITY_ORDER)),
+                -critical_path,
+                task.get("created_at") or "",
+                next(self.counter),
+                str(task["id"]))
+
+    def push(self, task: Dict, critical_path: float = 0.0):
+        """Add (or re-prioritise) a ready task"""
+        key = self.make_key(task, critical_path)
+        self.entries[key[-1]] = key
+        heapq.heappush(self.global_heap, key)
+        heapq.heappush(self.type_heaps.setdefault(task.get("type", "general"), []), key)
+        self.maybe_compact()
+
+    def discard(self, task_id: str):
+        """Remove a task if queued (lazy: stale heap entries are skipped later)"""
+        self.entries.pop(str(task_id), None)
+
+    def peek(self, task_type: Optional[str] = None) -> Optional[str]:
+        """Id of the next task overall, or of the given type"""
+        heap = self.global_heap if task_type is None else self.type_heaps.get(task_type)
+        if not heap:
+            return None
+        while heap and self.entries.get(heap[0][-1]) != heap[0]:
+            heapq.heappop(heap)
+        return heap[0][-1] if heap else None
+
+    def pop(self, task_type: Optional[str] = None) -> Optional[str]:
+        task_id = self.peek(task_type)
+        if task_id is not None:
+            self.discard(task_id)
+        return task_id
+
+    def ordered_ids(self) -> List[str]:
+        """All queued task ids in hand-out order"""
+        return [key[-1] for key in sorted(self.entries.values())]
+
+    def top_ids(self, limit: int) -> List[str]:
+        """The first `limit` task ids in hand-out order"""
+        return [key[-1] for key in heapq.nsmallest(limit, self.entries.values())]
+
+    def maybe_compact(self):
+        """Rebuild heaps once stale entries outnumber live ones"""
+        if len(self.global_heap) <= 2 * len(self.entries) + 64:
+            return
+        live = set(self.entries.values())
+        self.global_heap = [key for key in self.global_heap if key in live]
+        heapq.heapify(self.global_heap)
+        for task_type, heap in list(self.type_heaps.items()):
+            heap = [key for key in heap if key in live]
+            if heap:
+                heapq.heapify(heap)
+                self.type_heaps[task_type] = heap
+            else:
+                del self.type_heaps[task_type]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, task_id: str) -> bool:
+        return str(task_id) in self.entries
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+def decode_line(line: bytes) -> Optional[Dict]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def empty_segment(first: int) -> Dict:
+    return {"name": f"segment_{first:012d}.jsonl", "first": first, "count": 0, "bytes": 0,
+            "min_ts": None, "max_ts": None, "agents": [], "offsets": []}
+
+
+class SegmentedLog:
+    """Append-only JSONL history split into size-bounded segments
+
+    Every record gets a sequence number, which doubles as a pagination
+    cursor. index.json describes the sealed segments: sequence range, time
+    range, agents seen and the byte offset of every `index_every`-th record.
+    Queries use it to skip whole segments and seek straight to a cursor, so
+    they never parse more history than they return (plus one segment's
+    worth at most). Appends are safe across processes (flock). With
+    compress=True sealed segments are gzipped. A complete line that isn't
+    valid JSON still takes its sequence number but is skipped by queries.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 1 << 20, index_every: int = 64,
+                 compress: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_every = index_every
+        self.compress = compress
+        self.index_file = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.index_signature = None
+        self.sealed = []
+        self.active = empty_segment(0)
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            self.load()
+
+    def path(self, segment: Dict) -> str:
+        return os.path.join(self.directory, segment["name"])
+
+    @contextmanager
+    def exclusive(self):
+        """Cross-process append lock"""
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stat_signature(self, path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+            return (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def load(self):
+        """Read the segment index and scan the active segment"""
+        self.index_signature = self.stat_signature(self.index_file)
+        self.sealed = []
+        if self.index_signature is not None:
+            with open(self.index_file, "r") as f:
+                self.sealed = json.load(f).get("segments", [])
+        first = self.sealed[-1]["first"] + self.sealed[-1]["count"] if self.sealed else 0
+        self.active = empty_segment(first)
+        self.scan(self.active)
+
+    def refresh(self):
+        """Pick up appends and segment rolls made by other processes"""
+        if self.stat_signature(self.index_file) != self.index_signature:
+            self.load()
+            return
+        try:
+            size = os.path.getsize(self.path(self.active))
+        except OSError:
+            size = 0
+        if size > self.active["bytes"]:
+            self.scan(self.active)
+
+    def scan(self, segment: Dict):
+        """Index complete records past segment["bytes"] (a torn last line is left alone)"""
+        try:
+            f = open(self.path(segment), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(segment["bytes"])
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = decode_line(line)
+                if record is None:
+                    # Keep it counted so sequence numbers and offsets stay aligned
+                    print(f"Skipping corrupt record at byte {segment['bytes']} of {self.path(segment)}")
+                    record = {}
+                self.index_record(segment, record, len(line))
+
+    def index_record(self, segment: Dict, record: Dict, size: int):
+        if segment["count"] % self.index_every == 0:
+            segment["offsets"].append(segment["bytes"])
+        segment["count"] += 1
+        segment["bytes"] += size
+        timestamp = record.get("timestamp")
+        if timestamp:
+            if segment["min_ts"] is None or timestamp < segment["min_ts"]:
+                segment["min_ts"] = timestamp
+            if segment["max_ts"] is None or timestamp > segment["max_ts"]:
+                segment["max_ts"] = timestamp
+        agent_id = record.get("agent_id")
+        if agent_id and agent_id not in segment["agents"]:
+            segment["agents"].append(agent_id)
+
+    def append(self, record: Dict) -> int:
+        """Append a record; returns its sequence number"""
+        with self.lock, self.exclusive():
+            self.refresh()
+            path = self.path(self.active)
+            if os.path.exists(path) and os.path.getsize(path) > self.active["bytes"]:
+                # Drop a torn tail left by a writer that died mid-append
+                os.truncate(path, self.active["bytes"])
+            seq = self.active["first"] + self.active["count"]
+            record = {"seq": seq, **record}
+            line = (json.dumps(record) + "\n").encode()
+            with open(path, "ab") as f:
+                f.write(line)
+            self.index_record(self.active, record, len(line))
+            if self.active["bytes"] >= self.segment_bytes:
+                self.seal()
+            return seq
+
+    def seal(self):
+        """Close the active segment and record it in the index"""
+        plain_path = self.path(self.active)
+        if self.compress:
+            with open(plain_path, "rb") as src, gzip.open(plain_path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            self.active["name"] += ".gz"
+        self.sealed.append(self.active)
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"segments": self.sealed}, f)
+        os.replace(tmp_file, self.index_file)
+        self.index_signature = self.stat_signature(self.index_file)
+        if self.compress:
+            os.remove(plain_path)
+        self.active = empty_segment(self.active["first"] + self.active["count"])
+
+    def read_segment(self, segment: Dict, start_seq: int, end_seq: Optional[int] = None) -> Iterator[Dict]:
+        """Records of a segment from start_seq on (up to end_seq), seeking via the sparse offset index"""
+        skip = start_seq - segment["first"]
+        slot = min(skip // self.index_every, len(segment["offsets"]) - 1)
+        skip -= slot * self.index_every
+        count = segment["count"] if end_seq is None else min(segment["count"], end_seq - segment["first"])
+        remaining = count - slot * self.index_every
+        opener = gzip.open if segment["name"].endswith(".gz") else open
+        with opener(self.path(segment), "rb") as f:
+            f.seek(segment["offsets"][slot])  # offsets are into the uncompressed stream
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= 1
+                if skip > 0:
+                    skip -= 1
+                    continue
+                record = decode_line(line)
+                if record is not None:
+                    yield record
+
+    def segment_matches(self, segment: Dict, agent_id: Optional[str],
+                        since: Optional[str], until: Optional[str]) -> bool:
+        if not segment["count"]:
+            return False
+        if agent_id is not None and agent_id not in segment["agents"]:
+            return False
+        if since is not None and segment["max_ts"] is not None and segment["max_ts"] < since:
+            return False
+        if until is not None and segment["min_ts"] is not None and segment["min_ts"] > until:
+            return False
+        return True
+
+    def query(self, agent_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              cursor: Optional[int] = None, limit: int = 100) -> Tuple[List[Dict], Optional[int]]:
+        """Records matching the filters, oldest first
+
+        Times are ISO timestamps (since/until inclusive). Returns the page
+        and a cursor for the next page, or None once the history is exhausted.
+        """
+        with self.lock:
+            self.refresh()
+            segments = self.sealed + [dict(self.active, offsets=list(self.active["offsets"]))]
+        start = 0 if cursor is None else cursor + 1
+        results = []
+        for segment in segments:
+            if segment["first"] + segment["count"] <= start:
+                continue
+            if not self.segment_matches(segment, agent_id, since, until):
+                continue
+            for record in self.read_segment(segment, max(start, segment["first"])):
+                if agent_id is not None and record.get("agent_id") != agent_id:
+                    continue
+                timestamp = record.get("timestamp") or ""
+                if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                    continue
+                results.append(record)
+                if len(results) == limit:
+                    return results, record["seq"]
+        return results, None
+
+    def latest(self, limit: int = 20, agent_id: Optional[str] = None) -> List[Dict]:
+        """The newest `limit` records (oldest first), reading segments from the end"""
+        with self.lock:
+            self.refresh()
+            segments = self.sealed + [dict(self.active, offsets=list(self.active["offsets"]))]
+        results = []
+        for segment in reversed(segments):
+            if len(results) >= limit:
+                break
+            if not self.segment_matches(segment, agent_id, None, None):
+                continue
+            # Read back from the end of the segment only as far as needed: exactly the
+            # missing records when unfiltered, one offset slot at a time when filtered
+            end = segment["first"] + segment["count"]
+            while end > segment["first"] and len(results) < limit:
+                need = limit - len(results)
+                if agent_id is None:
+                    start = max(segment["first"], end - need)
+                else:
+                    start = end - 1 - (end - 1 - segment["first"]) % self.index_every
+                records = [record for record in self.read_segment(segment, start, end)
+                           if agent_id is None or record.get("agent_id") == agent_id]
+                results = records[-need:] + results
+                end = start
+        return results
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.refresh()
+            return self.active["first"] + self.active["count"]
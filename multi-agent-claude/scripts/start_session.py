@@ -1,31 +1,144 @@
 #!/usr/bin/env python3
+import asyncio
 import json
-import subprocess
+import signal
 import time
 import os
 import sys
-import threading
-from typing import Dict, List, Optional
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 from task_manager import TaskManager
 from memory_system import MemorySystem
+from file_watcher import FileWatcher
+from async_logger import create_logger
+from assignment import SkillMatcher
+from agent_supervisor import AgentSupervisor, parse_cpu, parse_size
+from rate_limiter import RateLimiter
+from metrics import MetricsRegistry, MetricsServer
+
+COMMAND_TIMEOUT = 10.0  # seconds allowed for a startup check such as `eigencode --version`
+
+
+async def run_command(*args: str, timeout: float = COMMAND_TIMEOUT) -> Tuple[int, str]:
+    """Run a short command without blocking the event loop; (returncode, stdout)"""
+    process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.DEVNULL)
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode(errors="replace")
 
 class AgentCoordinator:
     def __init__(self, config_path: str):
         self.log_file = "logs/coordinator.log"
         self.active_agents = {}
-        self.task_manager = TaskManager()
-        self.memory_system = MemorySystem()
+        self.agent_status_counts = Counter()  # kept current by set_agent_status()
         self.running = False
+        
+        # Log writes happen on a background thread; until the config (and with it
+        # the "logging" section) is loaded, messages wait in pending_logs
+        self.logger = None
+        self.pending_logs = []
         self.config = self.load_config(config_path)
+        self.logger = create_logger(self.log_file, self.config.get("logging", {}))
+        for message, level, fields in self.pending_logs:
+            self.logger.log(message, level, **fields)
+        self.pending_logs = []
+        
+        self.task_manager = TaskManager(
+            self.config.get("storage", {}).get("backend", "json"),
+            lease_ttl=self.config.get("coordination", {}).get("lease_ttl")
+        )
+        self.memory_system = MemorySystem()
         
-    def log(self, message: str, level: str = "INFO"):
-        """Log messages with timestamp and level"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] [{level}] {message}"
-        print(log_message)
-        with open(self.log_file, 'a') as f:
-            f.write(log_message + "\n")
+        # Scores agent skills/type/load against task skills/type/priority;
+        # task templates in config/tasks.json supply required_skills
+        self.matcher = SkillMatcher(self.config.get("coordination", {}).get("assignment_weights"),
+                                    "config/tasks.json")
+        
+        # One API-call budget shared by every agent process (and anything else that
+        # calls out, via scripts/rate_limiter.py acquire)
+        limits = self.config.get("resource_limits", {})
+        self.rate_limiter = None
+        if limits.get("max_api_calls_per_minute"):
+            self.rate_limiter = RateLimiter("shared/rate_limit.json", limits["max_api_calls_per_minute"],
+                                            limits.get("api_burst", 1))
+        
+        # With supervisor.command set, every agent runs as a supervised child process
+        self.supervisor = None
+        supervisor_config = self.config.get("supervisor", {})
+        if supervisor_config.get("command"):
+            self.supervisor = AgentSupervisor(
+                supervisor_config["command"], self.on_agent_event,
+                memory_limit=parse_size(limits.get("max_memory_per_agent")),
+                cpu_limit=parse_cpu(limits.get("max_cpu_per_agent")),
+                restart_backoff=supervisor_config.get("restart_backoff", 1.0),
+                max_backoff=supervisor_config.get("max_backoff", 60.0),
+                max_restarts=supervisor_config.get("max_restarts", 5)
+            )
+        
+        # Counters, gauges and histograms for monitoring; served over HTTP when
+        # metrics.port is set
+        self.setup_metrics()
+        self.metrics_server = None
+        
+        # Everything that touches coordinator state (active_agents, assignment, agent
+        # events, stdin commands) runs on one asyncio loop. Loops sleep on these
+        # events and are woken as soon as something changes; the interval
+        # timeouts are only a fallback. Other threads (file watcher, lease reaper)
+        # reach the loop through wake().
+        self.loop = None
+        self.assignment_wakeup = asyncio.Event()
+        self.monitor_wakeup = asyncio.Event()
+        self.stop_requested = asyncio.Event()
+        self.stdin_buffer = b""
+        self.store_watcher = None
+        if self.config.get("coordination", {}).get("event_driven_assignment", True):
+            self.task_manager.add_listener(self.on_task_event)
+        
+    def setup_metrics(self):
+        """Create the coordinator's metrics; they are updated as tasks and agents change state"""
+        registry = self.metrics = MetricsRegistry()
+        self.tasks_gauge = registry.gauge("coordinator_tasks", "Tasks by status and type", ("status", "type"))
+        self.ready_gauge = registry.gauge("coordinator_ready_tasks", "Pending tasks ready to be assigned")
+        self.agents_gauge = registry.gauge("coordinator_agents", "Agents by status", ("status",))
+        self.claims_gauge = registry.gauge("coordinator_task_claims", "Task claims currently held")
+        self.locks_gauge = registry.gauge("coordinator_file_locks", "File locks currently held")
+        self.assigned_total = registry.counter("coordinator_tasks_assigned_total",
+                                               "Tasks handed to each agent", ("agent_id",))
+        self.completed_total = registry.counter("coordinator_tasks_completed_total",
+                                                "Tasks each agent completed", ("agent_id",))
+        self.failed_total = registry.counter("coordinator_tasks_failed_total",
+                                             "Tasks each agent reported as failed", ("agent_id",))
+        self.restarts_total = registry.counter("coordinator_agent_restarts_total",
+                                               "Agent processes restarted after a crash", ("agent_id",))
+        self.assignment_latency = registry.histogram("coordinator_assignment_latency_seconds",
+                                                     "Time from task creation to assignment")
+        self.task_duration = registry.histogram("coordinator_task_duration_seconds",
+                                                "Time from assignment to completion", ("type",))
+        registry.gauge("coordinator_start_time_seconds", "Unix time the coordinator started").set(time.time())
+        registry.add_collector(self.collect_metrics)
+    
+    def collect_metrics(self):
+        """Copy counts that are already kept incrementally into gauges (runs at scrape time)"""
+        self.tasks_gauge.replace({(str(status), str(task_type)): count for (status, task_type), count
+                                  in self.task_manager.get_type_counts().items()})
+        self.ready_gauge.set(self.task_manager.pending_count())
+        self.agents_gauge.replace({(status,): count for status, count in self.agent_status_counts.items()})
+        leases = self.task_manager.get_lease_counts()
+        self.claims_gauge.set(leases["task"])
+        self.locks_gauge.set(leases["file"])
+    
+    def log(self, message: str, level: str = "INFO", **fields):
+        """Log messages with timestamp and level (fields such as agent_id/task_id/event go to JSONL logs)"""
+        if self.logger is None:
+            self.pending_logs.append((message, level, fields))
+            return
+        self.logger.log(message, level, **fields)
     
     def load_config(self, path: str) -> Dict:
         """Load configuration from JSON file"""
@@ -51,36 +164,47 @@ class AgentCoordinator:
                 "task_assignment_strategy": "load_balanced",
                 "conflict_resolution": "timestamp_based",
                 "communication_interval": 60,
-                "health_check_interval": 300
-            }
+                "health_check_interval": 300,
+                "event_driven_assignment": True,
+                "assignment_fallback_interval": 60,
+                "monitor_interval": 30,
+                "status_interval": 60,
+                "lease_ttl": 30
+            },
+            "metrics": {"host": "127.0.0.1", "port": None}
         }
     
     def start_session(self, task_description: str):
-        """Initialize multi-agent network with coordination"""
+        """Initialize multi-agent network with coordination; returns once the session is shut down"""
+        asyncio.run(self.run_session(task_description))
+    
+    async def run_session(self, task_description: str):
+        self.loop = asyncio.get_running_loop()
         self.log(f"=== Starting Multi-Agent Session ===")
         self.log(f"Task: {task_description}")
         self.log(f"Agents: {self.config['num_agents']}")
         
-        # Update memory with session info
-        self.memory_system.update_context({
-            "session_start": datetime.now().isoformat(),
-            "main_task": task_description,
-            "num_agents": self.config['num_agents'],
-            "agent_types": self.config['agent_types']
-        })
-        
-        # Create initial task breakdown
-        self.create_initial_tasks(task_description)
-        
-        # Initialize infrastructure
-        self.setup_infrastructure()
+        # Startup memory updates are committed together, one write per file
+        with self.memory_system.transaction():
+            # Update memory with session info
+            self.memory_system.update_context({
+                "session_start": datetime.now().isoformat(),
+                "main_task": task_description,
+                "num_agents": self.config['num_agents'],
+                "agent_types": self.config['agent_types']
+            })
+            
+            # Create initial task breakdown
+            self.create_initial_tasks(task_description)
         
-        # Start agents
-        self.start_agents()
+        # Infrastructure checks and agent start await subprocesses, so they run
+        # outside the transaction (its lock must not be held across awaits)
+        await self.setup_infrastructure()
+        await self.start_agents()
         
         # Start coordination loop
         self.running = True
-        self.coordinate_agents()
+        await self.coordinate_agents()
     
     def create_initial_tasks(self, description: str):
         """Break down main task into subtasks based on agent specializations"""
@@ -90,53 +214,72 @@ class AgentCoordinator:
         subtasks = self.analyze_and_breakdown_task(description)
         
         # Add tasks to shared todo system
-        todo_data = self.task_manager.load_json(self.task_manager.todo_file)
-        if "tasks" not in todo_data:
-            todo_data["tasks"] = []
+        task_count = len(self.task_manager.tasks)
+        new_tasks = []
+        ids = {}  # subtask description -> task id, for resolving depends_on
         
         for task in subtasks:
-            todo_data["tasks"].append({
-                "id": f"task_{len(todo_data['tasks']) + 1}",
+            template = self.matcher.template_for(task["description"]) or {}
+            task_id = ids[task["description"]] = f"task_{task_count + len(new_tasks) + 1}"
+            new_tasks.append({
+                "id": task_id,
                 "description": task["description"],
                 "type": task["type"],
                 "priority": task["priority"],
+                "required_skills": task.get("required_skills") or template.get("required_skills", []),
+                "depends_on": [ids[dep] for dep in task.get("depends_on", []) if dep in ids],
+                "estimated_time": task.get("estimated_time") or template.get("estimated_time"),
                 "status": "pending",
                 "assigned_to": None,
                 "created_at": datetime.now().isoformat()
             })
         
-        self.task_manager.save_json(self.task_manager.todo_file, todo_data)
+        self.task_manager.add_tasks(new_tasks)
         self.log(f"Created {len(subtasks)} initial tasks")
     
     def analyze_and_breakdown_task(self, description: str) -> List[Dict]:
-        """Intelligently break down task based on description"""
+        """Intelligently break down task based on description
+        
+        depends_on refers to other subtasks by description; estimated_time
+        falls back to the matching template in config/tasks.json.
+        """
         subtasks = []
         
         # Detect project type and create appropriate tasks
         description_lower = description.lower()
+        analysis = "Analyze project requirements and existing codebase"
         
         # Common initial tasks
         subtasks.append({
-            "description": "Analyze project requirements and existing codebase",
+            "description": analysis,
             "type": "analysis",
-            "priority": "high"
+            "priority": "high",
+            "estimated_time": "1-2 hours"
         })
         
         # Web development tasks
         if any(word in description_lower for word in ["web", "website", "frontend", "eleventy"]):
             subtasks.extend([
-                {"description": "Set up development environment", "type": "setup", "priority": "high"},
-                {"description": "Design component architecture", "type": "frontend", "priority": "medium"},
-                {"description": "Implement responsive UI components", "type": "frontend", "priority": "medium"},
-                {"description": "Configure build and deployment", "type": "devops", "priority": "low"}
+                {"description": "Set up development environment", "type": "setup", "priority": "high",
+                 "depends_on": [analysis], "estimated_time": "1 hour"},
+                {"description": "Design component architecture", "type": "frontend", "priority": "medium",
+                 "depends_on": [analysis], "estimated_time": "2-3 hours"},
+                {"description": "Implement responsive UI components", "type": "frontend", "priority": "medium",
+                 "depends_on": ["Set up development environment", "Design component architecture"],
+                 "estimated_time": "3-5 hours"},
+                {"description": "Configure build and deployment", "type": "devops", "priority": "low",
+                 "depends_on": ["Set up development environment"], "estimated_time": "1-2 hours"}
             ])
         
         # Backend tasks
         if any(word in description_lower for word in ["api", "backend", "server", "database"]):
             subtasks.extend([
-                {"description": "Design API endpoints", "type": "backend", "priority": "high"},
-                {"description": "Set up database schema", "type": "backend", "priority": "high"},
-                {"description": "Implement authentication", "type": "backend", "priority": "medium"}
+                {"description": "Design API endpoints", "type": "backend", "priority": "high",
+                 "depends_on": [analysis]},
+                {"description": "Set up database schema", "type": "backend", "priority": "high",
+                 "depends_on": [analysis], "estimated_time": "3-4 hours"},
+                {"description": "Implement authentication", "type": "backend", "priority": "medium",
+                 "depends_on": ["Design API endpoints", "Set up database schema"]}
             ])
         
         # Testing tasks
@@ -144,48 +287,49 @@ class AgentCoordinator:
             subtasks.append({
                 "description": "Create comprehensive test suite",
                 "type": "testing",
-                "priority": "medium"
+                "priority": "medium",
+                "depends_on": [analysis],
+                "estimated_time": "3-5 hours"
             })
         
         return subtasks
     
-    def setup_infrastructure(self):
+    async def setup_infrastructure(self):
         """Setup MCP servers and other infrastructure"""
         self.log("Setting up infrastructure...")
         
-        # Check MCP servers
-        self.check_mcp_servers()
-        
-        # Initialize EigenCode if available
-        self.check_eigencode()
+        # Check MCP servers and EigenCode side by side
+        await asyncio.gather(self.check_mcp_servers(), self.check_eigencode())
         
         # Load existing project context
         context = self.memory_system.get_full_context()
         self.log(f"Loaded context with {len(context['active_agents'])} previously active agents")
     
-    def check_mcp_servers(self):
-        """Check availability of MCP servers"""
+    async def check_mcp_servers(self):
+        """Check availability of MCP servers (all at once)"""
         mcp_config = self.load_json("config/mcp_config.json")
-        
-        for server_name, server_config in mcp_config.get("mcpServers", {}).items():
-            if server_config.get("enabled", False):
-                # Check if server command exists
-                command = server_config.get("command", "")
-                try:
-                    result = subprocess.run(["which", command], capture_output=True, text=True)
-                    if result.returncode == 0:
-                        self.log(f"✓ MCP server '{server_name}' available")
-                    else:
-                        self.log(f"✗ MCP server '{server_name}' not found", "WARNING")
-                except Exception as e:
-                    self.log(f"Error checking MCP server '{server_name}': {e}", "ERROR")
-    
-    def check_eigencode(self):
+        servers = [(name, server_config) for name, server_config in mcp_config.get("mcpServers", {}).items()
+                   if server_config.get("enabled", False)]
+        await asyncio.gather(*(self.check_mcp_server(name, server_config) for name, server_config in servers))
+    
+    async def check_mcp_server(self, server_name: str, server_config: Dict):
+        # Check if server command exists
+        command = server_config.get("command", "")
+        try:
+            returncode, _ = await run_command("which", command)
+            if returncode == 0:
+                self.log(f"✓ MCP server '{server_name}' available")
+            else:
+                self.log(f"✗ MCP server '{server_name}' not found", "WARNING")
+        except Exception as e:
+            self.log(f"Error checking MCP server '{server_name}': {e}", "ERROR")
+    
+    async def check_eigencode(self):
         """Check for EigenCode availability"""
         try:
-            result = subprocess.run(["eigencode", "--version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                self.log(f"✓ EigenCode available: {result.stdout.strip()}")
+            returncode, stdout = await run_command("eigencode", "--version")
+            if returncode == 0:
+                self.log(f"✓ EigenCode available: {stdout.strip()}")
                 self.memory_system.update_context({"eigencode_available": True})
             else:
                 self.log("✗ EigenCode not found", "WARNING")
@@ -193,197 +337,464 @@ class AgentCoordinator:
         except FileNotFoundError:
             self.log("✗ EigenCode not installed", "WARNING")
             self.memory_system.update_context({"eigencode_available": False})
+        except asyncio.TimeoutError:
+            self.log("✗ EigenCode did not respond", "WARNING")
+            self.memory_system.update_context({"eigencode_available": False})
     
-    def start_agents(self):
+    async def start_agents(self):
         """Initialize agent pool"""
         self.log("Initializing agent pool...")
         
         agent_count = 0
-        for agent_type in self.config["agent_types"]:
-            for i in range(agent_type["count"]):
-                agent_id = f"{agent_type['id']}_agent_{i}"
-                self.active_agents[agent_id] = {
-                    "id": agent_id,
-                    "type": agent_type["id"],
-                    "specialization": agent_type["specialization"],
-                    "status": "idle",
-                    "current_task": None,
-                    "tasks_completed": 0,
-                    "started_at": datetime.now().isoformat()
-                }
-                
-                # Update memory with agent state
-                self.memory_system.update_agent_state(agent_id, {
-                    "type": agent_type["id"],
-                    "specialization": agent_type["specialization"],
-                    "status": "idle"
-                })
-                
-                agent_count += 1
-                self.log(f"Initialized {agent_id} ({agent_type['specialization']})")
+        launches = []
+        with self.memory_system.batch():
+            for agent_type in self.config["agent_types"]:
+                for i in range(agent_type["count"]):
+                    agent_id = f"{agent_type['id']}_agent_{i}"
+                    self.active_agents[agent_id] = {
+                        "id": agent_id,
+                        "type": agent_type["id"],
+                        "specialization": agent_type["specialization"],
+                        "skills": agent_type.get("skills", []),
+                        "status": "starting" if self.supervisor else "idle",
+                        "current_task": None,
+                        "tasks_completed": 0,
+                        "context_version": None,  # shared context the agent's process last received
+                        "context_epoch": None,
+                        "started_at": datetime.now().isoformat()
+                    }
+                    self.agent_status_counts[self.active_agents[agent_id]["status"]] += 1
+                    
+                    # Update memory with agent state
+                    self.memory_system.update_agent_state(agent_id, {
+                        "type": agent_type["id"],
+                        "specialization": agent_type["specialization"],
+                        "status": "idle"
+                    })
+                    
+                    agent_count += 1
+                    self.log(f"Initialized {agent_id} ({agent_type['specialization']})",
+                             agent_id=agent_id, event="agent_initialized")
+                    
+                    launches.append((agent_id, {"AGENT_TYPE": agent_type["id"],
+                                                 "AGENT_SPECIALIZATION": agent_type["specialization"],
+                                                 **self.heartbeat_env(),
+                                                 **self.rate_limit_env(agent_id, agent_type["id"])}))
+        
+        # Processes are launched after the batch commits, so its lock isn't held across awaits
+        if self.supervisor:
+            for agent_id, env in launches:
+                await self.supervisor.start(agent_id, env)
         
         self.log(f"Agent pool ready with {agent_count} agents")
     
-    def coordinate_agents(self):
-        """Main coordination loop"""
+    def set_agent_status(self, agent: Dict, status: str):
+        """Change an agent's status, keeping the per-status counts current"""
+        self.agent_status_counts[agent["status"]] -= 1
+        self.agent_status_counts[status] += 1
+        agent["status"] = status
+    
+    def heartbeat_env(self) -> Dict[str, str]:
+        """How often an agent process must send {"event": "heartbeat"} to keep its leases"""
+        if not self.task_manager.lease_ttl:
+            return {}
+        # Well inside the lease, so one late heartbeat doesn't drop claims
+        return {"AGENT_HEARTBEAT_INTERVAL": str(self.task_manager.lease_ttl / 3)}
+    
+    def rate_limit_env(self, agent_id: str, agent_type: str) -> Dict[str, str]:
+        """Environment that lets an agent process share the API budget (RateLimiter.from_env)"""
+        if not self.rate_limiter:
+            return {}
+        limits = self.config.get("resource_limits", {})
+        weights = limits.get("api_call_weights", {})
+        return {
+            "RATE_LIMIT_FILE": os.path.abspath(self.rate_limiter.path),
+            "RATE_LIMIT_PER_MINUTE": str(limits["max_api_calls_per_minute"]),
+            "RATE_LIMIT_BURST": str(limits.get("api_burst", 1)),
+            "AGENT_API_WEIGHT": str(weights.get(agent_id, weights.get(agent_type, 1.0)))
+        }
+    
+    async def coordinate_agents(self):
+        """Main coordination loop: runs the assignment, monitor and timer jobs until asked to stop"""
         self.log("Starting coordination loop...")
-        
-        # Start monitoring threads
-        monitor_thread = threading.Thread(target=self.monitor_loop)
-        monitor_thread.daemon = True
-        monitor_thread.start()
-        
-        # Start task assignment thread
-        assignment_thread = threading.Thread(target=self.task_assignment_loop)
-        assignment_thread.daemon = True
-        assignment_thread.start()
+        self.loop = asyncio.get_running_loop()
+        
+        # Watch the todo store for writes by other processes
+        if self.config.get("coordination", {}).get("event_driven_assignment", True):
+            self.store_watcher = FileWatcher(self.task_manager.storage.watch_paths(), self.on_store_changed)
+            self.store_watcher.start()
+            self.log(f"Watching task store for external changes ({self.store_watcher.mode})")
+        
+        # Expire claims/locks of agents that stop heartbeating
+        if self.task_manager.lease_ttl:
+            self.task_manager.start_lease_reaper()
+        
+        coordination = self.config.get("coordination", {})
+        jobs = [self.task_assignment_loop(), self.monitor_loop(),
+                self.periodic(coordination.get("status_interval", 60), self.log_status_summary)]
+        tasks = [asyncio.ensure_future(job) for job in jobs]
+        await self.start_metrics_server()
+        self.watch_stdin()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(signum, self.request_stop, "Interrupted by user")
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # not the main thread: rely on "quit"
         
         try:
-            while self.running:
-                # Main coordination logic
-                time.sleep(1)
-                
-                # Check for user input
-                if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
-                    line = sys.stdin.readline().strip()
-                    if line.lower() == 'quit':
-                        self.log("Shutdown requested by user")
-                        self.shutdown()
-                    elif line.lower() == 'status':
-                        self.print_status()
-        except KeyboardInterrupt:
-            self.log("Interrupted by user")
-            self.shutdown()
-        except Exception as e:
-            self.log(f"Coordination error: {e}", "ERROR")
-            self.shutdown()
+            await self.stop_requested.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.unwatch_stdin()
+            await self.shutdown()
+    
+    async def start_metrics_server(self):
+        """Serve /metrics (Prometheus text) and /metrics.json on metrics.host:metrics.port"""
+        metrics_config = self.config.get("metrics", {})
+        if metrics_config.get("port") is None:
+            return
+        server = MetricsServer(self.metrics, metrics_config.get("host", "127.0.0.1"), metrics_config["port"])
+        try:
+            await server.start()
+        except OSError as e:
+            self.log(f"Metrics endpoint not started: {e}", "WARNING")
+            return
+        self.metrics_server = server
+        self.log(f"Serving metrics on http://{server.host}:{server.port}/metrics")
+    
+    def request_stop(self, reason: Optional[str] = None):
+        if reason:
+            self.log(reason)
+        self.stop_requested.set()
+    
+    async def periodic(self, interval: float, job: Callable[[], None]):
+        """Run job every `interval` seconds on a fixed schedule (late ticks don't push later ones back)"""
+        next_run = self.loop.time() + interval
+        while self.running:
+            await asyncio.sleep(max(0.0, next_run - self.loop.time()))
+            try:
+                job()
+            except Exception as e:
+                self.log(f"Periodic {job.__name__} error: {e}", "ERROR")
+            next_run += interval
+            behind = self.loop.time() - next_run
+            if behind > 0:
+                next_run += (behind // interval + 1) * interval  # skip ticks missed while stalled
+    
+    def watch_stdin(self):
+        """Read 'status' / 'quit' commands from stdin as they arrive"""
+        try:
+            self.loop.add_reader(sys.stdin.fileno(), self.read_stdin)
+        except (OSError, ValueError, AttributeError):
+            # Regular files can't be polled (and never block): read them right away
+            for line in sys.stdin:
+                self.handle_command(line)
+    
+    def unwatch_stdin(self):
+        try:
+            self.loop.remove_reader(sys.stdin.fileno())
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def read_stdin(self):
+        data = os.read(sys.stdin.fileno(), 4096)
+        if not data:
+            self.unwatch_stdin()  # EOF: no more commands, keep coordinating
+            return
+        self.stdin_buffer += data
+        while b"\n" in self.stdin_buffer:
+            line, self.stdin_buffer = self.stdin_buffer.split(b"\n", 1)
+            self.handle_command(line.decode(errors="replace"))
+    
+    def handle_command(self, line: str):
+        command = line.strip().lower()
+        if command == 'quit':
+            self.request_stop("Shutdown requested by user")
+        elif command == 'status':
+            self.print_status()
+    
+    def wake(self, event: asyncio.Event):
+        """Set a loop event from any thread"""
+        if self.loop is None:
+            event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # loop already closed
+    
+    def on_task_event(self, event: str, task_id: Optional[str]):
+        """TaskManager listener: wake the loops that care about this change (called from any thread)"""
+        self.wake(self.assignment_wakeup)
+        if event in ("task_released", "claim_removed", "external_change"):
+            self.wake(self.monitor_wakeup)
     
-    def monitor_loop(self):
+    def on_store_changed(self, paths):
+        """File watcher callback for writes to the task store"""
+        # Our own writes also touch these files; only reload for foreign ones
+        self.task_manager.refresh_if_changed()
+    
+    def on_agent_event(self, agent_id: str, event: Dict):
+        """AgentSupervisor callback: agent process started, finished a task, or exited"""
+        agent = self.active_agents.get(agent_id)
+        if agent is None:
+            return
+        kind = event.get("event")
+        if kind == "started":
+            self.log(f"{agent_id} running (pid {event['pid']})", agent_id=agent_id, event="agent_started")
+            # A new process has no context yet: its first task carries the full snapshot
+            agent["context_version"] = agent["context_epoch"] = None
+            self.set_agent_idle(agent_id)
+        elif kind == "heartbeat":
+            # Only the agent itself vouches for its claims: a hung agent stops
+            # heartbeating and its work is reclaimed when the lease runs out
+            self.task_manager.renew(agent_id)
+        elif kind == "task_completed":
+            self.complete_task(agent_id, str(event["task_id"]), event.get("result"))
+        elif kind == "task_failed":
+            self.fail_task(agent_id, str(event["task_id"]), event.get("error"))
+        elif kind == "exited":
+            task_id = event.get("task_id")
+            restart = f", restarting in {event['delay']:.1f}s" if event["restarting"] else ""
+            self.log(f"{agent_id} exited with code {event['code']}{restart}", "WARNING" if event["code"] else "INFO",
+                     agent_id=agent_id, task_id=task_id, event="agent_exited")
+            # Work in flight goes back to the pool for another agent
+            if task_id is not None:
+                self.task_manager.release_task(agent_id, str(task_id))
+            if event["restarting"]:
+                self.restarts_total.inc(agent_id=agent_id)
+            self.set_agent_status(agent, "restarting" if event["restarting"] else "stopped")
+            agent["current_task"] = None
+        elif kind == "failed":
+            self.log(f"{agent_id} gave up: {event.get('error')}", "ERROR", agent_id=agent_id, event="agent_failed")
+            self.set_agent_status(agent, "failed")
+            agent["current_task"] = None
+    
+    def complete_task(self, agent_id: str, task_id: str, result=None):
+        """Record a finished task and free its agent"""
+        task = self.task_manager.get_task(task_id) or {}
+        self.task_manager.update_task(task_id, {
+            "status": "completed",
+            "completed_at": datetime.now().isoformat(),
+            **({"result": result} if result is not None else {})
+        })
+        self.task_manager.release_task(agent_id, task_id)
+        self.memory_system.append_history("completed_tasks", {
+            "agent_id": agent_id,
+            "task_id": task_id,
+            "description": task.get("description"),
+            "timestamp": datetime.now().isoformat()
+        })
+        agent = self.active_agents[agent_id]
+        agent["tasks_completed"] += 1
+        self.completed_total.inc(agent_id=agent_id)
+        if agent.get("assigned_at") is not None and agent["current_task"] == task_id:
+            self.task_duration.observe(time.monotonic() - agent["assigned_at"], type=task.get("type", "general"))
+        self.memory_system.update_agent_state(agent_id, {"status": "idle", "tasks_completed": agent["tasks_completed"]})
+        self.log(f"{agent_id} completed task '{task.get('description', task_id)}'",
+                 agent_id=agent_id, task_id=task_id, event="task_completed")
+        self.set_agent_idle(agent_id)
+    
+    def fail_task(self, agent_id: str, task_id: str, error: Optional[str]):
+        """Mark a task failed (it is not retried) and free its agent"""
+        self.task_manager.update_task(task_id, {"status": "failed", "error": error})
+        self.task_manager.release_task(agent_id, task_id)
+        self.failed_total.inc(agent_id=agent_id)
+        self.memory_system.append_history("blockers", {
+            "agent_id": agent_id,
+            "task_id": task_id,
+            "error": error,
+            "timestamp": datetime.now().isoformat()
+        })
+        self.log(f"{agent_id} failed task {task_id}: {error}", "WARNING",
+                 agent_id=agent_id, task_id=task_id, event="task_failed")
+        self.set_agent_idle(agent_id)
+    
+    def set_agent_idle(self, agent_id: str):
+        """Mark an agent idle and wake the assigner for it"""
+        agent = self.active_agents[agent_id]
+        self.set_agent_status(agent, "idle")
+        agent["current_task"] = None
+        self.assignment_wakeup.set()
+    
+    async def wait_for(self, event: asyncio.Event, timeout: float) -> bool:
+        """Sleep until the event is set (and clear it) or the timeout passes; True if woken"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        event.clear()
+        return True
+    
+    async def monitor_loop(self):
         """Monitor agent health and progress"""
+        interval = self.config.get("coordination", {}).get("monitor_interval", 30)
         while self.running:
             try:
                 # Check agent health
-                for agent_id, agent in self.active_agents.items():
+                for agent_id, agent in list(self.active_agents.items()):
                     if agent["status"] == "working" and agent["current_task"]:
-                        # Check if task is still valid
-                        if not self.task_manager.is_task_claimed(agent["current_task"]):
-                            self.log(f"Task {agent['current_task']} no longer claimed by {agent_id}", "WARNING")
-                            agent["status"] = "idle"
-                            agent["current_task"] = None
-                
-                # Log periodic status
-                if int(time.time()) % 60 == 0:  # Every minute
-                    self.log_status_summary()
-                
-                time.sleep(5)  # Check every 5 seconds
+                        # Check if task is still valid (its lease may have expired and
+                        # the task gone to another agent)
+                        if self.task_manager.claim_owner(agent["current_task"]) != agent_id:
+                            self.log(f"Task {agent['current_task']} no longer claimed by {agent_id}", "WARNING",
+                                     agent_id=agent_id, task_id=agent["current_task"], event="claim_lost")
+                            if self.supervisor:
+                                # It stopped heartbeating: restart it like a crashed agent
+                                self.supervisor.kill(agent_id)
+                            else:
+                                self.set_agent_idle(agent_id)
             except Exception as e:
                 self.log(f"Monitor error: {e}", "ERROR")
+            
+            # Sleep until a claim changes, or the fallback interval passes
+            await self.wait_for(self.monitor_wakeup, interval)
     
-    def task_assignment_loop(self):
+    async def task_assignment_loop(self):
         """Assign tasks to idle agents"""
+        interval = self.config.get("coordination", {}).get("assignment_fallback_interval", 60)
         while self.running:
             try:
-                # Get pending tasks
-                todo_data = self.task_manager.load_json(self.task_manager.todo_file)
-                pending_tasks = [t for t in todo_data.get("tasks", []) if t["status"] == "pending"]
-                
                 # Get idle agents
                 idle_agents = [a for a in self.active_agents.values() if a["status"] == "idle"]
                 
-                # Assign tasks based on strategy
-                if pending_tasks and idle_agents:
-                    self.assign_tasks(pending_tasks, idle_agents)
-                
-                time.sleep(10)  # Check every 10 seconds
+                # Assign tasks from the ready queue based on strategy
+                if idle_agents and self.task_manager.pending_count():
+                    self.assign_tasks(idle_agents)
             except Exception as e:
                 self.log(f"Assignment error: {e}", "ERROR")
+            
+            # Sleep until woken by a task/agent change; on a plain timeout
+            # pick up anything the file watcher may have missed
+            if not await self.wait_for(self.assignment_wakeup, interval):
+                self.task_manager.refresh_if_changed()
     
-    def assign_tasks(self, tasks: List[Dict], agents: List[Dict]):
-        """Intelligently assign tasks to agents"""
-        strategy = self.config.get("coordination", {}).get("task_assignment_strategy", "load_balanced")
-        
-        for task in tasks:
-            if not agents:
+    def agent_loads(self, agents: List[Dict]) -> Dict[str, float]:
+        """Fraction of max_concurrent_tasks each agent already has claimed"""
+        limit = max(1, self.config.get("max_concurrent_tasks", 1))
+        return {agent["id"]: self.task_manager.claimed_count(agent["id"]) / limit for agent in agents}
+    
+    def assign_tasks(self, agents: List[Dict]):
+        """Assign ready tasks to idle agents as one optimal skill-scored matching
+        
+        Only the top few ready tasks per agent are considered, so a batch
+        stays small however long the queue is. Agents already holding
+        max_concurrent_tasks claims are skipped.
+        """
+        loads = self.agent_loads(agents)
+        agents = [agent for agent in agents if loads[agent["id"]] < 1]
+        while agents:
+            tasks = self.task_manager.ready_tasks(3 * len(agents))
+            pairs = self.matcher.match(tasks, agents, loads)
+            if not pairs:
+                break
+            for task, agent in pairs:
+                self.assign_task(task, agent)
+            # A failed claim drops the task from the ready queue and leaves its agent
+            # idle; re-solve for those agents, or stop once every pair went through
+            agents = [agent for agent in agents if agent["status"] == "idle"]
+            if not any(agent["status"] == "idle" for _, agent in pairs):
                 break
-                
-            # Find best agent for task
-            best_agent = self.find_best_agent_for_task(task, agents)
-            
-            if best_agent:
-                # Try to claim task
-                if self.task_manager.claim_task(best_agent["id"], task["id"]):
-                    best_agent["status"] = "working"
-                    best_agent["current_task"] = task["id"]
-                    
-                    # Update task status
-                    task["status"] = "in_progress"
-                    task["assigned_to"] = best_agent["id"]
-                    
-                    # Update memory
-                    self.memory_system.update_agent_state(best_agent["id"], {
-                        "status": "working",
-                        "current_task": task["id"],
-                        "task_description": task["description"]
-                    })
-                    
-                    self.log(f"Assigned task '{task['description']}' to {best_agent['id']}")
-                    
-                    # Remove agent from idle list
-                    agents.remove(best_agent)
     
-    def find_best_agent_for_task(self, task: Dict, agents: List[Dict]) -> Optional[Dict]:
-        """Find the most suitable agent for a task"""
-        task_type = task.get("type", "general")
-        
-        # First, try to find specialist
-        for agent in agents:
-            if agent["type"] == task_type:
-                return agent
+    def assign_task(self, task: Dict, agent: Dict) -> bool:
+        """Claim a task for an agent and mark it in progress"""
+        if not self.task_manager.claim_task(agent["id"], task["id"]):
+            return False
+        
+        self.set_agent_status(agent, "working")
+        agent["current_task"] = task["id"]
+        agent["assigned_at"] = time.monotonic()
+        
+        # Update task status
+        self.task_manager.update_task(task["id"], {
+            "status": "in_progress",
+            "assigned_to": agent["id"]
+        })
         
-        # Then, try general agents
-        for agent in agents:
-            if agent["type"] == "general":
-                return agent
+        # Update memory
+        self.memory_system.update_agent_state(agent["id"], {
+            "status": "working",
+            "current_task": task["id"],
+            "task_description": task["description"]
+        })
         
-        # Finally, any agent
-        return agents[0] if agents else None
+        latency = None
+        if task.get("created_at"):
+            latency = round((datetime.now() - datetime.fromisoformat(task["created_at"])).total_seconds(), 3)
+            self.assignment_latency.observe(latency)
+        self.assigned_total.inc(agent_id=agent["id"])
+        self.log(f"Assigned task '{task['description']}' to {agent['id']}",
+                 agent_id=agent["id"], task_id=task["id"], event="task_assigned", latency=latency)
+        
+        # Hand the task to the agent's process along with what changed in the shared
+        # context since its last task; if it just died, the task goes back to the pool
+        if self.supervisor:
+            since = -1 if agent["context_version"] is None else agent["context_version"]
+            context = self.memory_system.get_context_delta(since, agent["context_epoch"])
+            if self.supervisor.send_task(agent["id"], task, context):
+                agent["context_version"], agent["context_epoch"] = context["version"], context["epoch"]
+            else:
+                self.log(f"{agent['id']} could not take task {task['id']}", "WARNING",
+                         agent_id=agent["id"], task_id=task["id"], event="handoff_failed")
+                self.task_manager.release_task(agent["id"], task["id"])
+                self.set_agent_status(agent, "restarting")
+                agent["current_task"] = None
+        return True
+    
+    def find_best_agent_for_task(self, task: Dict, agents: List[Dict]) -> Optional[Dict]:
+        """Find the most suitable agent for a single task (highest skill score)"""
+        if not agents:
+            return None
+        loads = self.agent_loads(agents)
+        return max(agents, key=lambda agent: self.matcher.score(task, agent, loads[agent["id"]]))
     
     def log_status_summary(self):
         """Log current system status"""
-        todo_data = self.task_manager.load_json(self.task_manager.todo_file)
-        tasks = todo_data.get("tasks", [])
+        counts = self.task_manager.get_status_counts()
         
         status_counts = {
-            "pending": len([t for t in tasks if t["status"] == "pending"]),
-            "in_progress": len([t for t in tasks if t["status"] == "in_progress"]),
-            "completed": len([t for t in tasks if t["status"] == "completed"])
+            "pending": counts.get("pending", 0),
+            "in_progress": counts.get("in_progress", 0),
+            "completed": counts.get("completed", 0)
         }
         
         agent_status = {
-            "idle": len([a for a in self.active_agents.values() if a["status"] == "idle"]),
-            "working": len([a for a in self.active_agents.values() if a["status"] == "working"])
+            "idle": self.agent_status_counts["idle"],
+            "working": self.agent_status_counts["working"]
         }
         
-        self.log(f"Status - Tasks: {status_counts} | Agents: {agent_status}")
+        self.log(f"Status - Tasks: {status_counts} | Agents: {agent_status}",
+                 event="status_summary", tasks=status_counts, agents=agent_status)
     
     def print_status(self):
         """Print detailed status"""
+        self.logger.flush()  # keep queued log lines from interleaving with the report
         print("\n=== Multi-Agent System Status ===")
         print(f"Agents: {len(self.active_agents)}")
         for agent_id, agent in self.active_agents.items():
             print(f"  {agent_id}: {agent['status']} - Task: {agent['current_task'] or 'None'}")
         
-        todo_data = self.task_manager.load_json(self.task_manager.todo_file)
-        tasks = todo_data.get("tasks", [])
+        tasks = self.task_manager.get_tasks()
+        blocked = self.task_manager.blocked_tasks()
         print(f"\nTasks: {len(tasks)}")
         for task in tasks:
-            print(f"  {task['id']}: {task['status']} - {task['description'][:50]}...")
+            waiting = f" (waiting on {', '.join(blocked[task['id']])})" if task["id"] in blocked else ""
+            print(f"  {task['id']}: {task['status']} - {task['description'][:50]}...{waiting}")
         print()
     
-    def shutdown(self):
+    async def shutdown(self):
         """Gracefully shutdown the system"""
         self.log("Shutting down coordinator...")
         self.running = False
+        if self.store_watcher:
+            self.store_watcher.stop()
+        self.task_manager.stop_lease_reaper()
+        if self.supervisor:
+            await self.supervisor.stop_all()
+        if self.metrics_server:
+            await self.metrics_server.stop()
         
         # Save final state
         self.memory_system.update_context({
@@ -395,8 +806,11 @@ class AgentCoordinator:
         for agent_id, agent in self.active_agents.items():
             if agent["current_task"]:
                 self.task_manager.release_task(agent_id, agent["current_task"])
+        self.task_manager.close()
         
+        self.memory_system.close()
         self.log("Coordinator shutdown complete")
+        self.logger.close()
     
     def load_json(self, filepath: str) -> Dict:
         """Load JSON file safely"""
@@ -408,8 +822,6 @@ class AgentCoordinator:
             return {}
 
 if __name__ == "__main__":
-    import select
-    
     # Ensure directories exist
     os.makedirs("logs", exist_ok=True)
     os.makedirs("shared", exist_ok=True)
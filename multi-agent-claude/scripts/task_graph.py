@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+DEFAULT_HOURS = 1.0
+UNIT_HOURS = {"m": 1 / 60, "min": 1 / 60, "minute": 1 / 60, "h": 1.0, "hr": 1.0, "hour": 1.0, "d": 8.0, "day": 8.0}
+
+
+def estimated_hours(value) -> float:
+    """Hours from an estimated_time ("2-4 hours" -> 3.0, "30 minutes" -> 0.5, 2 -> 2.0)"""
+    if value is None:
+        return DEFAULT_HOURS
+    if isinstance(value, (int, float)):
+        return float(value)
+    numbers = [float(n) for n in re.findall(r"\d+(?:\.\d+)?", str(value))]
+    if not numbers:
+        return DEFAULT_HOURS
+    unit = re.search(r"[a-z]+", str(value).lower())
+    scale = UNIT_HOURS.get(unit.group(0).rstrip("s"), 1.0) if unit else 1.0
+    return sum(numbers) / len(numbers) * scale
+
+
+class TaskGraph:
+    """depends_on edges between tasks, with readiness and critical paths kept incrementally
+
+    A task is ready once none of its dependencies is unfinished; completing a
+    task only touches its direct dependents. A task's critical path is its
+    own estimated hours plus the longest critical path among the unfinished
+    tasks waiting on it, i.e. how much work it holds up. Dependencies on ids
+    that don't exist (yet) count as unfinished.
+    """
+
+    def __init__(self):
+        self.depends_on = {}                 # task id -> set of ids it waits for
+        self.dependents = defaultdict(set)   # task id -> set of ids waiting for it
+        self.hours = {}
+        self.done = set()
+        self.blocking = {}                   # task id -> number of unfinished dependencies
+        self.critical = {}
+
+    def find_cycle(self, edges: Dict[str, Iterable[str]]) -> Optional[List[str]]:
+        """A dependency cycle (as a path) if `edges` were added to the graph, else None"""
+        pending = {str(task_id): {str(dep) for dep in deps} for task_id, deps in edges.items()}
+
+        def deps_of(task_id: str):
+            return pending[task_id] if task_id in pending else self.depends_on.get(task_id, ())
+
+        state = {}  # task id -> 1 while on the DFS path, 2 when finished
+        for start in pending:
+            if start in state:
+                continue
+            path = [start]
+            stack = [iter(deps_of(start))]
+            state[start] = 1
+            while stack:
+                dep = next(stack[-1], None)
+                if dep is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(dep) == 1:
+                    return path[path.index(dep):] + [dep]
+                elif dep not in state:
+                    state[dep] = 1
+                    path.append(dep)
+                    stack.append(iter(deps_of(dep)))
+        return None
+
+    def add(self, task_id: str, depends_on: Iterable[str] = (), hours: float = DEFAULT_HOURS) -> Set[str]:
+        """Add or re-define a task; returns the ids whose critical path changed"""
+        task_id = str(task_id)
+        for dep in self.depends_on.get(task_id, ()):
+            self.dependents[dep].discard(task_id)
+        deps = {str(dep) for dep in depends_on or ()}
+        self.depends_on[task_id] = deps
+        for dep in deps:
+            self.dependents[dep].add(task_id)
+        self.blocking[task_id] = sum(1 for dep in deps if dep not in self.done)
+        self.hours[task_id] = hours
+        return self.propagate([task_id] + list(deps))
+
+    def set_done(self, task_id: str, done: bool) -> List[str]:
+        """Mark a task finished (or not); returns the dependents whose readiness changed"""
+        task_id = str(task_id)
+        if done == (task_id in self.done):
+            return []
+        changed = []
+        if done:
+            self.done.add(task_id)
+        else:
+            self.done.discard(task_id)
+        for dependent in self.dependents.get(task_id, ()):
+            before = self.blocking.get(dependent, 0) == 0
+            self.blocking[dependent] = self.blocking.get(dependent, 0) + (-1 if done else 1)
+            if before != (self.blocking[dependent] == 0):
+                changed.append(dependent)
+        # Finished work no longer lengthens the paths through its dependencies
+        self.propagate(self.depends_on.get(task_id, ()))
+        return changed
+
+    def propagate(self, task_ids: Iterable[str]) -> Set[str]:
+        """Recompute critical paths from these tasks up through their dependencies"""
+        changed = set()
+        stack = list(task_ids)
+        while stack:
+            task_id = stack.pop()
+            longest = max((self.critical.get(dependent, 0.0) for dependent in self.dependents.get(task_id, ())
+                           if dependent not in self.done), default=0.0)
+            value = self.hours.get(task_id, DEFAULT_HOURS) + longest
+            if self.critical.get(task_id) != value:
+                self.critical[task_id] = value
+                changed.add(task_id)
+                stack.extend(self.depends_on.get(task_id, ()))
+        return changed
+
+    def is_ready(self, task_id: str) -> bool:
+        return self.blocking.get(str(task_id), 0) == 0
+
+    def critical_path(self, task_id: str) -> float:
+        return self.critical.get(str(task_id), DEFAULT_HOURS)
+
+    def waiting_on(self, task_id: str) -> List[str]:
+        """Unfinished dependencies of a task"""
+        return sorted(dep for dep in self.depends_on.get(str(task_id), ()) if dep not in self.done)
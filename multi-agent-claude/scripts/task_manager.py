@@ -3,146 +3,509 @@ import json
 import threading
 import time
 import os
-from typing import Dict, Set, Optional, List
+from collections import Counter, defaultdict
+from typing import Dict, Set, Optional, List, Tuple
 from datetime import datetime
+from task_storage import create_storage
+from ready_queue import ReadyQueue
+from task_graph import TaskGraph, estimated_hours
+from leases import LeaseHeap
+from path_locks import EXCLUSIVE, SHARED, lock_key, normalize_requests
 
 class TaskManager:
-    def __init__(self):
+    def __init__(self, backend: str = "json", lease_ttl: Optional[float] = None):
         self.todo_file = "shared/todo_system.json"
         self.locks_file = "shared/file_locks.json"
-        self.claimed_tasks = {}
-        self.file_locks = {}
         self.lock = threading.Lock()
         
+        # Claims and locks expire lease_ttl seconds after the last renew()
+        # (None keeps the old behaviour: held until released or cleaned up)
+        self.lease_ttl = lease_ttl
+        self.leases = LeaseHeap()
+        self.agent_claims = defaultdict(set)
+        self.agent_locks = defaultdict(set)
+        self.lease_counts = Counter()  # "task" claims / "file" locks currently held
+        self.reaper_wakeup = threading.Event()
+        self.reaper_thread = None
+        
+        # In-memory task index, kept current incrementally by every mutator
+        self.tasks = {}
+        self.ready_queue = ReadyQueue()
+        self.status_counts = Counter()
+        self.type_counts = Counter()  # (status, type) -> tasks
+        self.graph = TaskGraph()
+        self.listeners = []
+        
         # Create shared directory if it doesn't exist
         os.makedirs("shared", exist_ok=True)
         
+        # Pluggable persistence ("json" files or "sqlite" WAL database)
+        self.storage = create_storage(backend, self.todo_file, self.locks_file)
+        
         # Load existing state
         self.load_state()
     
+    @property
+    def claimed_tasks(self) -> Dict[str, Dict]:
+        """Current task claims keyed by task id"""
+        return self.storage.get_claims()
+    
+    @property
+    def file_locks(self) -> Dict[str, Dict]:
+        """Current file locks keyed by path (shared locks: "path#shared:agent")"""
+        return self.storage.get_locks()
+    
     def load_state(self):
         """Load existing task claims and file locks"""
-        if os.path.exists(self.todo_file):
-            with open(self.todo_file, 'r') as f:
-                data = json.load(f)
-                self.claimed_tasks = data.get("claimed_tasks", {})
+        with self.lock:
+            self.storage.load()
+            self.rebuild_index()
+    
+    def add_listener(self, callback):
+        """Register callback(event, task_id) for changes to the task pool; keep it cheap"""
+        self.listeners.append(callback)
+    
+    def notify(self, event: str, task_id: Optional[str] = None):
+        """Tell listeners the task pool changed"""
+        for callback in self.listeners:
+            try:
+                callback(event, task_id)
+            except Exception as e:
+                print(f"Task listener error: {e}")
+    
+    def refresh_if_changed(self) -> bool:
+        """Reload state if another process wrote the store; True if it did"""
+        with self.lock:
+            if not self.storage.changed_externally():
+                return False
+            self.storage.load()
+            self.rebuild_index()
+        self.notify("external_change")
+        return True
+    
+    def rebuild_index(self):
+        """Rebuild the task index, ready queue and lease index from storage"""
+        claims = self.storage.get_claims()
+        self.tasks = {}
+        self.ready_queue = ReadyQueue()
+        self.status_counts = Counter()
+        self.type_counts = Counter()
+        self.graph = TaskGraph()
+        tasks = self.storage.get_tasks()
+        # The whole graph first, so readiness and critical paths are final when queueing
+        for task in tasks:
+            self.graph_task(task)
+        for task in tasks:
+            self.graph.set_done(task["id"], task.get("status") == "completed")
+        for task in tasks:
+            self.index_task(task, claimed=str(task["id"]) in claims)
         
-        if os.path.exists(self.locks_file):
-            with open(self.locks_file, 'r') as f:
-                self.file_locks = json.load(f)
+        self.leases.clear()
+        self.agent_claims.clear()
+        self.agent_locks.clear()
+        self.lease_counts = Counter()
+        for task_id, claim in claims.items():
+            self.track_lease("task", task_id, claim)
+        for file_path, lock in self.storage.get_locks().items():
+            self.track_lease("file", file_path, lock)
+    
+    def track_lease(self, kind: str, key: str, entry: Dict):
+        """Index a claim/lock by agent and, if leased, by deadline"""
+        held = self.agent_claims if kind == "task" else self.agent_locks
+        if key not in held[entry["agent_id"]]:
+            held[entry["agent_id"]].add(key)
+            self.lease_counts[kind] += 1
+        if entry.get("expires_at") is not None:
+            if self.leases.push(entry["expires_at"], kind, key, entry["agent_id"]):
+                self.reaper_wakeup.set()
+    
+    def untrack_lease(self, kind: str, key: str, agent_id: str):
+        held = self.agent_claims if kind == "task" else self.agent_locks
+        if key in held[agent_id]:
+            held[agent_id].discard(key)
+            self.lease_counts[kind] -= 1
+        if not held[agent_id]:
+            del held[agent_id]
+    
+    def lease_deadline(self) -> Optional[float]:
+        return time.time() + self.lease_ttl if self.lease_ttl else None
+    
+    def graph_task(self, task: Dict) -> Set[str]:
+        """Add or re-define a task's dependencies and estimate; returns ids whose critical path changed"""
+        return self.graph.add(task["id"], task.get("depends_on") or (),
+                              estimated_hours(task.get("estimated_time")))
+    
+    def index_task(self, task: Dict, claimed: bool = False):
+        """Add or refresh a task in the index, status counts and ready queue"""
+        task_id = str(task["id"])
+        previous = self.tasks.get(task_id)
+        if previous is not None:
+            self.status_counts[previous.get("status")] -= 1
+            self.type_counts[previous.get("status"), previous.get("type", "general")] -= 1
+        self.tasks[task_id] = task
+        self.status_counts[task.get("status")] += 1
+        self.type_counts[task.get("status"), task.get("type", "general")] += 1
+        if task.get("status") == "pending" and not claimed and self.graph.is_ready(task_id):
+            if previous is None or task_id not in self.ready_queue or \
+                    previous.get("priority") != task.get("priority"):
+                self.ready_queue.push(task, self.graph.critical_path(task_id))
+        else:
+            self.ready_queue.discard(task_id)
+    
+    def reprioritise(self, task_ids):
+        """Re-queue ready tasks whose critical path changed"""
+        for task_id in task_ids:
+            if task_id in self.ready_queue:
+                self.ready_queue.push(self.tasks[task_id], self.graph.critical_path(task_id))
+    
+    def refresh_dependents(self, task_ids) -> List[str]:
+        """Re-index tasks whose dependencies finished (or un-finished); returns the ones now ready"""
+        unblocked = []
+        for task_id in task_ids:
+            task = self.tasks.get(task_id)
+            if task is None:
+                continue
+            self.index_task(task, claimed=self.storage.get_claim(task_id) is not None)
+            if task_id in self.ready_queue:
+                unblocked.append(task_id)
+        return unblocked
+    
+    def check_dependencies(self, tasks: List[Dict]):
+        """Raise ValueError if these tasks' depends_on would close a cycle"""
+        cycle = self.graph.find_cycle({str(task["id"]): task.get("depends_on") or () for task in tasks})
+        if cycle:
+            raise ValueError(f"Dependency cycle: {' -> '.join(cycle)}")
     
     def claim_task(self, agent_id: str, task_id: str) -> bool:
         """Claim a task for an agent"""
         with self.lock:
-            if task_id not in self.claimed_tasks:
-                self.claimed_tasks[task_id] = {
-                    "agent_id": agent_id,
-                    "claimed_at": datetime.now().isoformat()
-                }
-                self.save_claimed_tasks()
+            # Claimed either way: by us, or already by someone else
+            self.ready_queue.discard(task_id)
+            expires_at = self.lease_deadline()
+            claimed = self.storage.claim_task(task_id, agent_id, datetime.now().isoformat(), expires_at)
+            if claimed:
+                self.track_lease("task", task_id, {"agent_id": agent_id, "expires_at": expires_at})
                 print(f"Task {task_id} claimed by {agent_id}")
-                return True
             else:
-                print(f"Task {task_id} already claimed by {self.claimed_tasks[task_id]['agent_id']}")
-                return False
+                claim = self.storage.get_claim(task_id)
+                print(f"Task {task_id} already claimed by {claim['agent_id'] if claim else 'unknown'}")
+        self.storage.flush()
+        return claimed
     
     def release_task(self, agent_id: str, task_id: str):
         """Release a claimed task"""
         with self.lock:
-            if task_id in self.claimed_tasks and self.claimed_tasks[task_id]["agent_id"] == agent_id:
-                del self.claimed_tasks[task_id]
-                self.save_claimed_tasks()
+            if self.storage.release_task(task_id, agent_id):
+                self.untrack_lease("task", task_id, agent_id)
                 print(f"Task {task_id} released by {agent_id}")
+                self.requeue_task(task_id)
+                released = True
+            else:
+                released = False
+        self.storage.flush()
+        if released:
+            self.notify("task_released", task_id)
+    
+    def requeue_task(self, task_id: str):
+        """Return an unclaimed, unfinished task to the ready pool"""
+        task = self.tasks.get(str(task_id))
+        if task is None:
+            return
+        if task.get("status") == "in_progress":
+            updates = {"status": "pending", "assigned_to": None}
+            self.storage.update_task(task_id, updates)
+            task = {**task, **updates}
+        self.index_task(task)
     
-    def lock_file(self, agent_id: str, file_path: str) -> bool:
-        """Lock a file for exclusive editing"""
-        with self.lock:
-            if file_path not in self.file_locks:
-                self.file_locks[file_path] = {
-                    "agent_id": agent_id,
-                    "locked_at": datetime.now().isoformat()
-                }
-                self.save_file_locks()
-                print(f"File {file_path} locked by {agent_id}")
-                return True
+    def lock_file(self, agent_id: str, file_path: str, mode: str = EXCLUSIVE) -> bool:
+        """Lock a file, or a directory and everything beneath it, for editing"""
+        return self.lock_files(agent_id, [file_path], mode)
+    
+    def lock_files(self, agent_id: str, file_paths: List, mode: str = EXCLUSIVE) -> bool:
+        """Lock several paths all-or-none
+        
+        Items are paths (locked in `mode`) or (path, mode) tuples. Requests are
+        taken in sorted path order so agents locking overlapping sets can't
+        deadlock each other, and nothing is held if any path conflicts.
+        """
+        requests = normalize_requests((path, mode) if isinstance(path, str) else path for path in file_paths)
+        with self.lock:
+            expires_at = self.lease_deadline()
+            conflict = self.storage.lock_files(agent_id, requests, datetime.now().isoformat(), expires_at)
+            if conflict is None:
+                for path, path_mode in requests:
+                    self.track_lease("file", lock_key(path, agent_id, path_mode),
+                                     {"agent_id": agent_id, "expires_at": expires_at})
+                print(f"File {', '.join(path for path, _ in requests)} locked by {agent_id}")
+            elif conflict["path"] == conflict["requested"]:
+                print(f"File {conflict['requested']} already locked by {conflict['agent_id']}")
             else:
-                print(f"File {file_path} already locked by {self.file_locks[file_path]['agent_id']}")
-                return False
+                print(f"File {conflict['requested']} already locked by {conflict['agent_id']} "
+                      f"({conflict['mode']} lock on {conflict['path']})")
+        self.storage.flush()
+        return conflict is None
+    
+    def find_lock_conflict(self, agent_id: str, file_path: str, mode: str = EXCLUSIVE) -> Optional[Dict]:
+        """The lock (path, agent_id, mode) that would block agent_id from locking file_path, if any"""
+        with self.lock:
+            return self.storage.find_lock_conflict(file_path, agent_id, mode)
     
     def release_file_lock(self, agent_id: str, file_path: str):
         """Release file lock"""
+        self.release_file_locks(agent_id, [file_path])
+    
+    def release_file_locks(self, agent_id: str, file_paths: List[str]):
+        """Release the agent's locks (either mode) on the given paths"""
+        with self.lock:
+            for path, _ in normalize_requests(file_paths):
+                for mode in (EXCLUSIVE, SHARED):
+                    key = lock_key(path, agent_id, mode)
+                    if self.storage.release_file_lock(key, agent_id):
+                        self.untrack_lease("file", key, agent_id)
+                        print(f"File {path} unlocked by {agent_id}")
+        self.storage.flush()
+    
+    def renew(self, agent_id: str) -> int:
+        """Heartbeat: extend every claim and lock the agent holds; returns how many"""
+        if not self.lease_ttl:
+            return 0
+        with self.lock:
+            task_ids = list(self.agent_claims.get(agent_id, ()))
+            file_paths = list(self.agent_locks.get(agent_id, ()))
+            if not task_ids and not file_paths:
+                return 0
+            expires_at = self.lease_deadline()
+            self.storage.renew_leases(agent_id, task_ids, file_paths, expires_at)
+            for task_id in task_ids:
+                self.leases.push(expires_at, "task", task_id, agent_id)
+            for file_path in file_paths:
+                self.leases.push(expires_at, "file", file_path, agent_id)
+        self.storage.flush()
+        return len(task_ids) + len(file_paths)
+    
+    def expire_leases(self, now: Optional[float] = None) -> List[Tuple[str, str, str]]:
+        """Drop claims and locks whose lease ran out; returns (kind, key, agent_id)"""
+        now = time.time() if now is None else now
+        expired = []
+        with self.lock:
+            for _, kind, key, agent_id in self.leases.pop_due(now):
+                # Renewed or re-acquired leases have a later deadline and survive
+                if kind == "task" and self.storage.expire_claim(key, now):
+                    self.untrack_lease(kind, key, agent_id)
+                    self.requeue_task(key)
+                elif kind == "file" and self.storage.expire_lock(key, now):
+                    self.untrack_lease(kind, key, agent_id)
+                else:
+                    continue
+                print(f"Lease expired: {kind} {key} held by {agent_id}")
+                expired.append((kind, key, agent_id))
+        self.storage.flush()
+        for kind, key, agent_id in expired:
+            if kind == "task":
+                self.notify("claim_removed", key)
+            else:
+                self.notify("lock_expired", key)
+        return expired
+    
+    def start_lease_reaper(self):
+        """Expire leases in the background as their deadlines pass"""
+        if self.reaper_thread is None:
+            self.reaper_thread = threading.Thread(target=self.lease_reaper_loop, daemon=True)
+            self.reaper_thread.start()
+    
+    def stop_lease_reaper(self):
+        thread, self.reaper_thread = self.reaper_thread, None
+        self.reaper_wakeup.set()
+        if thread is not None:
+            thread.join(timeout=2)
+    
+    def close(self):
+        """Stop the lease reaper and release the storage backend (connection, journal fd, flusher)"""
+        self.stop_lease_reaper()
         with self.lock:
-            if file_path in self.file_locks and self.file_locks[file_path]["agent_id"] == agent_id:
-                del self.file_locks[file_path]
-                self.save_file_locks()
-                print(f"File {file_path} unlocked by {agent_id}")
+            self.storage.close()
+    
+    def lease_reaper_loop(self):
+        while self.reaper_thread is threading.current_thread():
+            next_expiry = self.leases.next_expiry()
+            # Sleep until the earliest deadline; an earlier new lease wakes us
+            timeout = None if next_expiry is None else max(0.0, next_expiry - time.time())
+            if self.reaper_wakeup.wait(timeout):
+                self.reaper_wakeup.clear()
+                continue
+            try:
+                self.expire_leases()
+            except Exception as e:
+                print(f"Lease reaper error: {e}")
     
     def get_available_tasks(self) -> List[str]:
-        """Get list of unclaimed tasks"""
-        # Load current todo system
-        if os.path.exists(self.todo_file):
-            with open(self.todo_file, 'r') as f:
-                todo_data = json.load(f)
-                all_tasks = [task["id"] for task in todo_data.get("tasks", [])]
-                return [task_id for task_id in all_tasks if str(task_id) not in self.claimed_tasks]
-        return []
+        """Get list of unclaimed pending tasks in priority order"""
+        with self.lock:
+            return self.ready_queue.ordered_ids()
     
-    def get_locked_files(self) -> Dict[str, str]:
-        """Get dictionary of locked files and their owners"""
-        return {path: info["agent_id"] for path, info in self.file_locks.items()}
+    def next_task(self, task_type: Optional[str] = None) -> Optional[Dict]:
+        """Peek the highest-priority ready task, optionally of one type"""
+        with self.lock:
+            task_id = self.ready_queue.peek(task_type)
+            return dict(self.tasks[task_id]) if task_id is not None else None
     
-    def save_claimed_tasks(self):
-        """Save claimed tasks to todo file"""
-        todo_data = {"tasks": [], "claimed_tasks": self.claimed_tasks}
-        
-        # Load existing tasks if file exists
-        if os.path.exists(self.todo_file):
-            with open(self.todo_file, 'r') as f:
-                existing = json.load(f)
-                todo_data["tasks"] = existing.get("tasks", [])
+    def ready_tasks(self, limit: int) -> List[Dict]:
+        """The `limit` highest-priority ready tasks (with their critical_path), without claiming them"""
+        with self.lock:
+            return [{**self.tasks[task_id], "critical_path": self.graph.critical_path(task_id)}
+                    for task_id in self.ready_queue.top_ids(limit)]
+    
+    def blocked_tasks(self) -> Dict[str, List[str]]:
+        """Pending tasks still waiting on dependencies, with the ids they wait for"""
+        with self.lock:
+            return {task_id: self.graph.waiting_on(task_id) for task_id, task in self.tasks.items()
+                    if task.get("status") == "pending" and not self.graph.is_ready(task_id)}
+    
+    def claimed_count(self, agent_id: str) -> int:
+        """Number of tasks an agent currently has claimed"""
+        with self.lock:
+            return len(self.agent_claims.get(agent_id, ()))
+    
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        """Get a single task by id"""
+        task = self.tasks.get(str(task_id))
+        return dict(task) if task is not None else None
+    
+    def get_tasks(self) -> List[Dict]:
+        """Get all tasks in the shared todo system"""
+        with self.lock:
+            return [dict(task) for task in self.tasks.values()]
+    
+    def get_status_counts(self) -> Dict[str, int]:
+        """Get task counts by status"""
+        return {status: count for status, count in self.status_counts.items() if count > 0}
+    
+    def get_type_counts(self) -> Dict[Tuple[str, str], int]:
+        """Get task counts by (status, type)"""
+        with self.lock:
+            return {key: count for key, count in self.type_counts.items() if count > 0}
+    
+    def get_lease_counts(self) -> Dict[str, int]:
+        """Number of task claims ("task") and file locks ("file") currently held"""
+        with self.lock:
+            return {"task": self.lease_counts["task"], "file": self.lease_counts["file"]}
+    
+    def pending_count(self) -> int:
+        """Number of tasks ready to be handed out"""
+        return len(self.ready_queue)
+    
+    def add_tasks(self, tasks: List[Dict]):
+        """Add new tasks to the shared todo system
         
-        with open(self.todo_file, 'w') as f:
-            json.dump(todo_data, f, indent=2)
+        Tasks may list the ids they wait for in depends_on (including tasks in
+        the same batch); a batch that would create a cycle is rejected with
+        ValueError before anything is stored.
+        """
+        with self.lock:
+            self.check_dependencies(tasks)
+            self.storage.add_tasks(tasks)
+            changed = set()
+            for task in tasks:
+                changed |= self.graph_task(task)
+            unblocked = []
+            for task in tasks:
+                unblocked += self.graph.set_done(task["id"], task.get("status") == "completed")
+            for task in tasks:
+                self.index_task(dict(task))
+            # Tasks that were waiting on ids from this batch
+            self.refresh_dependents(set(unblocked) - {str(task["id"]) for task in tasks})
+            self.reprioritise(changed)
+        self.storage.flush()
+        self.notify("tasks_added")
+    
+    def update_task(self, task_id: str, updates: Dict) -> bool:
+        """Update fields of a task (status, assigned_to, ...)"""
+        unblocked = []
+        with self.lock:
+            task = self.tasks.get(str(task_id))
+            if task is not None and "depends_on" in updates:
+                self.check_dependencies([{"id": task_id, "depends_on": updates["depends_on"]}])
+            if not self.storage.update_task(task_id, updates):
+                return False
+            if task is not None:
+                task = {**task, **updates}
+                changed = set()
+                if "depends_on" in updates or "estimated_time" in updates:
+                    changed = self.graph_task(task)
+                waiting = self.graph.set_done(task_id, task.get("status") == "completed")
+                self.index_task(task, claimed=self.storage.get_claim(str(task_id)) is not None)
+                unblocked = self.refresh_dependents(waiting)
+                self.reprioritise(changed)
+        self.storage.flush()
+        if updates.get("status") == "pending":
+            self.notify("task_updated", task_id)
+        if unblocked:
+            self.notify("tasks_unblocked")
+        return True
     
-    def save_file_locks(self):
-        """Save file locks to file"""
-        with open(self.locks_file, 'w') as f:
-            json.dump(self.file_locks, f, indent=2)
+    def get_locked_files(self) -> Dict[str, str]:
+        """Get dictionary of locked files and their owners (one of them, for shared locks)"""
+        return {info.get("path", key): info["agent_id"] for key, info in self.file_locks.items()}
+    
+    def export_json(self, todo_file: Optional[str] = None, locks_file: Optional[str] = None):
+        """Export state to the JSON todo/locks file format"""
+        with self.lock:
+            self.storage.export_json(todo_file or self.todo_file, locks_file or self.locks_file)
+    
+    def import_json(self, todo_file: Optional[str] = None, locks_file: Optional[str] = None):
+        """Replace state with the contents of JSON todo/locks files"""
+        with self.lock:
+            self.storage.import_json(todo_file or self.todo_file, locks_file or self.locks_file)
+            self.rebuild_index()
     
     def cleanup_stale_locks(self, timeout_hours: int = 24):
-        """Clean up locks older than timeout_hours"""
+        """Clean up un-leased (legacy) locks older than timeout_hours"""
         current_time = datetime.now()
         stale_locks = []
         
         with self.lock:
             # Check file locks
-            for file_path, lock_info in self.file_locks.items():
+            for file_path, lock_info in self.storage.get_locks().items():
+                if lock_info.get("expires_at") is not None:
+                    continue  # leased: handled by expire_leases
                 lock_time = datetime.fromisoformat(lock_info["locked_at"])
                 if (current_time - lock_time).total_seconds() > timeout_hours * 3600:
                     stale_locks.append(("file", file_path))
             
             # Check task claims
-            for task_id, claim_info in self.claimed_tasks.items():
+            for task_id, claim_info in self.storage.get_claims().items():
+                if claim_info.get("expires_at") is not None:
+                    continue
                 claim_time = datetime.fromisoformat(claim_info["claimed_at"])
                 if (current_time - claim_time).total_seconds() > timeout_hours * 3600:
                     stale_locks.append(("task", task_id))
             
             # Remove stale locks
+            released_claims = []
             for lock_type, lock_id in stale_locks:
                 if lock_type == "file":
                     print(f"Removing stale file lock: {lock_id}")
-                    del self.file_locks[lock_id]
+                    self.untrack_lease("file", lock_id, self.storage.get_lock(lock_id)["agent_id"])
+                    self.storage.remove_lock(lock_id)
                 else:
                     print(f"Removing stale task claim: {lock_id}")
-                    del self.claimed_tasks[lock_id]
-            
-            if stale_locks:
-                self.save_file_locks()
-                self.save_claimed_tasks()
+                    self.untrack_lease("task", lock_id, self.storage.get_claim(lock_id)["agent_id"])
+                    self.storage.remove_claim(lock_id)
+                    self.requeue_task(lock_id)
+                    released_claims.append(lock_id)
+        
+        self.storage.flush()
+        for task_id in released_claims:
+            self.notify("claim_removed", task_id)
     
     def is_task_claimed(self, task_id: str) -> bool:
         """Check if a task is currently claimed"""
-        return task_id in self.claimed_tasks
+        return self.storage.get_claim(task_id) is not None
+    
+    def claim_owner(self, task_id: str) -> Optional[str]:
+        """Agent currently holding a task's claim, if any"""
+        claim = self.storage.get_claim(task_id)
+        return claim["agent_id"] if claim else None
     
     def save_json(self, filepath: str, data: Dict):
         """Save JSON data to file"""
@@ -0,0 +1,975 @@
+#!/usr/bin/env python3
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from path_locks import EXCLUSIVE, ancestor_paths, build_index, canonical_path, lock_key, normalize_requests
+
+
+class TaskStorage:
+    """Persistence backend for tasks, task claims and file locks"""
+
+    def load(self):
+        """Reload state from the underlying store"""
+        pass
+
+    def close(self):
+        """Release any resources held by the backend"""
+        pass
+
+    def flush(self):
+        """Block until this thread's earlier mutations are durable"""
+        pass
+
+    def watch_paths(self) -> List[str]:
+        """Files whose modification signals a change to the store"""
+        return []
+
+    def changed_externally(self) -> bool:
+        """Whether another process has written the store since we last looked"""
+        return False
+
+    def get_tasks(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def add_tasks(self, tasks: List[Dict]):
+        raise NotImplementedError
+
+    def update_task(self, task_id: str, updates: Dict) -> bool:
+        raise NotImplementedError
+
+    def get_claims(self) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    def get_claim(self, task_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def claim_task(self, task_id: str, agent_id: str, claimed_at: str,
+                   expires_at: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def release_task(self, task_id: str, agent_id: str) -> bool:
+        raise NotImplementedError
+
+    def remove_claim(self, task_id: str):
+        raise NotImplementedError
+
+    def get_locks(self) -> Dict[str, Dict]:
+        raise NotImplementedError
+
+    def get_lock(self, file_path: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def lock_file(self, file_path: str, agent_id: str, locked_at: str,
+                  expires_at: Optional[float] = None) -> bool:
+        return self.lock_files(agent_id, normalize_requests([file_path]), locked_at, expires_at) is None
+
+    def lock_files(self, agent_id: str, requests: List[Tuple[str, str]], locked_at: str,
+                   expires_at: Optional[float] = None) -> Optional[Dict]:
+        """Acquire every (path, mode) lock or none; on conflict return the blocking lock"""
+        raise NotImplementedError
+
+    def find_lock_conflict(self, path: str, agent_id: str, mode: str = EXCLUSIVE) -> Optional[Dict]:
+        """Lock held by another agent on the path, an ancestor directory or anything beneath it"""
+        raise NotImplementedError
+
+    def release_file_lock(self, lock_id: str, agent_id: str) -> bool:
+        raise NotImplementedError
+
+    def remove_lock(self, lock_id: str):
+        raise NotImplementedError
+
+    def renew_leases(self, agent_id: str, task_ids: List[str], file_paths: List[str], expires_at: float):
+        """Push out the lease deadline of the agent's listed claims and locks"""
+        raise NotImplementedError
+
+    def expire_claim(self, task_id: str, now: float) -> bool:
+        """Remove a claim only if its lease has run out (it may have been renewed)"""
+        raise NotImplementedError
+
+    def expire_lock(self, file_path: str, now: float) -> bool:
+        """Remove a file lock only if its lease has run out"""
+        raise NotImplementedError
+
+    def replace_state(self, tasks: List[Dict], claims: Dict[str, Dict], locks: Dict[str, Dict]):
+        raise NotImplementedError
+
+    def get_unclaimed_task_ids(self) -> List[str]:
+        """Get ids of tasks without an active claim"""
+        claims = self.get_claims()
+        return [task["id"] for task in self.get_tasks() if str(task["id"]) not in claims]
+
+    def export_json(self, todo_file: str, locks_file: str):
+        """Write current state in the todo_system.json / file_locks.json format"""
+        write_json(todo_file, {"tasks": self.get_tasks(), "claimed_tasks": self.get_claims()})
+        write_json(locks_file, self.get_locks())
+
+    def import_json(self, todo_file: str, locks_file: str):
+        """Replace current state with the contents of the JSON files"""
+        todo_data = read_json(todo_file)
+        self.replace_state(todo_data.get("tasks", []),
+                           todo_data.get("claimed_tasks", {}),
+                           read_json(locks_file))
+
+
+def make_entry(agent_id: str, time_key: str, at: str, expires_at: Optional[float]) -> Dict:
+    """Claim/lock record; expires_at is only present for leased entries"""
+    entry = {"agent_id": agent_id, time_key: at}
+    if expires_at is not None:
+        entry["expires_at"] = expires_at
+    return entry
+
+
+def make_lock_entry(agent_id: str, locked_at: str, expires_at: Optional[float], path: str, mode: str) -> Dict:
+    """File lock record; shared locks also record their mode and path (their key is per holder)"""
+    entry = make_entry(agent_id, "locked_at", locked_at, expires_at)
+    if mode != EXCLUSIVE:
+        entry["mode"] = mode
+        entry["path"] = path
+    return entry
+
+
+def is_expired(entry: Optional[Dict], now: float) -> bool:
+    return entry is not None and entry.get("expires_at") is not None and entry["expires_at"] <= now
+
+
+def read_json(filepath: str) -> Dict:
+    """Load JSON data from file, empty dict if missing"""
+    if os.path.exists(filepath):
+        with open(filepath, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def write_json(filepath: str, data, fsync: bool = False):
+    """Save JSON data to file atomically (temp file + rename)"""
+    tmp_path = f"{filepath}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+
+class InMemoryLockTable(TaskStorage):
+    """File locks held in a dict plus a path trie for O(depth) conflict checks"""
+
+    def reset_locks(self, locks: Dict[str, Dict]):
+        self.locks = dict(locks)
+        self.lock_index = build_index(self.locks)
+
+    def put_lock(self, key: str, entry: Dict):
+        self.locks[key] = entry
+        self.lock_index.add(entry.get("path", key), entry["agent_id"], entry.get("mode", EXCLUSIVE))
+
+    def pop_lock(self, key: str) -> Optional[Dict]:
+        entry = self.locks.pop(key, None)
+        if entry is not None:
+            self.lock_index.remove(entry.get("path", key), entry["agent_id"], entry.get("mode", EXCLUSIVE))
+        return entry
+
+    def index_conflict(self, path: str, agent_id: str, mode: str) -> Optional[Dict]:
+        conflict = self.lock_index.find_conflict(path, agent_id, mode)
+        if conflict is None:
+            return None
+        return {"path": conflict[0], "agent_id": conflict[1], "mode": conflict[2], "requested": path}
+
+    def find_lock_conflict(self, path: str, agent_id: str, mode: str = EXCLUSIVE) -> Optional[Dict]:
+        return self.index_conflict(canonical_path(path), agent_id, mode)
+
+    def check_lock_requests(self, agent_id: str, requests: List[Tuple[str, str]]) -> Optional[Dict]:
+        for path, mode in requests:
+            existing = self.locks.get(lock_key(path, agent_id, mode))
+            if existing is not None:
+                return {"path": path, "agent_id": existing["agent_id"], "mode": mode, "requested": path}
+            conflict = self.index_conflict(path, agent_id, mode)
+            if conflict is not None:
+                return conflict
+        return None
+
+    def add_locks(self, agent_id: str, requests: List[Tuple[str, str]], locked_at: str,
+                  expires_at: Optional[float]):
+        for path, mode in requests:
+            self.put_lock(lock_key(path, agent_id, mode),
+                          make_lock_entry(agent_id, locked_at, expires_at, path, mode))
+
+
+class JsonTaskStorage(InMemoryLockTable):
+    """Original file format: whole-file rewrites of todo_system.json and file_locks.json"""
+
+    def __init__(self, todo_file: str, locks_file: str):
+        self.todo_file = todo_file
+        self.locks_file = locks_file
+        self.tasks = []
+        self.claims = {}
+        self.reset_locks({})
+        self.known_stats = {}  # path -> (mtime_ns, size) as of our last read/write
+        self.load()
+
+    def file_stat(self, path: str) -> Optional[tuple]:
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def load(self):
+        todo_data = read_json(self.todo_file)
+        self.tasks = todo_data.get("tasks", [])
+        self.claims = todo_data.get("claimed_tasks", {})
+        self.reset_locks(read_json(self.locks_file))
+        for path in self.watch_paths():
+            self.known_stats[path] = self.file_stat(path)
+
+    def save_todo(self):
+        write_json(self.todo_file, {"tasks": self.tasks, "claimed_tasks": self.claims})
+        self.known_stats[self.todo_file] = self.file_stat(self.todo_file)
+
+    def save_locks(self):
+        write_json(self.locks_file, self.locks)
+        self.known_stats[self.locks_file] = self.file_stat(self.locks_file)
+
+    def watch_paths(self) -> List[str]:
+        return [self.todo_file, self.locks_file]
+
+    def changed_externally(self) -> bool:
+        return any(self.file_stat(path) != self.known_stats.get(path) for path in self.watch_paths())
+
+    def get_tasks(self) -> List[Dict]:
+        return list(self.tasks)
+
+    def add_tasks(self, tasks: List[Dict]):
+        self.tasks.extend(tasks)
+        self.save_todo()
+
+    def update_task(self, task_id: str, updates: Dict) -> bool:
+        for task in self.tasks:
+            if str(task["id"]) == str(task_id):
+                task.update(updates)
+                self.save_todo()
+                return True
+        return False
+
+    def get_claims(self) -> Dict[str, Dict]:
+        return dict(self.claims)
+
+    def get_claim(self, task_id: str) -> Optional[Dict]:
+        return self.claims.get(task_id)
+
+    def claim_task(self, task_id: str, agent_id: str, claimed_at: str,
+                   expires_at: Optional[float] = None) -> bool:
+        if task_id in self.claims:
+            return False
+        self.claims[task_id] = make_entry(agent_id, "claimed_at", claimed_at, expires_at)
+        self.save_todo()
+        return True
+
+    def release_task(self, task_id: str, agent_id: str) -> bool:
+        claim = self.claims.get(task_id)
+        if claim is None or claim["agent_id"] != agent_id:
+            return False
+        del self.claims[task_id]
+        self.save_todo()
+        return True
+
+    def remove_claim(self, task_id: str):
+        if self.claims.pop(task_id, None) is not None:
+            self.save_todo()
+
+    def get_locks(self) -> Dict[str, Dict]:
+        return dict(self.locks)
+
+    def get_lock(self, file_path: str) -> Optional[Dict]:
+        return self.locks.get(file_path)
+
+    def lock_files(self, agent_id: str, requests: List[Tuple[str, str]], locked_at: str,
+                   expires_at: Optional[float] = None) -> Optional[Dict]:
+        conflict = self.check_lock_requests(agent_id, requests)
+        if conflict is None:
+            self.add_locks(agent_id, requests, locked_at, expires_at)
+            self.save_locks()
+        return conflict
+
+    def release_file_lock(self, lock_id: str, agent_id: str) -> bool:
+        lock = self.locks.get(lock_id)
+        if lock is None or lock["agent_id"] != agent_id:
+            return False
+        self.pop_lock(lock_id)
+        self.save_locks()
+        return True
+
+    def remove_lock(self, lock_id: str):
+        if self.pop_lock(lock_id) is not None:
+            self.save_locks()
+
+    def renew_leases(self, agent_id: str, task_ids: List[str], file_paths: List[str], expires_at: float):
+        for entries, keys, save in ((self.claims, task_ids, self.save_todo), (self.locks, file_paths, self.save_locks)):
+            renewed = False
+            for key in keys:
+                entry = entries.get(key)
+                if entry is not None and entry["agent_id"] == agent_id:
+                    entry["expires_at"] = expires_at
+                    renewed = True
+            if renewed:
+                save()
+
+    def expire_claim(self, task_id: str, now: float) -> bool:
+        if not is_expired(self.claims.get(task_id), now):
+            return False
+        del self.claims[task_id]
+        self.save_todo()
+        return True
+
+    def expire_lock(self, lock_id: str, now: float) -> bool:
+        if not is_expired(self.locks.get(lock_id), now):
+            return False
+        self.pop_lock(lock_id)
+        self.save_locks()
+        return True
+
+    def replace_state(self, tasks: List[Dict], claims: Dict[str, Dict], locks: Dict[str, Dict]):
+        self.tasks = list(tasks)
+        self.claims = dict(claims)
+        self.reset_locks(locks)
+        self.save_todo()
+        self.save_locks()
+
+
+class SqliteTaskStorage(TaskStorage):
+    """SQLite (WAL mode) store; every claim/lock mutation is one indexed statement"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            status TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+        CREATE TABLE IF NOT EXISTS claims (
+            task_id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            claimed_at TEXT NOT NULL,
+            expires_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_claims_agent ON claims(agent_id);
+        CREATE TABLE IF NOT EXISTS file_locks (
+            file_path TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            locked_at TEXT NOT NULL,
+            expires_at REAL,
+            lock_path TEXT,
+            mode TEXT NOT NULL DEFAULT 'exclusive'
+        );
+        CREATE INDEX IF NOT EXISTS idx_file_locks_agent ON file_locks(agent_id);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        # Autocommit mode: single statements commit on their own, multi-statement
+        # work uses explicit BEGIN IMMEDIATE so other processes wait on busy_timeout
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        # Databases created before leases / path locks lack the newer columns
+        for table, column, definition in (("claims", "expires_at", "REAL"),
+                                          ("file_locks", "expires_at", "REAL"),
+                                          ("file_locks", "lock_path", "TEXT"),
+                                          ("file_locks", "mode", "TEXT NOT NULL DEFAULT 'exclusive'")):
+            columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self.conn.execute("UPDATE file_locks SET lock_path = file_path WHERE lock_path IS NULL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_file_locks_path ON file_locks(lock_path)")
+        self.data_version = self.read_data_version()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def watch_paths(self) -> List[str]:
+        return [self.db_path, self.db_path + "-wal"]
+
+    def read_data_version(self) -> int:
+        return self.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_externally(self) -> bool:
+        # data_version only moves when a *different* connection commits
+        version = self.read_data_version()
+        changed = version != self.data_version
+        self.data_version = version
+        return changed
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self.lock:
+            return self.conn.execute(sql, params)
+
+    def is_empty(self) -> bool:
+        """Check whether the database holds no tasks, claims or locks"""
+        for table in ("tasks", "claims", "file_locks"):
+            if self.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                return False
+        return True
+
+    def get_tasks(self) -> List[Dict]:
+        rows = self.execute("SELECT data FROM tasks ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def add_tasks(self, tasks: List[Dict]):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO tasks(id, status, data) VALUES (?, ?, ?)",
+                    [(str(t["id"]), t.get("status"), json.dumps(t)) for t in tasks])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def update_task(self, task_id: str, updates: Dict) -> bool:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT data FROM tasks WHERE id = ?", (str(task_id),)).fetchone()
+                if row is None:
+                    self.conn.execute("ROLLBACK")
+                    return False
+                task = json.loads(row[0])
+                task.update(updates)
+                self.conn.execute("UPDATE tasks SET status = ?, data = ? WHERE id = ?",
+                                  (task.get("status"), json.dumps(task), str(task_id)))
+                self.conn.execute("COMMIT")
+                return True
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def get_claims(self) -> Dict[str, Dict]:
+        rows = self.execute("SELECT task_id, agent_id, claimed_at, expires_at FROM claims").fetchall()
+        return {task_id: make_entry(agent_id, "claimed_at", claimed_at, expires_at)
+                for task_id, agent_id, claimed_at, expires_at in rows}
+
+    def get_claim(self, task_id: str) -> Optional[Dict]:
+        row = self.execute("SELECT agent_id, claimed_at, expires_at FROM claims WHERE task_id = ?",
+                           (task_id,)).fetchone()
+        return make_entry(row[0], "claimed_at", row[1], row[2]) if row else None
+
+    def claim_task(self, task_id: str, agent_id: str, claimed_at: str,
+                   expires_at: Optional[float] = None) -> bool:
+        cursor = self.execute("INSERT OR IGNORE INTO claims(task_id, agent_id, claimed_at, expires_at) "
+                              "VALUES (?, ?, ?, ?)", (task_id, agent_id, claimed_at, expires_at))
+        return cursor.rowcount == 1
+
+    def release_task(self, task_id: str, agent_id: str) -> bool:
+        cursor = self.execute("DELETE FROM claims WHERE task_id = ? AND agent_id = ?", (task_id, agent_id))
+        return cursor.rowcount == 1
+
+    def remove_claim(self, task_id: str):
+        self.execute("DELETE FROM claims WHERE task_id = ?", (task_id,))
+
+    def get_locks(self) -> Dict[str, Dict]:
+        rows = self.execute("SELECT file_path, agent_id, locked_at, expires_at, lock_path, mode "
+                            "FROM file_locks").fetchall()
+        return {key: make_lock_entry(agent_id, locked_at, expires_at, path, mode)
+                for key, agent_id, locked_at, expires_at, path, mode in rows}
+
+    def get_lock(self, lock_id: str) -> Optional[Dict]:
+        row = self.execute("SELECT agent_id, locked_at, expires_at, lock_path, mode FROM file_locks "
+                           "WHERE file_path = ?", (lock_id,)).fetchone()
+        return make_lock_entry(*row) if row else None
+
+    def query_lock_conflict(self, path: str, agent_id: str, mode: str) -> Optional[Dict]:
+        """Indexed lookups: exact path and ancestors by equality, descendants by a key range"""
+        blocking = ("exclusive", "shared") if mode == EXCLUSIVE else ("exclusive",)
+        mode_marks = ", ".join("?" for _ in blocking)
+        candidates = ancestor_paths(path) + [path]
+        row = self.conn.execute(
+            f"SELECT lock_path, agent_id, mode FROM file_locks WHERE agent_id != ? AND mode IN ({mode_marks}) "
+            f"AND lock_path IN ({', '.join('?' for _ in candidates)}) LIMIT 1",
+            (agent_id, *blocking, *candidates)).fetchone()
+        if row is None:
+            if path == "":
+                lower, upper = "", "\uffff"  # relative root covers everything
+            else:
+                lower = path if path.endswith("/") else path + "/"
+                upper = lower[:-1] + "0"  # "0" sorts right after "/"
+            row = self.conn.execute(
+                f"SELECT lock_path, agent_id, mode FROM file_locks WHERE agent_id != ? AND mode IN ({mode_marks}) "
+                f"AND lock_path > ? AND lock_path < ? LIMIT 1",
+                (agent_id, *blocking, lower, upper)).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "agent_id": row[1], "mode": row[2], "requested": path}
+
+    def find_lock_conflict(self, path: str, agent_id: str, mode: str = EXCLUSIVE) -> Optional[Dict]:
+        with self.lock:
+            return self.query_lock_conflict(canonical_path(path), agent_id, mode)
+
+    def lock_files(self, agent_id: str, requests: List[Tuple[str, str]], locked_at: str,
+                   expires_at: Optional[float] = None) -> Optional[Dict]:
+        # BEGIN IMMEDIATE takes the write lock up front, so no other process can
+        # slip a conflicting lock in between our checks and inserts
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path, mode in requests:
+                    conflict = self.query_lock_conflict(path, agent_id, mode)
+                    if conflict is None:
+                        cursor = self.conn.execute(
+                            "INSERT OR IGNORE INTO file_locks(file_path, agent_id, locked_at, expires_at, lock_path, mode) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (lock_key(path, agent_id, mode), agent_id, locked_at, expires_at, path, mode))
+                        if cursor.rowcount != 1:
+                            conflict = {"path": path, "agent_id": agent_id, "mode": mode, "requested": path}
+                    if conflict is not None:
+                        self.conn.execute("ROLLBACK")
+                        return conflict
+                self.conn.execute("COMMIT")
+                return None
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def release_file_lock(self, lock_id: str, agent_id: str) -> bool:
+        cursor = self.execute("DELETE FROM file_locks WHERE file_path = ? AND agent_id = ?", (lock_id, agent_id))
+        return cursor.rowcount == 1
+
+    def remove_lock(self, lock_id: str):
+        self.execute("DELETE FROM file_locks WHERE file_path = ?", (lock_id,))
+
+    def renew_leases(self, agent_id: str, task_ids: List[str], file_paths: List[str], expires_at: float):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany("UPDATE claims SET expires_at = ? WHERE task_id = ? AND agent_id = ?",
+                                      [(expires_at, task_id, agent_id) for task_id in task_ids])
+                self.conn.executemany("UPDATE file_locks SET expires_at = ? WHERE file_path = ? AND agent_id = ?",
+                                      [(expires_at, path, agent_id) for path in file_paths])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def expire_claim(self, task_id: str, now: float) -> bool:
+        cursor = self.execute("DELETE FROM claims WHERE task_id = ? AND expires_at <= ?", (task_id, now))
+        return cursor.rowcount == 1
+
+    def expire_lock(self, file_path: str, now: float) -> bool:
+        cursor = self.execute("DELETE FROM file_locks WHERE file_path = ? AND expires_at <= ?", (file_path, now))
+        return cursor.rowcount == 1
+
+    def get_unclaimed_task_ids(self) -> List[str]:
+        rows = self.execute("SELECT t.id FROM tasks t LEFT JOIN claims c ON c.task_id = t.id "
+                            "WHERE c.task_id IS NULL ORDER BY t.rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def replace_state(self, tasks: List[Dict], claims: Dict[str, Dict], locks: Dict[str, Dict]):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute("DELETE FROM tasks")
+                self.conn.execute("DELETE FROM claims")
+                self.conn.execute("DELETE FROM file_locks")
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO tasks(id, status, data) VALUES (?, ?, ?)",
+                    [(str(t["id"]), t.get("status"), json.dumps(t)) for t in tasks])
+                self.conn.executemany(
+                    "INSERT INTO claims(task_id, agent_id, claimed_at, expires_at) VALUES (?, ?, ?, ?)",
+                    [(task_id, c["agent_id"], c["claimed_at"], c.get("expires_at"))
+                     for task_id, c in claims.items()])
+                self.conn.executemany(
+                    "INSERT INTO file_locks(file_path, agent_id, locked_at, expires_at, lock_path, mode) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(key, l["agent_id"], l["locked_at"], l.get("expires_at"),
+                      canonical_path(l.get("path", key)), l.get("mode", EXCLUSIVE)) for key, l in locks.items()])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+
+class JournalTaskStorage(InMemoryLockTable):
+    """Snapshot plus append-only operation journal
+
+    Each mutation appends one CRC-checked JSON line (O(1) bytes) to the
+    journal; fsyncs are batched across callers by a flusher thread (group
+    commit). Once the journal passes compact_bytes the full state is written
+    to the snapshot atomically and the journal starts over. On load the
+    snapshot is read and newer journal records replayed; a torn tail record
+    is dropped instead of losing the whole state, while a corrupt record
+    with valid ones after it stops the load rather than dropping them. An
+    flock on a side file keeps appends from several processes ordered, and
+    each mutation first applies any records other processes appended.
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: str,
+                 compact_bytes: int = 4 * 1024 * 1024, commit_delay: float = 0.002, sync: bool = True):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_bytes = compact_bytes
+        self.commit_delay = commit_delay
+        self.sync = sync
+        self.tasks = {}
+        self.claims = {}
+        self.reset_locks({})
+        self.last_conflict = None
+        self.seq = 0
+        self.offset = 0
+        self.journal_ino = None
+        self.fd = None
+        self.mutex = threading.RLock()
+        self.fd_lock = threading.Lock()
+        self.lock_file_handle = open(journal_file + ".lock", "a")
+        
+        # Group commit state: records written locally vs. known durable
+        self.commit = threading.Condition()
+        self.written = 0
+        self.synced = 0
+        self.closing = False
+        self.pending = threading.local()
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+        try:
+            self.load()
+        except Exception:
+            self.close()
+            raise
+
+    @contextmanager
+    def exclusive(self):
+        """Thread and cross-process exclusion for journal access"""
+        with self.mutex:
+            fcntl.flock(self.lock_file_handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.lock_file_handle, fcntl.LOCK_UN)
+
+    def close(self):
+        with self.commit:
+            self.closing = True
+            self.commit.notify_all()
+        self.flusher.join(timeout=2)
+        with self.mutex, self.fd_lock:
+            if self.fd is not None:
+                os.fsync(self.fd)
+                os.close(self.fd)
+                self.fd = None
+        self.lock_file_handle.close()
+
+    def watch_paths(self) -> List[str]:
+        return [self.journal_file, self.snapshot_file]
+
+    def changed_externally(self) -> bool:
+        try:
+            st = os.stat(self.journal_file)
+        except OSError:
+            return self.journal_ino is not None
+        return (st.st_ino, st.st_size) != (self.journal_ino, self.offset)
+
+    # --- state application ---
+
+    def apply(self, op: Dict) -> bool:
+        """Apply one operation to in-memory state; False if it is rejected"""
+        kind = op["op"]
+        if kind == "add_tasks":
+            for task in op["tasks"]:
+                self.tasks[str(task["id"])] = task
+        elif kind == "update_task":
+            task = self.tasks.get(str(op["task_id"]))
+            if task is None:
+                return False
+            task.update(op["updates"])
+        elif kind == "claim":
+            if op["task_id"] in self.claims:
+                return False
+            self.claims[op["task_id"]] = make_entry(op["agent_id"], "claimed_at", op["at"], op.get("expires_at"))
+        elif kind == "release":
+            claim = self.claims.get(op["task_id"])
+            if claim is None or (op.get("agent_id") and claim["agent_id"] != op["agent_id"]):
+                return False
+            del self.claims[op["task_id"]]
+        elif kind in ("lock", "lock_many"):
+            requests = op["requests"] if kind == "lock_many" else [(op["file_path"], EXCLUSIVE)]
+            self.last_conflict = self.check_lock_requests(op["agent_id"], requests)
+            if self.last_conflict is not None:
+                return False
+            self.add_locks(op["agent_id"], requests, op["at"], op.get("expires_at"))
+        elif kind == "unlock":
+            lock = self.locks.get(op["file_path"])
+            if lock is None or (op.get("agent_id") and lock["agent_id"] != op["agent_id"]):
+                return False
+            self.pop_lock(op["file_path"])
+        elif kind == "renew":
+            renewed = False
+            for entries, keys in ((self.claims, op["task_ids"]), (self.locks, op["file_paths"])):
+                for key in keys:
+                    entry = entries.get(key)
+                    if entry is not None and entry["agent_id"] == op["agent_id"]:
+                        entry["expires_at"] = op["expires_at"]
+                        renewed = True
+            return renewed
+        elif kind == "expire_claim":
+            if not is_expired(self.claims.get(op["task_id"]), op["now"]):
+                return False
+            del self.claims[op["task_id"]]
+        elif kind == "expire_lock":
+            if not is_expired(self.locks.get(op["file_path"]), op["now"]):
+                return False
+            self.pop_lock(op["file_path"])
+        else:
+            raise ValueError(f"Unknown journal operation: {kind}")
+        return True
+
+    # --- loading and replay ---
+
+    def load(self):
+        with self.exclusive():
+            self.reload()
+
+    def reload(self):
+        """Rebuild in-memory state from the snapshot and the whole journal (caller holds exclusive)"""
+        snapshot = read_json(self.snapshot_file)
+        self.tasks = {str(t["id"]): t for t in snapshot.get("tasks", [])}
+        self.claims = snapshot.get("claimed_tasks", {})
+        self.reset_locks(snapshot.get("file_locks", {}))
+        self.seq = snapshot.get("seq", 0)
+        self.open_journal()
+        self.offset = 0
+        self.replay()
+
+    def open_journal(self):
+        with self.fd_lock:
+            if self.fd is not None:
+                os.close(self.fd)
+            self.fd = os.open(self.journal_file, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            self.journal_ino = os.fstat(self.fd).st_ino
+
+    def replay(self):
+        """Apply journal records from self.offset to EOF"""
+        with open(self.journal_file, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        position = 0
+        while position < len(data):
+            end = data.find(b"\n", position)
+            record = self.decode_record(data[position:end]) if end != -1 else None
+            if record is None:
+                if end != -1 and self.valid_record_after(data, end + 1):
+                    # Committed records follow, so this isn't a crash mid-append
+                    raise ValueError(f"Corrupt journal record at offset {self.offset + position} "
+                                     f"of {self.journal_file}, followed by valid records")
+                # Torn tail from a crash mid-append: cut it off
+                print(f"Dropping torn journal record at offset {self.offset + position}")
+                os.truncate(self.journal_file, self.offset + position)
+                break
+            if record["seq"] > self.seq:
+                self.apply(record)
+                self.seq = record["seq"]
+            position = end + 1
+        self.offset += position
+
+    def valid_record_after(self, data: bytes, position: int) -> bool:
+        while position < len(data):
+            end = data.find(b"\n", position)
+            if end == -1:
+                return False
+            if self.decode_record(data[position:end]) is not None:
+                return True
+            position = end + 1
+        return False
+
+    def decode_record(self, line: bytes) -> Optional[Dict]:
+        checksum, _, payload = line.partition(b" ")
+        try:
+            if int(checksum, 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+
+    def catch_up(self):
+        """Pick up records appended by other processes (or reload after their compaction)"""
+        try:
+            st = os.stat(self.journal_file)
+        except OSError:
+            st = None
+        if st is None or st.st_ino != self.journal_ino or st.st_size < self.offset:
+            self.reload()
+        elif st.st_size > self.offset:
+            self.replay()
+
+    # --- appending, group commit and compaction ---
+
+    def mutate(self, op: Dict) -> bool:
+        with self.exclusive():
+            self.catch_up()
+            try:
+                if not self.apply(op):
+                    return False
+                op["seq"] = self.seq + 1
+                payload = json.dumps(op, separators=(",", ":")).encode()
+                record = b"%08x %s\n" % (zlib.crc32(payload), payload)
+                written = os.write(self.fd, record)
+                if written != len(record):
+                    raise OSError(f"Short journal write ({written} of {len(record)} bytes)")
+            except Exception:
+                # The operation may be half applied in memory but isn't in the journal:
+                # rebuild from disk (replay also cuts off a partly written record)
+                self.reload()
+                raise
+            self.seq += 1
+            self.offset += len(record)
+            with self.commit:
+                self.written += 1
+                self.pending.ticket = self.written
+                self.commit.notify_all()
+            if self.offset >= self.compact_bytes:
+                self.compact()
+        return True
+
+    def flush(self):
+        # Callers flush after dropping their own locks, so concurrent
+        # mutations share one fsync instead of queueing behind each other
+        if self.sync:
+            self.wait_durable(getattr(self.pending, "ticket", 0))
+
+    def wait_durable(self, ticket: int):
+        with self.commit:
+            while self.synced < ticket and not self.closing:
+                self.commit.wait()
+
+    def flush_loop(self):
+        """Batch fsyncs: one fsync covers every record written before it started"""
+        while True:
+            with self.commit:
+                while self.synced >= self.written and not self.closing:
+                    self.commit.wait()
+                if self.closing:
+                    return
+            time.sleep(self.commit_delay)
+            with self.fd_lock:
+                with self.commit:
+                    target = self.written
+                if self.fd is not None:
+                    os.fsync(self.fd)
+            with self.commit:
+                self.synced = max(self.synced, target)
+                self.commit.notify_all()
+
+    def compact(self):
+        """Write a snapshot of the full state and start an empty journal (caller holds exclusive)"""
+        write_json(self.snapshot_file, {
+            "seq": self.seq,
+            "tasks": list(self.tasks.values()),
+            "claimed_tasks": self.claims,
+            "file_locks": self.locks
+        }, fsync=True)
+        tmp_path = f"{self.journal_file}.tmp.{os.getpid()}"
+        open(tmp_path, "wb").close()
+        os.replace(tmp_path, self.journal_file)
+        self.open_journal()
+        self.offset = 0
+        # Everything written so far is durable in the snapshot
+        with self.commit:
+            self.synced = self.written
+            self.commit.notify_all()
+
+    # --- TaskStorage interface ---
+
+    def get_tasks(self) -> List[Dict]:
+        return [dict(task) for task in self.tasks.values()]
+
+    def add_tasks(self, tasks: List[Dict]):
+        self.mutate({"op": "add_tasks", "tasks": tasks})
+
+    def update_task(self, task_id: str, updates: Dict) -> bool:
+        return self.mutate({"op": "update_task", "task_id": str(task_id), "updates": updates})
+
+    def get_claims(self) -> Dict[str, Dict]:
+        return dict(self.claims)
+
+    def get_claim(self, task_id: str) -> Optional[Dict]:
+        return self.claims.get(task_id)
+
+    def claim_task(self, task_id: str, agent_id: str, claimed_at: str,
+                   expires_at: Optional[float] = None) -> bool:
+        return self.mutate({"op": "claim", "task_id": task_id, "agent_id": agent_id, "at": claimed_at,
+                            "expires_at": expires_at})
+
+    def release_task(self, task_id: str, agent_id: str) -> bool:
+        return self.mutate({"op": "release", "task_id": task_id, "agent_id": agent_id})
+
+    def remove_claim(self, task_id: str):
+        self.mutate({"op": "release", "task_id": task_id})
+
+    def get_locks(self) -> Dict[str, Dict]:
+        return dict(self.locks)
+
+    def get_lock(self, file_path: str) -> Optional[Dict]:
+        return self.locks.get(file_path)
+
+    def lock_files(self, agent_id: str, requests: List[Tuple[str, str]], locked_at: str,
+                   expires_at: Optional[float] = None) -> Optional[Dict]:
+        if self.mutate({"op": "lock_many", "agent_id": agent_id, "requests": [list(r) for r in requests],
+                        "at": locked_at, "expires_at": expires_at}):
+            return None
+        return self.last_conflict
+
+    def find_lock_conflict(self, path: str, agent_id: str, mode: str = EXCLUSIVE) -> Optional[Dict]:
+        with self.exclusive():
+            self.catch_up()
+            return super().find_lock_conflict(path, agent_id, mode)
+
+    def release_file_lock(self, lock_id: str, agent_id: str) -> bool:
+        return self.mutate({"op": "unlock", "file_path": lock_id, "agent_id": agent_id})
+
+    def remove_lock(self, lock_id: str):
+        self.mutate({"op": "unlock", "file_path": lock_id})
+
+    def renew_leases(self, agent_id: str, task_ids: List[str], file_paths: List[str], expires_at: float):
+        self.mutate({"op": "renew", "agent_id": agent_id, "task_ids": task_ids, "file_paths": file_paths,
+                     "expires_at": expires_at})
+
+    def expire_claim(self, task_id: str, now: float) -> bool:
+        return self.mutate({"op": "expire_claim", "task_id": task_id, "now": now})
+
+    def expire_lock(self, file_path: str, now: float) -> bool:
+        return self.mutate({"op": "expire_lock", "file_path": file_path, "now": now})
+
+    def replace_state(self, tasks: List[Dict], claims: Dict[str, Dict], locks: Dict[str, Dict]):
+        with self.exclusive():
+            self.catch_up()
+            self.tasks = {str(t["id"]): dict(t) for t in tasks}
+            self.claims = dict(claims)
+            self.reset_locks(locks)
+            self.compact()
+
+
+def create_storage(backend: str, todo_file: str, locks_file: str, shared_dir: str = "shared") -> TaskStorage:
+    """Create the storage backend named in config ("json", "sqlite" or "journal")"""
+    if backend == "json":
+        return JsonTaskStorage(todo_file, locks_file)
+    if backend == "sqlite":
+        storage = SqliteTaskStorage(os.path.join(shared_dir, "coordination.db"))
+        # First run against an existing JSON setup: migrate it in
+        if storage.is_empty() and os.path.exists(todo_file):
+            storage.import_json(todo_file, locks_file)
+        return storage
+    if backend == "journal":
+        snapshot_file = os.path.join(shared_dir, "coordination.snapshot.json")
+        journal_file = os.path.join(shared_dir, "coordination.journal")
+        fresh = not os.path.exists(snapshot_file) and not os.path.exists(journal_file)
+        storage = JournalTaskStorage(snapshot_file, journal_file)
+        if fresh and os.path.exists(todo_file):
+            storage.import_json(todo_file, locks_file)
+        return storage
+    raise ValueError(f"Unknown task storage backend: {backend}")
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
 
-from scripts.task_manager import TaskManager
+from task_manager import TaskManager
 
 print("Testing Task Manager...")
 manager = TaskManager()
@@ -21,5 +21,38 @@ if manager.lock_file("test_agent", "test_file.py"):
     manager.release_file_lock("test_agent", "test_file.py")
 else:
     print("✗ File locking failed")
+manager.close()
+
+# Test journal recovery: a torn tail is dropped, a corrupt record before valid ones is not
+import tempfile
+from task_storage import JournalTaskStorage
+
+with tempfile.TemporaryDirectory() as tmp:
+    snapshot, journal = os.path.join(tmp, "tasks.json"), os.path.join(tmp, "tasks.journal")
+    storage = JournalTaskStorage(snapshot, journal)
+    storage.add_tasks([{"id": "1", "status": "pending"}])
+    storage.claim_task("1", "test_agent", "now")
+    storage.close()
+    with open(journal, "ab") as f:
+        f.write(b"0badc0de {\"op\":")
+    storage = JournalTaskStorage(snapshot, journal)
+    if storage.get_claim("1") and len(storage.get_tasks()) == 1:
+        print("✓ Torn journal tail dropped")
+    else:
+        print("✗ Torn journal tail lost state")
+    storage.close()
+
+    with open(journal, "rb") as f:
+        data = bytearray(f.read())
+    data[12] ^= 0x01  # inside the first record's payload
+    with open(journal, "wb") as f:
+        f.write(data)
+    try:
+        JournalTaskStorage(snapshot, journal).close()
+        print("✗ Corrupt journal record accepted")
+    except ValueError:
+        with open(journal, "rb") as f:
+            intact = f.read() == bytes(data)
+        print("✓ Corrupt journal record refused" if intact else "✗ Corrupt journal record truncated")
 
 print("\nBasic setup test complete!")